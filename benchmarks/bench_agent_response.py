@@ -0,0 +1,99 @@
+"""
+Benchmark: invoke_agent stream consumption before and after the rewrite.
+
+Usage:
+    python benchmarks/bench_agent_response.py [--sizes 100 1000 10000] [--chunk-bytes 64]
+
+Builds synthetic invoke_agent completion streams: the reply text is cut into
+fixed-size byte chunks and every tenth event is an orchestration trace event.
+Each size runs twice, with ASCII-only text (timing comparison) and with mixed
+Malay/English, CJK and emoji text, where multibyte characters regularly
+straddle two chunks. Reports time per stream for:
+  legacy     str += chunk.decode(), trace ignored (the previous consumer)
+  process    process_agent_response (bytearray, one decode, trace timings)
+  iterate    iter_agent_events (incremental decoder, as stream_handler uses)
+
+and whether each one reproduced the original text.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "handle_agent_request"))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "shared"))
+
+from lambda_function import iter_agent_events, process_agent_response  # noqa: E402
+
+ASCII_SENTENCE = "Please rest and drink plenty of fluids. See a doctor if the fever lasts more than 3 days. "
+MIXED_SENTENCE = "Sila rehat dan minum air secukupnya. Demam 38.5°C — jumpa doktor jika berlanjutan. 发烧请就医 🤒 "
+
+
+def legacy_process_agent_response(response_stream):
+    final_completion = ""
+    return_control_payload = None
+    try:
+        for event in response_stream['completion']:
+            if 'chunk' in event:
+                final_completion += event['chunk']['bytes'].decode()
+            elif 'returnControl' in event:
+                return_control_payload = event['returnControl']
+    except (KeyError, UnicodeDecodeError):
+        pass
+    return {'completion': final_completion, 'returnControl': return_control_payload}
+
+
+def trace_event(i, at):
+    trace_id = f"trace-{i // 2}"
+    step = {"modelInvocationInput": {"traceId": trace_id}} if i % 2 == 0 else \
+        {"modelInvocationOutput": {"traceId": trace_id, "metadata": {"usage": {"inputTokens": 900, "outputTokens": 60}}}}
+    return {"trace": {"eventTime": at, "trace": {"orchestrationTrace": step}}}
+
+
+def synthetic_stream(num_chunks, chunk_bytes, sentence):
+    data = (sentence * (num_chunks * chunk_bytes // len(sentence.encode()) + 1)).encode()[:num_chunks * chunk_bytes]
+    # Trim to a character boundary so the expected text is well defined.
+    text = data.decode("utf-8", errors="ignore")
+    data = text.encode()
+    events = []
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for n, offset in enumerate(range(0, len(data), chunk_bytes)):
+        if n % 9 == 0:
+            events.append(trace_event(n // 9, start + timedelta(milliseconds=n * 40)))
+        events.append({"chunk": {"bytes": data[offset:offset + chunk_bytes]}})
+    return events, text
+
+
+def iterate(stream):
+    return "".join(e["text"] for e in iter_agent_events(stream) if e["type"] == "chunk")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--chunk-bytes", type=int, default=64)
+    args = parser.parse_args()
+
+    candidates = (
+        ("legacy", lambda s: legacy_process_agent_response(s)["completion"]),
+        ("process", lambda s: process_agent_response(s)["completion"]),
+        ("iterate", iterate),
+    )
+    for size in args.sizes:
+        for label, sentence in (("ascii", ASCII_SENTENCE), ("mixed", MIXED_SENTENCE)):
+            events, text = synthetic_stream(size, args.chunk_bytes, sentence)
+            repeat = max(3, 20000 // size)
+            print(f"--- {size} chunks of {args.chunk_bytes} bytes, {label} ({len(text)} chars, {len(events) - size} trace events)")
+            for name, fn in candidates:
+                # process_agent_response logs trace timings; keep them off the report.
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ok = fn({"completion": events}) == text
+                    seconds = timeit.timeit(lambda: fn({"completion": events}), number=repeat) / repeat
+                print(f"{name:>8}: {seconds * 1e3:8.3f} ms  {'ok' if ok else 'WRONG (truncated or garbled)'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: concurrent conversations through the asyncio chat engine.
+
+Usage:
+    python benchmarks/bench_chat_engine.py [--sessions 300] [--turns 3] [--model-calls 32]
+                                           [--ttft 0.4] [--chunks 20] [--chunk-delay 0.02]
+
+Starts the JSON-lines socket server in-process on a free port and opens one
+client connection per simulated patient, each sending --turns messages and
+waiting for every reply before the next (like a person typing). The model
+is a stand-in that blocks its worker thread for --ttft seconds and then
+yields --chunks pieces --chunk-delay apart, the way a boto3 response stream
+blocks; nothing is sent to AWS.
+
+Reports turns per second, time to first chunk and turn latency
+percentiles, and the engine's peak session count. With more sessions than
+--model-calls, the extra turns wait for a model slot, which shows up as
+time to first chunk rather than as failures.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "python"))
+
+from chat_engine import ChatEngine, serve_socket  # noqa: E402
+
+
+def fake_reply_stream(ttft, chunks, chunk_delay):
+    def reply_stream(patient_id, message, conversation_id=None):
+        time.sleep(ttft)
+        for i in range(chunks):
+            if i:
+                time.sleep(chunk_delay)
+            yield f"part {i} of the reply to {message!r}. "
+    return reply_stream
+
+
+async def patient(port, patient_id, turns, results):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 20)
+    for turn in range(turns):
+        started = time.perf_counter()
+        first = None
+        writer.write(json.dumps({"patient_id": patient_id, "message": f"symptom update {turn}"}).encode() + b"\n")
+        await writer.drain()
+        while True:
+            event = json.loads(await reader.readline())
+            if event["type"] == "chunk" and first is None:
+                first = time.perf_counter() - started
+            if event["type"] in ("done", "error"):
+                break
+        results.append((first, time.perf_counter() - started, event["type"]))
+    writer.close()
+
+
+def pct(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] * 1e3 if len(values) > 1 else values[0] * 1e3
+
+
+async def run(args):
+    engine = ChatEngine(fake_reply_stream(args.ttft, args.chunks, args.chunk_delay), max_model_calls=args.model_calls)
+    server = await serve_socket(engine, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    results = []
+    started = time.perf_counter()
+    async with server:
+        await asyncio.gather(*(patient(port, f"p-{i}", args.turns, results) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    stats = engine.stats()
+    await engine.close()
+
+    ok = [r for r in results if r[2] == "done"]
+    ttfc = [r[0] for r in ok if r[0] is not None]
+    latency = [r[1] for r in ok]
+    ideal = args.ttft + (args.chunks - 1) * args.chunk_delay
+    print(f"{args.sessions} sessions x {args.turns} turns, {args.model_calls} model slots, "
+          f"{ideal * 1e3:.0f} ms per simulated reply")
+    print(f"  turns      {len(ok)} ok, {len(results) - len(ok)} failed in {elapsed:.1f}s "
+          f"({len(ok) / elapsed:.1f} turns/s)")
+    print(f"  first chunk p50 {pct(ttfc, 50):7.0f} ms   p95 {pct(ttfc, 95):7.0f} ms")
+    print(f"  turn       p50 {pct(latency, 50):7.0f} ms   p95 {pct(latency, 95):7.0f} ms")
+    print(f"  peak sessions {stats['peak_sessions']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--model-calls", type=int, default=32)
+    parser.add_argument("--ttft", type=float, default=0.4)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
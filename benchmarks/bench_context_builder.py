@@ -0,0 +1,131 @@
+"""
+Benchmark: chat context size before and after the token-budgeted builder.
+
+Usage:
+    python benchmarks/bench_context_builder.py [conversations.jsonl] [--budget 600] [--live]
+
+Replays recorded conversations (JSONL, one {"conversation_id", "messages"} per
+line) turn by turn and compares, for every user turn:
+  legacy    json.dumps(history[-10:], indent=2), what chat_with_medrock used to embed
+  builder   ContextBuilder.build with a rolling summary
+
+Offline, tokens are the builder's chars/4 estimate and summaries come from a
+stand-in that keeps the first sentence of each folded message, so the numbers
+show packing and summary-cache behaviour without calling Bedrock. With --live
+both prompts are sent to the chat model and the reported input_tokens and
+end-to-end latency are printed instead (needs AWS credentials).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "python"))
+
+from context_builder import ContextBuilder, estimate_tokens  # noqa: E402
+
+
+def legacy_context(history):
+    return json.dumps(history[-10:], indent=2)
+
+
+def offline_summarize(prompt):
+    folded = prompt.split("Conversation:\n", 1)[1].splitlines()
+    previous = prompt.split("Summary so far:\n", 1)[1].split("\n\n", 1)[0] if "Summary so far:" in prompt else ""
+    firsts = [line.split(". ")[0] for line in folded if line]
+    return " ".join(([previous] if previous else []) + firsts)[:800]
+
+
+def load_conversations(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay(conversation, builder, live=None):
+    rows = []
+    messages = conversation["messages"]
+    for i, message in enumerate(messages):
+        if message["role"] != "user":
+            continue
+        history = messages[:i + 1]
+        legacy = legacy_context(history)
+        started = time.perf_counter()
+        packed = builder.build(conversation["conversation_id"], history)
+        build_ms = (time.perf_counter() - started) * 1e3
+        row = {
+            "turn": i // 2 + 1,
+            "legacy_tokens": estimate_tokens(legacy),
+            "builder_tokens": estimate_tokens(packed),
+            "build_ms": build_ms
+        }
+        if live is not None:
+            for name, context in (("legacy", legacy), ("builder", packed)):
+                tokens, seconds = live(context, message["content"])
+                row[f"{name}_tokens"] = tokens
+                row[f"{name}_latency_s"] = seconds
+            # Include the time spent building (and possibly summarizing).
+            row["builder_latency_s"] += build_ms / 1e3
+        rows.append(row)
+    return rows
+
+
+def live_caller():
+    # Imported lazily: the chat module creates AWS clients at import.
+    from chat_with_medrock import CHAT_MODEL_ID, bedrock, build_prompt
+
+    def call(context, user_message):
+        started = time.perf_counter()
+        response = bedrock.invoke_model(
+            modelId=CHAT_MODEL_ID,
+            body=json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": 400,
+                "messages": [{"role": "user", "content": build_prompt(context, user_message)}]
+            })
+        )
+        body = json.loads(response["body"].read())
+        return body["usage"]["input_tokens"], time.perf_counter() - started
+
+    def summarize(prompt):
+        response = bedrock.invoke_model(
+            modelId=CHAT_MODEL_ID,
+            body=json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": 250,
+                "messages": [{"role": "user", "content": prompt}]
+            })
+        )
+        return json.loads(response["body"].read())["content"][0]["text"]
+
+    return call, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("conversations", nargs="?", default=os.path.join(HERE, "chat_conversations.jsonl"))
+    parser.add_argument("--budget", type=int, default=600, help="context budget in tokens")
+    parser.add_argument("--live", action="store_true", help="send prompts to Bedrock")
+    args = parser.parse_args()
+
+    call, summarize = live_caller() if args.live else (None, offline_summarize)
+    builder = ContextBuilder(summarize, budget_tokens=args.budget)
+
+    unit = "input tokens" if args.live else "est. context tokens"
+    for conversation in load_conversations(args.conversations):
+        print(f"--- {conversation['conversation_id']} ({unit})")
+        rows = replay(conversation, builder, live=call)
+        for row in rows:
+            line = f"turn {row['turn']:>2}: legacy {row['legacy_tokens']:>5}  builder {row['builder_tokens']:>5}  build {row['build_ms']:6.3f} ms"
+            if args.live:
+                line += f"  latency {row['legacy_latency_s']:5.2f}s -> {row['builder_latency_s']:5.2f}s"
+            print(line)
+        legacy_total = sum(r["legacy_tokens"] for r in rows)
+        builder_total = sum(r["builder_tokens"] for r in rows)
+        print(f"total: legacy {legacy_total}  builder {builder_total}  ({1 - builder_total / legacy_total:.0%} fewer)")
+    print(f"summary cache: {builder.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark: single-pass JSON extractor vs the previous regex cascade.
+
+Usage:
+    python benchmarks/bench_extract_json.py [outputs.jsonl] [--repeat N]
+
+The corpus is JSONL with one {"output_text": ...} per line. The bundled
+severity_model_outputs.jsonl reproduces the output shapes seen from Nova in
+practice (bare JSON, fenced blocks, leading/trailing prose, nested symptoms,
+truncated completions); point it at a dump of logged outputs to re-run on
+production data.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "get_severity"))
+
+from json_extract import extract_severity_json, validate_severity_object  # noqa: E402
+
+
+def legacy_extract_json_from_text(text: str):
+    """The regex cascade _extract_json_from_text used before the scanner."""
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+
+    m = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
+    if m:
+        try:
+            return json.loads(m.group(1))
+        except Exception:
+            pass
+
+    m = re.search(r'(\{.*?\})', text, re.DOTALL)
+    if m:
+        try:
+            return json.loads(m.group(1))
+        except Exception:
+            pass
+
+    return None
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["output_text"] for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", nargs="?", default=os.path.join(HERE, "severity_model_outputs.jsonl"))
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    print(f"Corpus: {len(corpus)} outputs, {sum(len(t) for t in corpus)} chars")
+
+    for name, fn in (("regex cascade", legacy_extract_json_from_text), ("single-pass", extract_severity_json)):
+        valid = sum(1 for text in corpus if validate_severity_object(fn(text)))
+        seconds = timeit.timeit(lambda: [fn(text) for text in corpus], number=args.repeat)
+        per_output_us = seconds / (args.repeat * len(corpus)) * 1e6
+        print(f"{name:>14}: valid {valid}/{len(corpus)}  {per_output_us:8.2f} us/output")
+
+
+if __name__ == "__main__":
+    main()
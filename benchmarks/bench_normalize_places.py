@@ -0,0 +1,111 @@
+"""
+Benchmark: normalize_places before and after the Facility record.
+
+Usage:
+    python benchmarks/bench_normalize_places.py [--sizes 10 100 1000 10000]
+
+Generates synthetic search_nearby ResultItems (a mix of places with and
+without Contacts/OpeningHours) and reports latency, allocated blocks and peak
+traced memory for:
+  legacy       the per-field .get() chain normalize_places used to run
+  extract      extract_facilities -> list of Facility records (cache/re-rank path)
+  normalize    normalize_places as it is now (Facility.to_dict per place)
+
+The Lambda hot path caches and re-ranks Facility records and only builds
+dicts for the handful of places it returns, so "extract" is the number that
+tracks handler latency. normalize_places serves callers that need a dict
+for every place (the snapshot builder); it shares the per-place extraction
+with extract_facilities, and each record is dropped once its dict is built,
+so its peak memory matches legacy at a small cost in latency.
+"""
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "get_nearby_facilities"))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "shared"))
+
+from facility import extract_facilities  # noqa: E402
+from lambda_function import normalize_places  # noqa: E402
+
+
+def legacy_normalize_places(raw_places):
+    clean_list = []
+    for item in raw_places:
+        clean_list.append({
+            'id': item.get('PlaceId'),
+            'name': item.get('Title'),
+            'address': item.get('Address', {}).get('Label', 'N/A'),
+            "lat": item.get("Position", [None, None])[1],
+            "lon": item.get("Position", [None, None])[0],
+            "distance_m": item.get("Distance", "N/A"),
+            "phone": (
+                item.get("Contacts", {}).get("Phones", [{}])[0].get("Value", "N/A")
+                if "Contacts" in item else "N/A"
+            ),
+            "website": (
+                item.get("Contacts", {}).get("Websites", [{}])[0].get("Value", "N/A")
+                if "Contacts" in item else "N/A"
+            ),
+            "category": (
+                item.get("Categories", [{}])[0].get("Name", "N/A")
+                if "Categories" in item else "N/A"
+            ),
+            "open_now": (
+                item.get("OpeningHours", [{}])[0].get("OpenNow", False)
+                if "OpeningHours" in item else None
+            )
+        })
+    return clean_list
+
+
+def synthetic_item(i):
+    item = {
+        "PlaceId": f"AQAAAFUA{i:08d}",
+        "Title": f"Klinik Kesihatan {i}",
+        "Address": {"Label": f"{i} Jalan Ampang, 50450 Kuala Lumpur, Malaysia"},
+        "Position": [101.6869 + i * 1e-5, 3.1390 + i * 1e-5],
+        "Distance": i * 7,
+        "Categories": [{"Id": "medical_services-clinics", "Name": "Clinic", "Primary": True}],
+    }
+    if i % 2:
+        item["Contacts"] = {"Phones": [{"Value": "+60 3-1234 5678"}], "Websites": [{"Value": "https://example.my"}]}
+    if i % 3:
+        item["OpeningHours"] = [{"Display": ["Mon-Fri: 09:00 - 17:00"], "OpenNow": True}]
+    return item
+
+
+def measure(fn, raw, repeat):
+    seconds = timeit.timeit(lambda: fn(raw), number=repeat) / repeat
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = fn(raw)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    del result
+    return seconds, blocks, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    candidates = (("legacy", legacy_normalize_places), ("extract", extract_facilities), ("normalize", normalize_places))
+    for size in args.sizes:
+        raw = [synthetic_item(i) for i in range(size)]
+        assert normalize_places(raw) == legacy_normalize_places(raw)
+        repeat = max(5, 20000 // size)
+        print(f"--- {size} ResultItems")
+        for name, fn in candidates:
+            seconds, blocks, peak = measure(fn, raw, repeat)
+            print(f"{name:>10}: {seconds * 1e3:8.3f} ms  {blocks:>7} blocks  peak {peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark: medical report rendering throughput, in reports per second on one core.
+
+Usage:
+    python benchmarks/bench_pdf_report.py [--seconds 3]
+
+Renders the same payloads with:
+  legacy     the story generate_pdf_report used to build per request
+             (stylesheet, ParagraphStyles and TableStyles created every call)
+  platypus   ReportTemplate.render_platypus (static parts compiled once)
+  canvas     ReportTemplate.render (direct-canvas fast path, platypus fallback)
+
+for a typical single-page report and a long report that needs several pages
+(where the fast path falls back to platypus).
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from io import BytesIO
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "generate_pdf_report"))
+
+from reportlab.lib import colors  # noqa: E402
+from reportlab.lib.pagesizes import A4  # noqa: E402
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet  # noqa: E402
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle  # noqa: E402
+
+from report_template import ReportTemplate, parse_report  # noqa: E402
+
+TYPICAL = {
+    "patient": {"patient_id": "P-001", "name": "Aisyah binti Rahman", "age": 34, "gender": "F",
+                "medical_history": ["Asthma", "Penicillin allergy"]},
+    "severity": "moderate",
+    "reason": "Fever of 38.6°C and productive cough for three days with breathlessness on exertion in a patient with asthma.",
+    "recommendation": "See a doctor within 24 hours. Seek urgent care if breathless at rest or oxygen saturation falls to 92% or below.",
+    "symptoms": [
+        {"name": "fever", "severity": "moderate", "duration": "3 days"},
+        {"name": "productive cough", "severity": "moderate", "duration": "3 days"},
+        {"name": "shortness of breath", "severity": "mild", "duration": "1 day"},
+    ],
+    "possible_conditions": ["Acute bronchitis", "Community-acquired pneumonia", "Asthma exacerbation"],
+}
+
+LONG = dict(
+    TYPICAL,
+    reason=TYPICAL["reason"] * 12,
+    symptoms=TYPICAL["symptoms"] * 15,
+    possible_conditions=TYPICAL["possible_conditions"] * 10,
+)
+
+
+def legacy_render(body):
+    patient = body.get("patient", {})
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    story = []
+    styles = getSampleStyleSheet()
+    header_style = ParagraphStyle("Header", parent=styles["Heading1"], fontSize=16, spaceAfter=6)
+    subheader_style = ParagraphStyle("SubHeader", parent=styles["Heading2"], fontSize=14, spaceAfter=8)
+    normal = styles["Normal"]
+    story.append(Paragraph("Medical Report", header_style))
+    story.append(Paragraph(f"Report Generated: {datetime.now().strftime('%d %b %Y, %I:%M %p')}", normal))
+    story.append(Spacer(1, 12))
+    story.append(Paragraph("Patient Information", subheader_style))
+    patient_table = Table([["Patient ID", patient.get("patient_id", "N/A")], ["Name", patient.get("name", "N/A")],
+                           ["Age", str(patient.get("age", "N/A"))], ["Gender", patient.get("gender", "N/A")]],
+                          hAlign="LEFT", colWidths=[100, 300])
+    patient_table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey), ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+        ("FONTNAME", (0, 0), (-1, -1), "Helvetica"), ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+    ]))
+    story.append(patient_table)
+    story.append(Spacer(1, 8))
+    if patient.get("medical_history"):
+        story.append(Paragraph("Medical History:", normal))
+        for item in patient["medical_history"]:
+            story.append(Paragraph(f"• {item}", normal))
+        story.append(Spacer(1, 12))
+    for heading, field in (("Overall Severity", "severity"), ("Reason", "reason"), ("Recommendation", "recommendation")):
+        story.append(Paragraph(heading, subheader_style))
+        story.append(Paragraph(body.get(field, "N/A"), normal))
+        story.append(Spacer(1, 12))
+    if body.get("symptoms"):
+        story.append(Paragraph("Reported Symptoms", subheader_style))
+        rows = [["Name", "Severity", "Duration"]]
+        rows += [[s.get("name", ""), s.get("severity", ""), s.get("duration", "")] for s in body["symptoms"]]
+        table = Table(rows, hAlign="LEFT")
+        table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey), ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+            ("ALIGN", (0, 0), (-1, -1), "LEFT"), ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 8), ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ]))
+        story.append(table)
+        story.append(Spacer(1, 12))
+    if body.get("possible_conditions"):
+        story.append(Paragraph("Possible Conditions", subheader_style))
+        for condition in body["possible_conditions"]:
+            story.append(Paragraph(f"• {condition}", normal))
+        story.append(Spacer(1, 12))
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def throughput(fn, seconds):
+    fn()  # warm up
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3.0, help="time per measurement")
+    args = parser.parse_args()
+
+    template = ReportTemplate()
+    for label, body in (("single-page", TYPICAL), ("multi-page", LONG)):
+        data = parse_report(body)
+        fast = template.render_canvas(data, "now") is not None
+        print(f"--- {label} report (fast path {'used' if fast else 'falls back to platypus'})")
+        for name, fn in (
+            ("legacy", lambda: legacy_render(body)),
+            ("platypus", lambda: template.render_platypus(data, "now")),
+            ("canvas", lambda: template.render(data)),
+        ):
+            print(f"{name:>10}: {throughput(fn, args.seconds):8.1f} reports/s/core")
+
+
+if __name__ == "__main__":
+    main()
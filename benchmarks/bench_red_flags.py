@@ -0,0 +1,52 @@
+"""
+Benchmark: red-flag pre-triage matching on long symptom notes.
+
+Usage:
+    python benchmarks/bench_red_flags.py [--repeat N]
+
+Builds notes of increasing length from filler clinical prose with a red-flag
+phrase in the last sentence (worst case for a left-to-right scan), and reports the
+per-note match time and which rule fired.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "get_severity"))
+
+from red_flags import RedFlagEngine  # noqa: E402
+
+FILLER = (
+    "Patient reports a mild headache since yesterday evening, no fever, appetite is normal, "
+    "slept poorly, took paracetamol twice with some relief, denies chest pain at rest. "
+)
+
+TAILS = {
+    "cardiac": "Over the last hour there is crushing chest pressure and she is short of breath.",
+    "stroke": "Family noticed his face is drooping and he has slurred speech since lunch.",
+    "none": "Otherwise feeling well and able to walk around the house.",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    started = timeit.default_timer()
+    engine = RedFlagEngine()
+    print(f"Engine build: {(timeit.default_timer() - started) * 1e3:.2f} ms (once per container)")
+
+    for length in (200, 2_000, 10_000):
+        for label, tail in TAILS.items():
+            note = (FILLER * (length // len(FILLER) + 1))[:length] + ". " + tail
+            match = engine.match(note)
+            seconds = timeit.timeit(lambda: engine.match(note), number=args.repeat)
+            fired = f"{match.rule['name']} {match.matched_terms}" if match else "no rule"
+            print(f"{len(note):>6} chars  {label:<8} {seconds / args.repeat * 1e3:7.3f} ms  -> {fired}")
+
+
+if __name__ == "__main__":
+    main()
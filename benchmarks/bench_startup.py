@@ -0,0 +1,149 @@
+"""
+Benchmark: cold-start cost of each Lambda handler.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--handlers get_severity ...]
+
+Every run starts a fresh interpreter (like a new Lambda container) and
+reports the median of:
+  import     time to import lambda_function (the init phase)
+  first      time for the first lambda_handler call
+  second     a second identical call on the now-warm container
+
+Each handler gets an event that can be answered without network access:
+a red-flag symptom note (no Bedrock call), a nearby search served from a
+temporary facility snapshot, and an agent / S3 client replaced with an
+in-process fake, so the numbers isolate our own start-up work. The second
+report request is served by the content-hash lookup without rendering. The time to
+import boto3 in a bare interpreter is printed first for reference; handlers
+that create clients lazily no longer pay it on these paths.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(HERE, "..", "lambda")
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+import lambda_function
+imported = time.perf_counter()
+exec(sys.argv[1])
+event = json.loads(sys.argv[2])
+timings = {"import": imported - started}
+for name in ("first", "second"):
+    t = time.perf_counter()
+    response = lambda_function.lambda_handler(event, None)
+    timings[name] = time.perf_counter() - t
+timings["status"] = response.get("statusCode")
+print("RESULT " + json.dumps(timings))
+"""
+
+FAKE_AGENT = """
+class _FakeAgent:
+    def invoke_agent(self, **kwargs):
+        return {"completion": [{"chunk": {"bytes": b"Please rest and drink fluids."}}]}
+lambda_function.get_client = lambda: _FakeAgent()
+"""
+
+FAKE_S3 = """
+from report_store import LocalS3Error
+class _FakeS3:
+    objects = {}
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise LocalS3Error("404", "not found")
+        return {"ContentLength": len(self.objects[Key])}
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body.read()
+lambda_function.get_s3_client = lambda: _FakeS3()
+"""
+
+REPORT = {
+    "patient": {"patient_id": "P-001", "name": "Aisyah", "age": 34, "gender": "F", "medical_history": ["Asthma"]},
+    "severity": "moderate",
+    "reason": "Fever and productive cough for three days with mild breathlessness.",
+    "recommendation": "See a doctor within 24 hours.",
+    "symptoms": [{"name": "fever", "severity": "moderate", "duration": "3 days"}],
+    "possible_conditions": ["Bronchitis", "Community-acquired pneumonia"]
+}
+
+
+def handlers(snapshot_path):
+    return {
+        "get_severity": ({}, "", {"symptom_text": "Crushing chest pressure and she is short of breath."}),
+        "get_nearby_facilities": (
+            {"FACILITY_SNAPSHOT_PATH": snapshot_path}, "",
+            {"longitude": 101.6869, "latitude": 3.1390, "category": "clinics", "radius": 3000}
+        ),
+        "handle_agent_request": (
+            {"AGENT_ID": "agent", "AGENT_ALIAS_ID": "alias", "ENABLE_AGENT_TRACE": "false"}, FAKE_AGENT,
+            {"body": json.dumps({"sessionId": "s-1", "prompt": "I have a fever"})}
+        ),
+        "generate_pdf_report": ({"S3_BUCKET_NAME": "medrock-reports"}, FAKE_S3, {"body": json.dumps(REPORT)}),
+    }
+
+
+def write_snapshot(path):
+    places = [{
+        "id": f"p{i}", "name": f"Klinik {i}", "address": "Kuala Lumpur", "lat": 3.1390 + i * 1e-3,
+        "lon": 101.6869 + i * 1e-3, "distance_m": 0, "phone": "N/A", "website": "N/A",
+        "category": "Clinic", "open_now": None
+    } for i in range(200)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"generated_at": 4102444800, "places": {"clinics": places},
+                   "coverage": {"clinics": [[3.1390, 101.6869, 20000]]}}, f)
+
+
+def run_child(name, env_extra, setup, event):
+    env = dict(os.environ, **env_extra)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [
+        os.path.join(LAMBDA_DIR, name), os.path.join(LAMBDA_DIR, "shared"), env.get("PYTHONPATH")
+    ]))
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, setup, json.dumps(event)],
+        cwd=os.path.join(LAMBDA_DIR, name), env=env, capture_output=True, text=True
+    )
+    for line in out.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{name} failed:\n{out.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--handlers", nargs="+")
+    args = parser.parse_args()
+
+    boto3_import = subprocess.run(
+        [sys.executable, "-c", "import time; t = time.perf_counter(); import boto3; print(time.perf_counter() - t)"],
+        capture_output=True, text=True
+    )
+    if boto3_import.returncode == 0:
+        print(f"import boto3 alone: {float(boto3_import.stdout) * 1e3:.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, "snapshot.json")
+        write_snapshot(snapshot_path)
+        for name, (env_extra, setup, event) in handlers(snapshot_path).items():
+            if args.handlers and name not in args.handlers:
+                continue
+            try:
+                runs = [run_child(name, env_extra, setup, event) for _ in range(args.runs)]
+            except RuntimeError as e:
+                print(f"{name:>22}: skipped ({str(e).splitlines()[-1]})")
+                continue
+            median = {key: statistics.median(r[key] for r in runs) * 1e3 for key in ("import", "first", "second")}
+            print(f"{name:>22}: import {median['import']:7.1f} ms  first {median['first']:7.1f} ms  "
+                  f"second {median['second']:6.1f} ms  (status {runs[0]['status']})")
+
+
+if __name__ == "__main__":
+    main()
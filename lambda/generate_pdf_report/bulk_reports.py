@@ -0,0 +1,218 @@
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from io import BytesIO
+
+from report_store import safe_id
+from report_fields import parse_report
+
+# Reports queued per worker ahead of the one being read. Keeps every worker
+# busy while bounding how many rendered PDFs wait in pipes.
+IN_FLIGHT_PER_WORKER = 2
+# write_combined_pdf holds every page in memory; a report is a page or two
+# of a few KB, so this keeps the combined document to a few tens of MB.
+COMBINED_PDF_MAX_REPORTS = int(os.environ.get("COMBINED_PDF_MAX_REPORTS", "200"))
+
+
+def _render_one(template, index, body, fast_path):
+    try:
+        data = parse_report(body)
+        return index, data["patient_id"], template.render(data, fast_path=fast_path), None
+    except Exception as e:
+        return index, None, None, f"{type(e).__name__}: {e}"
+
+
+def _template():
+    # reportlab loads only once a batch actually renders.
+    from report_template import ReportTemplate
+    return ReportTemplate()
+
+
+def _worker(conn, fast_path):
+    template = _template()
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        conn.send(_render_one(template, job[0], job[1], fast_path))
+    conn.close()
+
+
+class ReportPool:
+    """
+    Renders report payloads across worker processes (reportlab is CPU-bound,
+    so threads would serialize on the GIL).
+
+    Each worker owns one end of a Pipe and handles the jobs dealt to it
+    round-robin, in order, so results can be read back in input order without
+    a shared queue. That avoids the POSIX semaphores multiprocessing.Pool and
+    ProcessPoolExecutor need, which Lambda does not provide (no /dev/shm).
+    With workers=1 everything renders in this process.
+    """
+
+    def __init__(self, workers=None, fast_path=True):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.fast_path = fast_path
+        self._conns = []
+        self._procs = []
+
+    def __enter__(self):
+        if self.workers > 1:
+            ctx = multiprocessing.get_context("fork" if sys.platform == "linux" else None)
+            for _ in range(self.workers):
+                parent, child = ctx.Pipe()
+                proc = ctx.Process(target=_worker, args=(child, self.fast_path), daemon=True)
+                proc.start()
+                child.close()
+                self._conns.append(parent)
+                self._procs.append(proc)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for conn in self._conns:
+            try:
+                conn.send(None)
+                conn.close()
+            except OSError:
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._conns, self._procs = [], []
+        return False
+
+    def render(self, payloads):
+        """
+        Yields (index, patient_id, pdf_bytes, error) in input order as reports
+        finish. At most workers * IN_FLIGHT_PER_WORKER rendered reports are
+        pending at once, so rendering itself holds no more than that for any
+        batch size; write_zip and the "files" package keep it flat, while
+        write_combined_pdf holds the whole batch (see there).
+        """
+        if not self._conns:
+            template = _template()
+            for index, body in enumerate(payloads):
+                yield _render_one(template, index, body, self.fast_path)
+            return
+
+        payloads = iter(enumerate(payloads))
+        sent = 0
+        received = 0
+        window = len(self._conns) * IN_FLIGHT_PER_WORKER
+        exhausted = False
+        while True:
+            while not exhausted and sent - received < window:
+                job = next(payloads, None)
+                if job is None:
+                    exhausted = True
+                    break
+                self._conns[sent % len(self._conns)].send(job)
+                sent += 1
+            if received == sent:
+                return
+            yield self._conns[received % len(self._conns)].recv()
+            received += 1
+
+
+def report_filename(index, patient_id):
+    return f"{index + 1:03d}_medical_report_{safe_id(patient_id)}.pdf"
+
+
+def write_zip(results, fileobj):
+    """
+    Streams rendered reports into a ZIP on fileobj as they arrive. Failed
+    reports are listed in errors.json inside the archive. Returns the
+    manifest: [{"index", "patient_id", "file" or "error"}].
+    """
+    manifest = []
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, patient_id, pdf, error in results:
+            if error:
+                manifest.append({"index": index, "patient_id": patient_id, "error": error})
+                continue
+            name = report_filename(index, patient_id)
+            archive.writestr(name, pdf)
+            manifest.append({"index": index, "patient_id": patient_id, "file": name})
+        errors = [entry for entry in manifest if "error" in entry]
+        if errors:
+            archive.writestr("errors.json", json.dumps(errors, indent=2))
+    return manifest
+
+
+def combined_pdf_available():
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def write_combined_pdf(results, fileobj):
+    """
+    Appends every rendered report to one PDF written to fileobj. Needs pypdf
+    (pip install pypdf); the ZIP output has no extra dependency. Returns the
+    manifest with each report's first page number.
+
+    pypdf builds the whole document before writing it, so memory grows with
+    the batch; callers cap the batch at COMBINED_PDF_MAX_REPORTS and use the
+    ZIP output for anything larger.
+    """
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        raise RuntimeError("Combined PDF output needs pypdf; install it or use the ZIP output.")
+
+    writer = PdfWriter()
+    manifest = []
+    for index, patient_id, pdf, error in results:
+        if error:
+            manifest.append({"index": index, "patient_id": patient_id, "error": error})
+            continue
+        manifest.append({"index": index, "patient_id": patient_id, "page": len(writer.pages) + 1})
+        writer.append(PdfReader(BytesIO(pdf)))
+    writer.write(fileobj)
+    return manifest
+
+
+if __name__ == "__main__":
+    # Render a handover batch locally:
+    #   python bulk_reports.py payloads.jsonl -o handover.zip --workers 4
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render many medical reports at once.")
+    parser.add_argument("input", help="JSONL file with one report payload per line, or - for stdin")
+    parser.add_argument("-o", "--output", default="handover.zip", help=".zip, .pdf (combined; built in memory) or a directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--no-fast-path", action="store_true", help="always render through platypus")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    started = time.perf_counter()
+    with source, ReportPool(args.workers, fast_path=not args.no_fast_path) as pool:
+        results = pool.render(json.loads(line) for line in source if line.strip())
+        if args.output.endswith(".zip"):
+            with open(args.output, "wb") as f:
+                manifest = write_zip(results, f)
+        elif args.output.endswith(".pdf"):
+            with open(args.output, "wb") as f:
+                manifest = write_combined_pdf(results, f)
+        else:
+            os.makedirs(args.output, exist_ok=True)
+            manifest = []
+            for index, patient_id, pdf, error in results:
+                if error:
+                    manifest.append({"index": index, "patient_id": patient_id, "error": error})
+                    continue
+                name = report_filename(index, patient_id)
+                with open(os.path.join(args.output, name), "wb") as f:
+                    f.write(pdf)
+                manifest.append({"index": index, "patient_id": patient_id, "file": name})
+
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for entry in manifest if "error" in entry)
+    print(f"Rendered {len(manifest) - failed} reports ({failed} failed) in {elapsed:.1f}s "
+          f"with {pool.workers} workers -> {args.output}", file=sys.stderr)
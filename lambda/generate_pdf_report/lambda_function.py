@@ -1,141 +1,185 @@
+import functools
 import os
-import boto3
 import json
-from io import BytesIO
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-
-s3_client = boto3.client("s3")
-
+import aws_clients
+from bulk_reports import COMBINED_PDF_MAX_REPORTS, ReportPool, combined_pdf_available, write_combined_pdf, write_zip
+from instrumentation import count, instrumented, submit, timer
+from report_fields import parse_report
+from report_store import LocalS3, ReportStore, report_digest, report_key, safe_id
+
+# Single-page reports (the common case) are drawn on a bare canvas and longer
+# ones go through platypus. PDF_FAST_PATH=false always uses platypus.
+PDF_FAST_PATH = os.environ.get("PDF_FAST_PATH", "true").lower() == "true"
+
+
+# S3_ENDPOINT_URL points at an S3-compatible server (MinIO, LocalStack);
+# S3_LOCAL_DIR stores reports in a local directory instead, for runs without AWS.
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")
+S3_LOCAL_DIR = os.environ.get("S3_LOCAL_DIR")
+
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    if S3_LOCAL_DIR:
+        return LocalS3(S3_LOCAL_DIR)
+    if S3_ENDPOINT_URL:
+        return aws_clients.client("s3", endpoint_url=S3_ENDPOINT_URL, s3={"addressing_style": "path"})
+    return aws_clients.client("s3")
+
+
+@functools.lru_cache(maxsize=None)
+def get_report_store():
+    return ReportStore(get_s3_client(), os.environ.get("S3_BUCKET_NAME"), endpoint_url=S3_ENDPOINT_URL)
+
+
+@functools.lru_cache(maxsize=None)
+def get_report_template():
+    """
+    Styles, table styles and fixed flowables, compiled once per container.
+    reportlab is imported here, so requests served from the store never load it.
+    """
+    from report_template import ReportTemplate
+    return ReportTemplate()
+
+
+# Worker processes for batch requests. Lambda gives one vCPU per 1,769 MB,
+# so this only helps on larger memory sizes.
+PDF_BATCH_WORKERS = int(os.environ.get("PDF_BATCH_WORKERS", str(os.cpu_count() or 1)))
+# Batch archives spill from memory to /tmp past this size.
+PDF_BATCH_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+def _metadata(data, digest):
+    # S3 user metadata must be ASCII.
+    return {"payload-sha256": digest, "patient-id": safe_id(data["patient_id"])}
+
+
+def _store_batch(reports, pool):
+    """
+    "files" package: stores each report under its content-addressed key.
+    Reports already in the bucket are looked up in parallel and skipped, as
+    are repeats within the batch; only the rest are sent to the pool.
+    """
+    store = get_report_store()
+    keys = {}
+    for index, payload in enumerate(reports):
+        try:
+            data = parse_report(payload)
+        except Exception:
+            continue  # the pool reports the error for this one
+        digest = report_digest(data)
+        keys[index] = (report_key(data, digest), data, digest)
+
+    first = {}
+    for index, (key, _, _) in keys.items():
+        first.setdefault(key, index)
+    with timer("s3.head_object", external=True), ThreadPoolExecutor(max_workers=8) as heads:
+        lookups = {key: submit(heads, store.find, key) for key in first}
+        found = {key: future.result() for key, future in lookups.items()}
+
+    manifest = {}
+    pending = []
+    for index in range(len(reports)):
+        if index in keys:
+            key, data, _ = keys[index]
+            if found[key] is not None or first[key] != index:
+                manifest[index] = {"index": index, "patient_id": data["patient_id"], "pdf_url": store.url(key),
+                                   "reused": True}
+                continue
+        pending.append(index)
+    count("dedup_hit", len(manifest))
+    count("dedup_miss", len(pending))
+
+    for position, patient_id, pdf, error in pool.render(reports[index] for index in pending):
+        index = pending[position]
+        if error:
+            manifest[index] = {"index": index, "patient_id": patient_id, "error": error}
+            continue
+        key, data, digest = keys[index]
+        with timer("s3.upload", external=True):
+            store.put(key, pdf, _metadata(data, digest))
+        manifest[index] = {"index": index, "patient_id": patient_id, "pdf_url": store.url(key), "reused": False}
+
+    return [manifest[index] for index in sorted(manifest)]
+
+
+def generate_batch(body):
+    """
+    Batch mode: {"reports": [<report payload>, ...], "package": "zip" | "pdf" | "files"}.
+
+    Reports render in parallel worker processes and are written out as they
+    finish. "zip" (default) and "pdf" (one combined document) are assembled
+    in a spooled temp file and uploaded with a multipart upload under a new
+    timestamped key; "files" stores each report under its content-addressed
+    key, skipping reports that are already stored. "zip" and "files" use flat
+    memory for any batch size; "pdf" holds the whole document and is limited
+    to COMBINED_PDF_MAX_REPORTS reports (400 above that).
+    """
+    package = body.get("package", "zip")
+    if package not in ("zip", "pdf", "files"):
+        return {"statusCode": 400, "body": json.dumps({"error": "package must be zip, pdf or files"})}
+    if package == "pdf" and not combined_pdf_available():
+        return {"statusCode": 400, "body": json.dumps({"error": "Combined PDF output is not available; use zip"})}
+    if package == "pdf" and len(body["reports"]) > COMBINED_PDF_MAX_REPORTS:
+        return {"statusCode": 400, "body": json.dumps({
+            "error": f"Combined PDF output is limited to {COMBINED_PDF_MAX_REPORTS} reports; use zip or files"
+        })}
+
+    count("batch_reports", len(body["reports"]))
+
+    with ReportPool(PDF_BATCH_WORKERS, fast_path=PDF_FAST_PATH) as pool:
+        if package == "files":
+            return {"statusCode": 200, "body": json.dumps({"reports": _store_batch(body["reports"], pool)})}
+
+        results = pool.render(body["reports"])
+        store = get_report_store()
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        key = f"reports/batches/handover_{stamp}_{uuid.uuid4().hex[:8]}.{package}"
+        content_type = "application/zip" if package == "zip" else "application/pdf"
+        with tempfile.SpooledTemporaryFile(max_size=PDF_BATCH_SPOOL_BYTES) as archive:
+            with timer("render_batch"):
+                writer = write_zip if package == "zip" else write_combined_pdf
+                manifest = writer(results, archive)
+            archive.seek(0)
+            with timer("s3.upload", external=True):
+                get_s3_client().upload_fileobj(archive, store.bucket, key, ExtraArgs={"ContentType": content_type})
+
+    return {"statusCode": 200, "body": json.dumps({"url": store.url(key), "reports": manifest})}
+
+
+@instrumented("generate_pdf_report")
 def lambda_handler(event, context):
     body = json.loads(event["body"])
-
-    # Patient info
-    patient = body.get("patient", {})
-    patient_id = patient.get("patient_id", "N/A")
-    name = patient.get("name", "N/A")
-    age = patient.get("age", "N/A")
-    gender = patient.get("gender", "N/A")
-    medical_history = patient.get("medical_history", [])
-
-    # Clinical info
-    severity = body.get("severity", "Unknown")
-    reason = body.get("reason", "N/A")
-    recommendation = body.get("recommendation", "N/A")
-    symptoms = body.get("symptoms", [])
-    possible_conditions = body.get("possible_conditions", [])
-
-    # Setup PDF in memory
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    story = []
-
-    styles = getSampleStyleSheet()
-    header_style = ParagraphStyle(
-        "Header",
-        parent=styles["Heading1"],
-        fontSize=16,
-        spaceAfter=6
-    )
-    subheader_style = ParagraphStyle(
-        "SubHeader",
-        parent=styles["Heading2"],
-        fontSize=14,
-        spaceAfter=8
-    )
-    normal = styles["Normal"]
-
-    # Title
-    story.append(Paragraph("Medical Report", header_style))
-    report_time = datetime.now().strftime("%d %b %Y, %I:%M %p")
-    story.append(Paragraph(f"Report Generated: {report_time}", normal))
-    story.append(Spacer(1, 12))
-
-    # Patient info section
-    story.append(Paragraph("Patient Information", subheader_style))
-    patient_table_data = [
-        ["Patient ID", patient_id],
-        ["Name", name],
-        ["Age", str(age)],
-        ["Gender", gender]
-    ]
-    patient_table = Table(patient_table_data, hAlign="LEFT", colWidths=[100, 300])
-    patient_table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),
-        ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-        ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-    ]))
-    story.append(patient_table)
-    story.append(Spacer(1, 8))
-
-    if medical_history:
-        story.append(Paragraph("Medical History:", normal))
-        for history_item in medical_history:
-            story.append(Paragraph(f"• {history_item}", normal))
-        story.append(Spacer(1, 12))
-
-    # Severity section
-    story.append(Paragraph("Overall Severity", subheader_style))
-    story.append(Paragraph(severity, normal))
-    story.append(Spacer(1, 12))
-
-    # Reason
-    story.append(Paragraph("Reason", subheader_style))
-    story.append(Paragraph(reason, normal))
-    story.append(Spacer(1, 12))
-
-    # Recommendation
-    story.append(Paragraph("Recommendation", subheader_style))
-    story.append(Paragraph(recommendation, normal))
-    story.append(Spacer(1, 12))
-
-    # Symptoms (Table)
-    if symptoms:
-        story.append(Paragraph("Reported Symptoms", subheader_style))
-        table_data = [["Name", "Severity", "Duration"]]
-        for s in symptoms:
-            table_data.append([
-                s.get("name", ""),
-                s.get("severity", ""),
-                s.get("duration", "")
-            ])
-
-        table = Table(table_data, hAlign="LEFT")
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-            ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-        ]))
-        story.append(table)
-        story.append(Spacer(1, 12))
-
-    # Possible conditions (Bullet list)
-    if possible_conditions:
-        story.append(Paragraph("Possible Conditions", subheader_style))
-        for condition in possible_conditions:
-            story.append(Paragraph(f"• {condition}", normal))
-        story.append(Spacer(1, 12))
-
-    # Build PDF
-    doc.build(story)
-
-    # Upload to S3
-    buffer.seek(0)
-    bucket = os.environ.get("S3_BUCKET_NAME")
-    key = f"reports/medical_report_{patient_id}.pdf"
-
-    s3_client.upload_fileobj(buffer, bucket, key, ExtraArgs={"ContentType": "application/pdf"})
-
-    pdf_url = f"https://{bucket}.s3.amazonaws.com/{key}"
-
+    if "reports" in body:
+        return generate_batch(body)
+
+    data = parse_report(body)
+    store = get_report_store()
+    digest = report_digest(data)
+    key = report_key(data, digest)
+
+    # An identical payload was rendered before: hand back the stored report.
+    with timer("s3.head_object", external=True):
+        existing = store.find(key)
+    if existing is not None:
+        count("dedup_hit")
+        return {"statusCode": 200, "body": json.dumps({"pdf_url": store.url(key), "reused": True})}
+    count("dedup_miss")
+
+    template = get_report_template()
+    with timer("render_pdf"):
+        pdf_bytes = template.render(data, fast_path=PDF_FAST_PATH)
+
+    with timer("s3.upload", external=True):
+        stored = store.put(key, pdf_bytes, _metadata(data, digest))
+
+    # stored is False when another writer (or a report the HEAD could not
+    # see) already holds the key; that object has the same content.
     return {
         "statusCode": 200,
-        "body": json.dumps({"pdf_url": pdf_url})
+        "body": json.dumps({"pdf_url": store.url(key), "reused": not stored})
     }
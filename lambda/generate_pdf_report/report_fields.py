@@ -0,0 +1,26 @@
+"""
+Report fields and the template version, without reportlab, so the handler can
+hash a payload and serve a stored report before anything is rendered.
+"""
+
+# Part of every stored report's content hash (report_store.report_digest).
+# Bump it when the layout in report_template changes so existing reports are
+# rendered again.
+TEMPLATE_VERSION = "1"
+
+
+def parse_report(body):
+    """Report fields from a request body, with the defaults the handler has always used."""
+    patient = body.get("patient", {})
+    return {
+        "patient_id": patient.get("patient_id", "N/A"),
+        "name": patient.get("name", "N/A"),
+        "age": patient.get("age", "N/A"),
+        "gender": patient.get("gender", "N/A"),
+        "medical_history": patient.get("medical_history", []),
+        "severity": body.get("severity", "Unknown"),
+        "reason": body.get("reason", "N/A"),
+        "recommendation": body.get("recommendation", "N/A"),
+        "symptoms": body.get("symptoms", []),
+        "possible_conditions": body.get("possible_conditions", []),
+    }
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timezone
+from io import BytesIO
+
+from report_fields import TEMPLATE_VERSION
+
+# Reports below this size go up in one conditional PutObject; larger ones use
+# a multipart upload_fileobj. A single-page report is a few KB.
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+_MISSING_CODES = {"404", "NoSuchKey", "NotFound"}
+# Without s3:ListBucket, S3 answers a HEAD on a missing key with 403, so the
+# report may or may not exist; the conditional put below settles it.
+_UNKNOWN_CODES = {"403", "AccessDenied", "Forbidden"}
+_EXISTS_CODES = {"412", "PreconditionFailed", "ConditionalRequestConflict"}
+
+
+def safe_id(patient_id):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(patient_id or "unknown"))
+
+
+def report_digest(data):
+    """
+    SHA-256 of the canonicalized report fields (a parse_report() dict) and the
+    template version. Key order, whitespace between JSON tokens and omitted
+    fields that fall back to defaults do not change the digest.
+    """
+    canonical = json.dumps({"template": TEMPLATE_VERSION, "report": data}, sort_keys=True,
+                           separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def report_key(data, digest=None, prefix="reports"):
+    """Content-addressed key: every distinct report for a patient is kept as its own version."""
+    digest = digest or report_digest(data)
+    return f"{prefix}/{safe_id(data['patient_id'])}/medical_report_{digest[:32]}.pdf"
+
+
+def _error_code(error):
+    return str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+
+
+class ReportStore:
+    """
+    Content-addressed report storage on S3 or any S3-compatible endpoint.
+
+    find() is a HEAD on the report's key, so an identical payload is served
+    without rendering. put() writes with If-None-Match: *, so two containers
+    racing on the same report cannot overwrite each other; the loser's write
+    (412 PreconditionFailed) is reported as already stored. Objects are never
+    overwritten, so earlier reports for a patient stay available under their
+    own keys.
+
+    IAM: s3:PutObject as before, plus s3:GetObject for the HEAD. Add
+    s3:ListBucket so a missing key answers 404; without it the HEAD gets
+    403, find() returns None and every request renders again (the
+    conditional put still keeps the stored object). If-None-Match needs
+    boto3 >= 1.35.16 (see requirements.txt); on an older bundled boto3 the
+    put falls back to an unconditional write, which for a content-addressed
+    key stores the same bytes.
+    """
+
+    def __init__(self, client, bucket, endpoint_url=None):
+        self.client = client
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self._conditional_puts = True
+        self._warned_head_denied = False
+
+    def url(self, key):
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket}/{key}"
+        return f"https://{self.bucket}.s3.amazonaws.com/{key}"
+
+    def find(self, key):
+        """Object metadata if key is already stored, else None."""
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            code = _error_code(e)
+            if code in _MISSING_CODES:
+                return None
+            if code in _UNKNOWN_CODES:
+                if not self._warned_head_denied:
+                    self._warned_head_denied = True
+                    print(f"HEAD on s3://{self.bucket} denied ({code}); grant s3:GetObject and s3:ListBucket "
+                          f"to reuse stored reports")
+                return None
+            raise
+
+    def put(self, key, pdf_bytes, metadata=None):
+        """
+        Uploads straight from the rendered bytes (BytesIO shares a bytes
+        object rather than copying it). Returns False if another writer
+        stored the key first.
+        """
+        metadata = {"generated-at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    **(metadata or {})}
+        try:
+            if len(pdf_bytes) < MULTIPART_THRESHOLD:
+                self._put_object(key, pdf_bytes, metadata)
+            else:
+                # upload_fileobj does not take a precondition on every boto3
+                # version; the key is content-addressed, so a racing rewrite
+                # stores the same bytes.
+                self.client.upload_fileobj(BytesIO(pdf_bytes), self.bucket, key,
+                                           ExtraArgs={"ContentType": "application/pdf", "Metadata": metadata})
+        except Exception as e:
+            if _error_code(e) in _EXISTS_CODES:
+                return False
+            raise
+        return True
+
+    def _put_object(self, key, pdf_bytes, metadata):
+        args = dict(Bucket=self.bucket, Key=key, ContentType="application/pdf", Metadata=metadata)
+        if self._conditional_puts:
+            try:
+                self.client.put_object(Body=BytesIO(pdf_bytes), IfNoneMatch="*", **args)
+                return
+            except Exception as e:
+                # botocore before 1.35.16 does not know the parameter.
+                if type(e).__name__ != "ParamValidationError" or "IfNoneMatch" not in str(e):
+                    raise
+                print("This boto3 does not support conditional writes; reports are written unconditionally")
+                self._conditional_puts = False
+        self.client.put_object(Body=BytesIO(pdf_bytes), **args)
+
+
+class LocalS3Error(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+class LocalS3:
+    """
+    Directory-backed stand-in for the S3 calls ReportStore makes, for local
+    runs without AWS (S3_LOCAL_DIR). For an S3-compatible server such as
+    MinIO or LocalStack, set S3_ENDPOINT_URL instead.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def head_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise LocalS3Error("404", f"{Key} not found")
+        with open(path + ".meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        return {"ContentLength": os.path.getsize(path), **meta}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, Metadata=None, IfNoneMatch=None):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            f = open(path, "xb" if IfNoneMatch == "*" else "wb")
+        except FileExistsError:
+            raise LocalS3Error("PreconditionFailed", f"{Key} already exists")
+        with f:
+            f.write(Body.read())
+        with open(path + ".meta.json", "w", encoding="utf-8") as f:
+            json.dump({"ContentType": ContentType, "Metadata": Metadata or {}}, f)
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None):
+        extra = ExtraArgs or {}
+        self.put_object(Bucket, Key, Fileobj, extra.get("ContentType"), extra.get("Metadata"))
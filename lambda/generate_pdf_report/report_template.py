@@ -0,0 +1,256 @@
+from datetime import datetime
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from xml.sax.saxutils import escape
+
+from report_fields import TEMPLATE_VERSION, parse_report  # noqa: F401 (re-exported)
+
+DISCLAIMER = (
+    "This report was generated by an AI assistant for informational purposes only and is not a "
+    "diagnosis. Please consult a qualified healthcare professional."
+)
+
+# SimpleDocTemplate's default 1 inch margins, shared by both render paths.
+MARGIN = 72
+PAGE_WIDTH, PAGE_HEIGHT = A4
+
+
+class _PageFull(Exception):
+    pass
+
+
+def _wrap(value, font, size, width):
+    # Most fields are short; one width check is cheaper than simpleSplit's per-word pass.
+    value = str(value)
+    if stringWidth(value, font, size) <= width:
+        return [value]
+    return simpleSplit(value, font, size, width) or [""]
+
+
+class ReportTemplate:
+    """
+    The medical report layout, compiled once per container.
+
+    Styles, table styles and every fixed flowable (title, section headings,
+    spacers, disclaimer) are created here; render() only builds the
+    patient-specific flowables. Reports that fit on one page are drawn
+    straight onto a canvas, skipping platypus layout; anything longer goes
+    through SimpleDocTemplate.
+    """
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        self.header_style = ParagraphStyle("Header", parent=styles["Heading1"], fontSize=16, spaceAfter=6)
+        self.subheader_style = ParagraphStyle("SubHeader", parent=styles["Heading2"], fontSize=14, spaceAfter=8)
+        self.normal = styles["Normal"]
+        self.disclaimer_style = ParagraphStyle("Disclaimer", parent=self.normal, fontSize=8, leading=10,
+                                               textColor=colors.grey)
+
+        self.patient_table_style = TableStyle([
+            ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),
+            ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+            ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ])
+        self.symptoms_table_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+            ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ])
+
+        self.title = Paragraph("Medical Report", self.header_style)
+        self.headings = {
+            name: Paragraph(name, self.subheader_style)
+            for name in ("Patient Information", "Overall Severity", "Reason", "Recommendation",
+                         "Reported Symptoms", "Possible Conditions")
+        }
+        self.history_heading = Paragraph("Medical History:", self.normal)
+        self.gap = Spacer(1, 12)
+        self.small_gap = Spacer(1, 8)
+        self.disclaimer = Paragraph(DISCLAIMER, self.disclaimer_style)
+
+    # --- platypus path -------------------------------------------------
+
+    def _text(self, value, style=None):
+        return Paragraph(escape(str(value)), style or self.normal)
+
+    def story(self, data, report_time):
+        story = [self.title, self._text(f"Report Generated: {report_time}"), self.gap,
+                 self.headings["Patient Information"]]
+
+        patient_table = Table([
+            ["Patient ID", data["patient_id"]],
+            ["Name", data["name"]],
+            ["Age", str(data["age"])],
+            ["Gender", data["gender"]]
+        ], hAlign="LEFT", colWidths=[100, 300])
+        patient_table.setStyle(self.patient_table_style)
+        story += [patient_table, self.small_gap]
+
+        if data["medical_history"]:
+            story.append(self.history_heading)
+            story += [self._text(f"• {item}") for item in data["medical_history"]]
+            story.append(self.gap)
+
+        for heading, field in (("Overall Severity", "severity"), ("Reason", "reason"),
+                               ("Recommendation", "recommendation")):
+            story += [self.headings[heading], self._text(data[field]), self.gap]
+
+        if data["symptoms"]:
+            rows = [["Name", "Severity", "Duration"]]
+            rows += [[s.get("name", ""), s.get("severity", ""), s.get("duration", "")] for s in data["symptoms"]]
+            table = Table(rows, hAlign="LEFT")
+            table.setStyle(self.symptoms_table_style)
+            story += [self.headings["Reported Symptoms"], table, self.gap]
+
+        if data["possible_conditions"]:
+            story.append(self.headings["Possible Conditions"])
+            story += [self._text(f"• {condition}") for condition in data["possible_conditions"]]
+            story.append(self.gap)
+
+        story.append(self.disclaimer)
+        return story
+
+    def render_platypus(self, data, report_time):
+        buffer = BytesIO()
+        SimpleDocTemplate(buffer, pagesize=A4).build(self.story(data, report_time))
+        return buffer.getvalue()
+
+    # --- direct canvas path --------------------------------------------
+
+    def _layout(self, data, report_time):
+        """
+        Draw operations for the single-page layout, top to bottom:
+        ("text", font, size, color, x, y, line) and ("cell", x, y, w, h, shaded, grid).
+        Raises _PageFull if the report would run past the bottom margin.
+        """
+        ops = []
+        width = PAGE_WIDTH - 2 * MARGIN
+        y = PAGE_HEIGHT - MARGIN
+
+        def space(points):
+            nonlocal y
+            y -= points
+            if y < MARGIN:
+                raise _PageFull()
+
+        def text(value, font="Helvetica", size=10, leading=12, color=colors.black):
+            for line in _wrap(value, font, size, width):
+                space(leading)
+                ops.append(("text", font, size, color, MARGIN, y + leading - size, line))
+
+        def heading(value, size=14, before=10, after=8):
+            space(before)
+            text(value, "Helvetica-Bold", size, size * 1.2)
+            space(after)
+
+        def table(rows, col_widths, header_row=False, grid=0.25, label_column=False):
+            for r, row in enumerate(rows):
+                bold = header_row and r == 0
+                font = "Helvetica-Bold" if bold else "Helvetica"
+                cells = [_wrap(cell, font, 10, w - 12) for cell, w in zip(row, col_widths)]
+                height = max(len(lines) for lines in cells) * 12 + 3 + (8 if bold else 3)
+                space(height)
+                x = MARGIN
+                for c, (lines, w) in enumerate(zip(cells, col_widths)):
+                    ops.append(("cell", x, y, w, height, bold or (label_column and c == 0), grid))
+                    for i, line in enumerate(lines):
+                        ops.append(("text", font, 10, colors.black, x + 6, y + height - 13 - i * 12, line))
+                    x += w
+
+        text("Medical Report", "Helvetica-Bold", 16, 19.2)
+        space(6)
+        text(f"Report Generated: {report_time}")
+        space(12)
+        heading("Patient Information")
+        table([["Patient ID", data["patient_id"]], ["Name", data["name"]], ["Age", data["age"]],
+               ["Gender", data["gender"]]], [100, 300], label_column=True)
+        space(8)
+
+        if data["medical_history"]:
+            text("Medical History:")
+            for item in data["medical_history"]:
+                text(f"• {item}")
+            space(12)
+
+        for title, field in (("Overall Severity", "severity"), ("Reason", "reason"),
+                             ("Recommendation", "recommendation")):
+            heading(title)
+            text(data[field])
+            space(12)
+
+        if data["symptoms"]:
+            heading("Reported Symptoms")
+            rows = [["Name", "Severity", "Duration"]]
+            rows += [[s.get("name", ""), s.get("severity", ""), s.get("duration", "")] for s in data["symptoms"]]
+            table(rows, [200, 100, 100], header_row=True, grid=0.5)
+            space(12)
+
+        if data["possible_conditions"]:
+            heading("Possible Conditions")
+            for condition in data["possible_conditions"]:
+                text(f"• {condition}")
+            space(12)
+
+        text(DISCLAIMER, size=8, leading=10, color=colors.grey)
+        return ops
+
+    @staticmethod
+    def _may_fit(data):
+        # Lower bound on the page height the list sections need (one line per
+        # item, fixed sections left out), so long reports skip _layout.
+        items = len(data["medical_history"]) + len(data["possible_conditions"])
+        return items * 12 + len(data["symptoms"]) * 18 <= PAGE_HEIGHT - 2 * MARGIN
+
+    def render_canvas(self, data, report_time):
+        """Single-page report drawn directly on a canvas, or None if it needs more than one page."""
+        if not self._may_fit(data):
+            return None
+        try:
+            ops = self._layout(data, report_time)
+        except _PageFull:
+            return None
+
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setTitle("Medical Report")
+        pdf.setStrokeColor(colors.grey)
+        # Cells first so their shading sits under the text; state changes only
+        # go into the content stream when the font or colour actually changes.
+        pdf.setFillColor(colors.lightgrey)
+        for op in ops:
+            if op[0] == "cell":
+                _, x, y, w, h, shaded, grid = op
+                pdf.setLineWidth(grid)
+                pdf.rect(x, y, w, h, stroke=1, fill=1 if shaded else 0)
+        current = None
+        for op in ops:
+            if op[0] == "text":
+                _, font, size, color, x, y, line = op
+                if (font, size, color) != current:
+                    pdf.setFillColor(color)
+                    pdf.setFont(font, size)
+                    current = (font, size, color)
+                pdf.drawString(x, y, line)
+        pdf.showPage()
+        pdf.save()
+        return buffer.getvalue()
+
+    def render(self, data, fast_path=True, report_time=None):
+        """PDF bytes for a parse_report() dict; the canvas path is used when it fits one page."""
+        report_time = report_time or datetime.now().strftime("%d %b %Y, %I:%M %p")
+        if fast_path:
+            pdf = self.render_canvas(data, report_time)
+            if pdf is not None:
+                return pdf
+        return self.render_platypus(data, report_time)
@@ -0,0 +1,86 @@
+from typing import NamedTuple, Optional, Union
+
+_NO_POSITION = (None, None)
+_NO_ADDRESS = {}
+
+
+class Facility(NamedTuple):
+    """Compact record for one place. to_dict() gives the normalize_places shape."""
+    id: Optional[str]
+    name: Optional[str]
+    address: str
+    lat: Optional[float]
+    lon: Optional[float]
+    distance_m: Union[int, float, str]
+    phone: str
+    website: str
+    category: str
+    open_now: Optional[bool]
+
+    def to_dict(self):
+        id_, name, address, lat, lon, distance_m, phone, website, category, open_now = self
+        return {
+            'id': id_,
+            'name': name,
+            'address': address,
+            "lat": lat,
+            "lon": lon,
+            "distance_m": distance_m,
+            "phone": phone,
+            "website": website,
+            "category": category,
+            "open_now": open_now
+        }
+
+
+# tuple.__new__ skips the generated NamedTuple constructor's keyword handling.
+_new_facility = tuple.__new__
+
+
+def to_facility(item):
+    """
+    One search_nearby ResultItem as a Facility. Each nested structure is
+    looked up once and missing fields fall back to shared constants, so the
+    only allocation is the record itself.
+    """
+    get = item.get
+    position = get("Position") or _NO_POSITION
+
+    contacts = get("Contacts")
+    if contacts:
+        phones = contacts.get("Phones")
+        websites = contacts.get("Websites")
+        phone = phones[0].get("Value", "N/A") if phones else "N/A"
+        website = websites[0].get("Value", "N/A") if websites else "N/A"
+    else:
+        phone = website = "N/A"
+
+    categories = get("Categories")
+    opening_hours = get("OpeningHours")
+
+    return _new_facility(Facility, (
+        get("PlaceId"),
+        get("Title"),
+        (get("Address") or _NO_ADDRESS).get("Label", "N/A"),
+        position[1],
+        position[0],
+        get("Distance", "N/A"),
+        phone,
+        website,
+        categories[0].get("Name", "N/A") if categories else "N/A",
+        opening_hours[0].get("OpenNow", False) if opening_hours else None,
+    ))
+
+
+def extract_facilities(raw_places):
+    """Single pass over search_nearby ResultItems, as Facility records."""
+    return [to_facility(item) for item in raw_places]
+
+
+def normalize_places(raw_places):
+    """
+    The same pass as extract_facilities, as dicts, for callers that need a
+    dict for every place (snapshot builds). Each record is dropped as soon
+    as its dict is built, so only the dicts are held.
+    """
+    return [to_facility(item).to_dict() for item in raw_places]
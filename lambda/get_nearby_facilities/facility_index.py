@@ -0,0 +1,211 @@
+import heapq
+import json
+import math
+import time
+from array import array
+
+from geo_cache import EARTH_RADIUS_M, haversine_m
+
+
+def _to_xyz(latitude, longitude):
+    phi = math.radians(latitude)
+    lam = math.radians(longitude)
+    return math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi)
+
+
+def _chord_sq(radius_m):
+    # Squared chord length on the unit sphere for a great-circle distance.
+    # Chord length is monotonic in arc length, so KD-tree pruning stays exact.
+    chord = 2 * math.sin(min(radius_m / EARTH_RADIUS_M, math.pi) / 2)
+    return chord * chord
+
+
+class FacilityIndex:
+    """
+    Array-backed 3-d KD-tree over normalized places (the dicts normalize_places returns).
+
+    Points are stored as unit vectors in flat arrays in tree order: the node
+    for [lo, hi) is its midpoint and its split axis is depth % 3, so the tree
+    needs no node objects or pointers.
+    """
+
+    def __init__(self, places):
+        self.places = [p for p in places if p.get("lat") is not None and p.get("lon") is not None]
+        points = [(_to_xyz(p["lat"], p["lon"]), i) for i, p in enumerate(self.places)]
+        self._build(points, 0, len(points), 0)
+
+        self._x = array("d", (pt[0][0] for pt in points))
+        self._y = array("d", (pt[0][1] for pt in points))
+        self._z = array("d", (pt[0][2] for pt in points))
+        self._ids = array("l", (pt[1] for pt in points))
+
+    def _build(self, points, lo, hi, depth):
+        while hi - lo > 1:
+            axis = depth % 3
+            points[lo:hi] = sorted(points[lo:hi], key=lambda pt: pt[0][axis])
+            mid = (lo + hi) // 2
+            self._build(points, lo, mid, depth + 1)
+            lo, depth = mid + 1, depth + 1
+
+    def __len__(self):
+        return len(self.places)
+
+    def _search(self, target, lo, hi, depth, limit_sq, visit):
+        # visit(dist_sq, slot) is called for every point within limit_sq();
+        # limit_sq is a callable so k-nearest can shrink it as results arrive.
+        # The near side is searched first so the k-nearest bound tightens early.
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        point = (self._x[mid], self._y[mid], self._z[mid])
+        dist_sq = (point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2 + (point[2] - target[2]) ** 2
+        if dist_sq <= limit_sq():
+            visit(dist_sq, mid)
+
+        axis = depth % 3
+        diff = target[axis] - point[axis]
+        near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+        self._search(target, near[0], near[1], depth + 1, limit_sq, visit)
+        if diff * diff <= limit_sq():
+            self._search(target, far[0], far[1], depth + 1, limit_sq, visit)
+
+    def _result(self, latitude, longitude, slot):
+        place = dict(self.places[self._ids[slot]])
+        place["distance_m"] = int(round(haversine_m(latitude, longitude, place["lat"], place["lon"])))
+        return place
+
+    def nearest(self, latitude, longitude, k=10, max_radius_m=None):
+        """k nearest places, optionally capped at max_radius_m, nearest first."""
+        target = _to_xyz(latitude, longitude)
+        cap = _chord_sq(max_radius_m) if max_radius_m is not None else 4.0
+        heap = []  # max-heap of (-dist_sq, slot)
+
+        def limit_sq():
+            return -heap[0][0] if len(heap) == k else cap
+
+        def visit(dist_sq, slot):
+            if len(heap) < k:
+                heapq.heappush(heap, (-dist_sq, slot))
+            else:
+                heapq.heappushpop(heap, (-dist_sq, slot))
+
+        self._search(target, 0, len(self._ids), 0, limit_sq, visit)
+        ordered = sorted((-neg, slot) for neg, slot in heap)
+        return [self._result(latitude, longitude, slot) for _, slot in ordered]
+
+    def within_radius(self, latitude, longitude, radius_m, limit=None):
+        """All places within radius_m, nearest first, truncated to limit."""
+        target = _to_xyz(latitude, longitude)
+        cap = _chord_sq(radius_m)
+        found = []
+        self._search(target, 0, len(self._ids), 0, lambda: cap, lambda d, slot: found.append((d, slot)))
+        found.sort()
+        if limit is not None:
+            found = found[:limit]
+        return [self._result(latitude, longitude, slot) for _, slot in found]
+
+
+class FacilitySnapshot:
+    """
+    Per-category FacilityIndex loaded from a snapshot file:
+
+        {"generated_at": <epoch seconds>,
+         "places": {"hospital": [...], "clinics": [...]},
+         "coverage": {"hospital": [[lat, lon, radius_m], ...], ...}}
+
+    where each list holds normalize_places output. The snapshot is a sweep
+    around seed points, so it only knows every place inside the coverage
+    discs: one per seed, as far as that sweep proved complete.
+    """
+
+    def __init__(self, places_by_category, generated_at, coverage=None):
+        self.generated_at = generated_at
+        self.indexes = {category: FacilityIndex(places) for category, places in places_by_category.items()}
+        self.coverage = coverage or {}
+        if places_by_category and not self.coverage:
+            print("Facility snapshot has no coverage; rebuild it with facility_index.py. "
+                  "Until then it only answers when the live API is unavailable.")
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("places", {}), data.get("generated_at", 0), data.get("coverage"))
+
+    def is_fresh(self, max_age_seconds):
+        return time.time() - self.generated_at <= max_age_seconds
+
+    def covered_radius(self, latitude, longitude, category):
+        """Radius around the point inside which the snapshot holds every place (0 if none)."""
+        return max((radius - haversine_m(latitude, longitude, lat, lon)
+                    for lat, lon, radius in self.coverage.get(category, ())), default=0.0)
+
+    def query(self, latitude, longitude, category, radius_m, limit, require_coverage=True):
+        """
+        Places within radius_m for category, nearest first, or None when the
+        snapshot can't answer: the query disc is outside the swept coverage
+        and the places found don't prove the nearest `limit` either.
+        require_coverage=False returns whatever is there (or None if nothing),
+        for when the live API is unavailable.
+        """
+        index = self.indexes.get(category)
+        if index is None:
+            return None
+        places = index.within_radius(latitude, longitude, radius_m, limit=limit)
+        if not require_coverage and not places:
+            return None
+        covered = self.covered_radius(latitude, longitude, category) if require_coverage else radius_m
+        full = len(places) == limit and places[-1]["distance_m"] <= covered
+        if radius_m > covered and not full:
+            return None
+        for place in places:
+            # Opening state in the snapshot is a point-in-time value.
+            place["open_now"] = None
+        return places
+
+
+def write_snapshot(path, places_by_category, coverage):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"generated_at": int(time.time()), "places": places_by_category, "coverage": coverage}, f)
+
+
+def sweep_coverage(latitude, longitude, radius, max_results, places):
+    """
+    Coverage disc of one seed sweep. A sweep that hit max_results returned
+    the places nearest the seed, so it is complete only out to its farthest.
+    """
+    if len(places) < max_results:
+        return [latitude, longitude, radius]
+    farthest = max((haversine_m(latitude, longitude, p["lat"], p["lon"])
+                    for p in places if p.get("lat") is not None and p.get("lon") is not None), default=0.0)
+    return [latitude, longitude, int(farthest)]
+
+
+if __name__ == "__main__":
+    # Build a snapshot by sweeping the live API over seed points:
+    #   python facility_index.py snapshot.json 3.1390,101.6869 1.3521,103.8198 --radius 20000
+    import argparse
+    from lambda_function import CATEGORY_MAP, normalize_places, search_nearby_places
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output")
+    parser.add_argument("points", nargs="+", help="lat,lon seed points")
+    parser.add_argument("--radius", type=int, default=20000)
+    parser.add_argument("--max-results", type=int, default=100)
+    args = parser.parse_args()
+
+    snapshot = {}
+    coverage = {}
+    for category in CATEGORY_MAP:
+        seen = {}
+        coverage[category] = []
+        for point in args.points:
+            lat, lon = map(float, point.split(","))
+            raw = search_nearby_places(lon, lat, category, args.radius, args.max_results)
+            places = normalize_places(raw)
+            for place in places:
+                seen[place["id"]] = place
+            coverage[category].append(sweep_coverage(lat, lon, args.radius, args.max_results, places))
+        snapshot[category] = list(seen.values())
+        print(f"{category}: {len(seen)} places, complete within {[c[2] for c in coverage[category]]} m of the seeds")
+    write_snapshot(args.output, snapshot, coverage)
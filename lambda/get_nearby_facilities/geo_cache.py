@@ -0,0 +1,239 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from dynamodb_tier import DynamoDBTier
+from facility import Facility
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+EARTH_RADIUS_M = 6371000.0
+
+# Requested radii are rounded up to one of these, so nearby callers share
+# entries. Larger radii are not cached (radius_bucket returns None).
+RADIUS_BUCKETS_M = [1000, 2000, 3000, 5000, 10000, 20000, 50000]
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 6) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash: str):
+    """Return (min_lat, max_lat, min_lon, max_lon) of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for ch in geohash:
+        bits = _GEOHASH_ALPHABET.index(ch)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (bits >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def radius_bucket(radius: int):
+    for bucket in RADIUS_BUCKETS_M:
+        if radius <= bucket:
+            return bucket
+    return None
+
+
+class Tile:
+    """
+    A geohash cell plus one query from its centre shared by every caller in it.
+    Raises ValueError for a radius above the largest bucket.
+    """
+
+    def __init__(self, latitude, longitude, category, radius, precision=6):
+        self.geohash = geohash_encode(latitude, longitude, precision)
+        self.category = category
+        self.radius_bucket = radius_bucket(radius)
+        if self.radius_bucket is None:
+            raise ValueError(f"radius {radius} m is above the largest cached bucket")
+        min_lat, max_lat, min_lon, max_lon = geohash_bounds(self.geohash)
+        self.center_lat = (min_lat + max_lat) / 2
+        self.center_lon = (min_lon + max_lon) / 2
+        # Bucket + half-diagonal reaches the requested radius from every point
+        # in the cell. That only makes the tile complete for a caller when the
+        # API returned every place in range; see answers().
+        self.query_radius = int(math.ceil(
+            self.radius_bucket + haversine_m(self.center_lat, self.center_lon, max_lat, max_lon)
+        ))
+
+    def answers(self, facilities, saturated, latitude, longitude, radius, ranked, max_results):
+        """
+        Whether `ranked` (rerank_for_caller of this tile's facilities) is the
+        caller's true nearest-first list. An unsaturated tile holds every
+        place within query_radius. A saturated one holds the places nearest
+        the centre (search_nearby returns results by distance), i.e. every
+        place within `reach` of the centre, where reach is the distance of
+        the farthest one; for a caller d away from the centre that proves
+        completeness out to reach - d.
+        """
+        if not saturated:
+            return True
+        reach = max((haversine_m(self.center_lat, self.center_lon, f.lat, f.lon)
+                     for f in facilities if f.lat is not None and f.lon is not None), default=0.0)
+        proven = reach - haversine_m(self.center_lat, self.center_lon, latitude, longitude)
+        needed = ranked[-1].distance_m if len(ranked) >= max_results else radius
+        return needed <= proven
+
+    @property
+    def key(self):
+        return f"{self.category}:{self.geohash}:{self.radius_bucket}"
+
+
+def rerank_for_caller(facilities, latitude, longitude, radius, max_results):
+    """Recompute distance_m from the caller, drop places outside radius, sort nearest first."""
+    ranked = []
+    for facility in facilities:
+        if facility.lat is None or facility.lon is None:
+            continue
+        distance = haversine_m(latitude, longitude, facility.lat, facility.lon)
+        if distance <= radius:
+            ranked.append((distance, facility))
+    ranked.sort(key=lambda pair: pair[0])
+    return [facility._replace(distance_m=int(round(distance))) for distance, facility in ranked[:max_results]]
+
+
+class MemoryTier:
+    """Per-container LRU of tile entries (lists of Facility records) with per-entry expiry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, items, ttl_seconds):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, items)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def persistent_tier(table):
+    """
+    DynamoDB tier for tile entries: partition key "tile_key" (S), "items" as
+    a JSON array of Facility rows, "expires_at" as the TTL attribute.
+    """
+    return DynamoDBTier(table, "tile_key", "items", decode=lambda rows: [Facility(*row) for row in rows])
+
+
+class GeoTileCache:
+    """
+    Tile cache for nearby-place searches.
+
+    Entries holding opening-hours data get the short open_now_ttl, since
+    OpenNow goes stale quickly; entries without it keep place_ttl.
+    """
+
+    def __init__(self, memory=None, persistent=None, place_ttl=86400, open_now_ttl=900):
+        self.memory = memory if memory is not None else MemoryTier()
+        self.persistent = persistent
+        self.place_ttl = place_ttl
+        self.open_now_ttl = open_now_ttl
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, hit, persistent=False):
+        # Multi-category searches hit the cache from several threads.
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+                if persistent:
+                    self.persistent_hits += 1
+            else:
+                self.misses += 1
+
+    def ttl_for(self, items):
+        if any(facility.open_now is not None for facility in items):
+            return self.open_now_ttl
+        return self.place_ttl
+
+    def get(self, key):
+        items = self.memory.get(key)
+        if items is not None:
+            self._count(True)
+            return items
+
+        if self.persistent is not None:
+            try:
+                found = self.persistent.get_entry(key)
+            except Exception as e:
+                print(f"Geo cache persistent tier read failed: {e}")
+                found = None
+            if found is not None:
+                items, expires_at = found
+                self._count(True, persistent=True)
+                self.memory.put(key, items, max(1, expires_at - time.time()))
+                return items
+
+        self._count(False)
+        return None
+
+    def put(self, key, items):
+        ttl = self.ttl_for(items)
+        self.memory.put(key, items, ttl)
+        if self.persistent is not None:
+            try:
+                self.persistent.put(key, items, ttl)
+            except Exception as e:
+                print(f"Geo cache persistent tier write failed: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0
+        }
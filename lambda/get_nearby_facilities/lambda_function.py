@@ -1,77 +1,208 @@
 import os
-import boto3
 import json
+from concurrent.futures import ThreadPoolExecutor
+import aws_clients
+from aws_clients import CircuitOpenError
+from facility import extract_facilities, normalize_places  # noqa: F401 (normalize_places is public API)
+from facility_index import FacilitySnapshot
+from instrumentation import count, instrumented, submit, timer
+from geo_cache import GeoTileCache, MemoryTier, Tile, persistent_tier, radius_bucket, rerank_for_caller
 
 # AWS credentials and keys are set via Lambda environment variables
-aws_region = os.environ.get("AWS_DEFAULT_REGION", "us-east-1")
 aws_location_service_key = os.environ.get("AWS_LOCATION_SERVICE_KEY")
 
-client = boto3.client("geo-places", region_name="us-east-1")
-
-
-def search_nearby_places(longitude: float, latitude: float, category: str = 'hospital', radius: int = 5000):
-    category_map = {
-        'hospital': [
-            'hospital',
-            'hospital_emergency_room',
-            'hospital_or_health_care_facility'
-        ],
-        'clinics': [
-            'medical_services-clinics'
-        ],
-        'pharmacy': [
-            'pharmacy',
-            'drugstore_or_pharmacy'
-        ],
-        'dentist': [
-            'dentist-dental_office'
-        ]
-    }
 
-    response = client.search_nearby(
-        Key=aws_location_service_key,
-        QueryPosition=[longitude, latitude],
-        QueryRadius=radius,
-        MaxResults=10,
-        Filter={
-            'IncludeCategories': category_map.get(category, ['hospital'])
-        },
-        Language='en',
-        AdditionalFeatures=['Contact'],
+def get_client():
+    # Created on first use by the shared factory: snapshot and tile-cache
+    # hits never call the API. The region is pinned in aws_clients.
+    return aws_clients.client("geo-places")
+
+
+MAX_RESULTS = 10
+# Largest max_results a caller may ask for (five pages).
+MAX_RESULTS_LIMIT = 500
+# search_nearby returns at most this many items per page; larger requests follow NextToken.
+PAGE_SIZE = 100
+
+CATEGORY_MAP = {
+    'hospital': [
+        'hospital',
+        'hospital_emergency_room',
+        'hospital_or_health_care_facility'
+    ],
+    'clinics': [
+        'medical_services-clinics'
+    ],
+    'pharmacy': [
+        'pharmacy',
+        'drugstore_or_pharmacy'
+    ],
+    'dentist': [
+        'dentist-dental_office'
+    ]
+}
+
+# Tile queries are shared by every caller in the cell, so they fetch a wider
+# candidate set than one caller's top 10 before re-ranking.
+TILE_MAX_RESULTS = int(os.environ.get("GEO_TILE_MAX_RESULTS", "50"))
+GEO_TILE_PRECISION = int(os.environ.get("GEO_TILE_PRECISION", "6"))
+
+
+def _build_geo_cache():
+    # GEO_CACHE_TABLE enables the persistent DynamoDB tier shared across containers.
+    persistent = None
+    table_name = os.environ.get("GEO_CACHE_TABLE")
+    if table_name:
+        persistent = persistent_tier(lambda: aws_clients.resource("dynamodb").Table(table_name))
+    return GeoTileCache(
+        memory=MemoryTier(max_entries=int(os.environ.get("GEO_CACHE_SIZE", "1024"))),
+        persistent=persistent,
+        place_ttl=int(os.environ.get("GEO_CACHE_PLACE_TTL_SECONDS", "86400")),
+        open_now_ttl=int(os.environ.get("GEO_CACHE_OPEN_NOW_TTL_SECONDS", "900"))
     )
-    return response.get("ResultItems", [])
-
-
-def normalize_places(raw_places):
-    clean_list = []
-    for item in raw_places:
-        clean_list.append({
-            'id': item.get('PlaceId'),
-            'name': item.get('Title'),
-            'address': item.get('Address', {}).get('Label', 'N/A'),
-            "lat": item.get("Position", [None, None])[1],
-            "lon": item.get("Position", [None, None])[0],
-            "distance_m": item.get("Distance", "N/A"),
-            "phone": (
-                item.get("Contacts", {}).get("Phones", [{}])[0].get("Value", "N/A")
-                if "Contacts" in item else "N/A"
-            ),
-            "website": (
-                item.get("Contacts", {}).get("Websites", [{}])[0].get("Value", "N/A")
-                if "Contacts" in item else "N/A"
-            ),
-            "category": (
-                item.get("Categories", [{}])[0].get("Name", "N/A")
-                if "Categories" in item else "N/A"
-            ),
-            "open_now": (
-                item.get("OpeningHours", [{}])[0].get("OpenNow", False)
-                if "OpeningHours" in item else None
-            )
-        })
-    return clean_list
 
 
+geo_cache = _build_geo_cache()
+
+
+def _load_facility_snapshot():
+    # FACILITY_SNAPSHOT_PATH points at a snapshot bundled with the function
+    # (see facility_index.py to build one). Without it every request goes live.
+    path = os.environ.get("FACILITY_SNAPSHOT_PATH")
+    if not path or not os.path.exists(path):
+        return None
+    snapshot = FacilitySnapshot.load(path)
+    print(f"Loaded facility snapshot: { {c: len(i) for c, i in snapshot.indexes.items()} }")
+    return snapshot
+
+
+facility_snapshot = _load_facility_snapshot()
+FACILITY_SNAPSHOT_MAX_AGE_SECONDS = int(os.environ.get("FACILITY_SNAPSHOT_MAX_AGE_SECONDS", str(7 * 86400)))
+
+# Shared across warm invocations; multi-category searches fan out on it.
+_search_pool = ThreadPoolExecutor(max_workers=len(CATEGORY_MAP))
+
+
+def find_facilities(longitude: float, latitude: float, category: str = 'hospital', radius: int = 5000,
+                    max_results: int = MAX_RESULTS):
+    """
+    Normalized facilities near a point. A fresh local snapshot answers directly;
+    the live search (through the geo-tile cache) only runs when the snapshot is
+    missing, stale, or has nothing within the radius.
+    """
+    if category not in CATEGORY_MAP:
+        category = 'hospital'
+    if facility_snapshot is not None and facility_snapshot.is_fresh(FACILITY_SNAPSHOT_MAX_AGE_SECONDS):
+        with timer("snapshot_query"):
+            places = facility_snapshot.query(latitude, longitude, category, radius, max_results)
+        if places is not None:
+            count("snapshot_hit")
+            return places
+    try:
+        facilities = search_facilities(longitude, latitude, category, radius, max_results)
+    except CircuitOpenError:
+        # geo-places is degraded: a stale snapshot beats failing fast with nothing.
+        if facility_snapshot is None:
+            raise
+        places = facility_snapshot.query(latitude, longitude, category, radius, max_results, require_coverage=False)
+        if places is None:
+            raise
+        count("stale_snapshot_hit")
+        return places
+    return [facility.to_dict() for facility in facilities]
+
+
+def find_facilities_multi(longitude: float, latitude: float, categories, radius: int = 5000,
+                          max_results: int = MAX_RESULTS):
+    """
+    Search several categories concurrently and return one list, deduplicated
+    by place id and sorted by distance. Each place is tagged with the
+    facility_type (category key) it was first found under.
+    """
+    categories = list(dict.fromkeys(c if c in CATEGORY_MAP else 'hospital' for c in categories))
+    futures = [
+        (category, submit(_search_pool, find_facilities, longitude, latitude, category, radius, max_results))
+        for category in categories
+    ]
+
+    merged = {}
+    for category, future in futures:
+        for place in future.result():
+            key = place["id"] or (place["name"], place["lat"], place["lon"])
+            if key not in merged:
+                merged[key] = dict(place, facility_type=category)
+
+    def distance(place):
+        d = place["distance_m"]
+        return d if isinstance(d, (int, float)) else float("inf")
+
+    return sorted(merged.values(), key=distance)[:max_results]
+
+
+def search_facilities(longitude: float, latitude: float, category: str = 'hospital', radius: int = 5000,
+                      max_results: int = MAX_RESULTS, use_cache: bool = True):
+    """Live search as Facility records, served through the geo-tile cache."""
+    if category not in CATEGORY_MAP:
+        category = 'hospital'
+    # Tile entries hold TILE_MAX_RESULTS candidates, so bigger requests go
+    # live, as do radii above the largest tile bucket.
+    if not use_cache or max_results > TILE_MAX_RESULTS or radius_bucket(radius) is None:
+        return _search_live(longitude, latitude, category, radius, max_results)
+
+    tile = Tile(latitude, longitude, category, radius, precision=GEO_TILE_PRECISION)
+    facilities = geo_cache.get(tile.key)
+    if facilities is None:
+        count("cache_miss")
+        raw = search_nearby_places(tile.center_lon, tile.center_lat, category, tile.query_radius, TILE_MAX_RESULTS)
+        facilities = extract_facilities(raw)
+        geo_cache.put(tile.key, facilities)
+    else:
+        print(f"Geo cache hit {tile.key}: {geo_cache.stats()}")
+        count("cache_hit")
+    ranked = rerank_for_caller(facilities, latitude, longitude, radius, max_results)
+    # A full tile in a dense cell holds the places nearest its centre; a
+    # caller near the edge may have closer ones the tile never saw.
+    saturated = len(facilities) >= TILE_MAX_RESULTS
+    if not tile.answers(facilities, saturated, latitude, longitude, radius, ranked, max_results):
+        count("cache_incomplete")
+        return _search_live(longitude, latitude, category, radius, max_results)
+    return ranked
+
+
+def _search_live(longitude, latitude, category, radius, max_results):
+    return extract_facilities(search_nearby_places(longitude, latitude, category, radius, max_results))
+
+
+def search_nearby_places(longitude: float, latitude: float, category: str = 'hospital', radius: int = 5000,
+                         max_results: int = MAX_RESULTS):
+    if category not in CATEGORY_MAP:
+        category = 'hospital'
+    items = []
+    next_token = None
+    while len(items) < max_results:
+        params = dict(
+            Key=aws_location_service_key,
+            QueryPosition=[longitude, latitude],
+            QueryRadius=radius,
+            MaxResults=min(PAGE_SIZE, max_results - len(items)),
+            Filter={
+                'IncludeCategories': CATEGORY_MAP[category]
+            },
+            Language='en',
+            AdditionalFeatures=['Contact'],
+        )
+        if next_token:
+            params['NextToken'] = next_token
+        with timer("geo_places.search_nearby", external=True):
+            response = get_client().search_nearby(**params)
+        items.extend(response.get("ResultItems", []))
+        next_token = response.get("NextToken")
+        if not next_token:
+            break
+    return items
+
+
+@instrumented("get_nearby_facilities")
 def lambda_handler(event, context):
     """
     Expected event format (API Gateway or direct):
@@ -81,21 +212,55 @@ def lambda_handler(event, context):
         "category": "clinics",
         "radius": 3000
     }
+    "categories": ["clinics", "pharmacy"] (or "clinics,pharmacy") searches
+    several types at once, and "max_results" raises the default of 10 (up to
+    MAX_RESULTS_LIMIT).
     """
     try:
         longitude = float(event.get("longitude"))
         latitude = float(event.get("latitude"))
         category = event.get("category", "hospital")
         radius = int(event.get("radius", 5000))
+        max_results = int(event.get("max_results", MAX_RESULTS))
+        if not 1 <= max_results <= MAX_RESULTS_LIMIT:
+            return {
+                "statusCode": 400,
+                "body": json.dumps({"error": f"max_results must be between 1 and {MAX_RESULTS_LIMIT}"})
+            }
+
+        categories = event.get("categories")
+        if categories is not None:
+            if isinstance(categories, str):
+                categories = categories.split(",")
+            categories = [str(c).strip() for c in categories if str(c).strip()] if isinstance(categories, list) else []
+            unknown = [c for c in categories if c not in CATEGORY_MAP]
+            if not categories or unknown:
+                return {
+                    "statusCode": 400,
+                    "body": json.dumps({"error": f"Invalid categories {unknown or event.get('categories')!r}; "
+                                                 f"use any of {sorted(CATEGORY_MAP)}"})
+                }
+        else:
+            # A single category keeps its old leniency: missing, empty or unknown means hospital.
+            categories = [category or "hospital"]
 
-        raw = search_nearby_places(longitude, latitude, category, radius)
-        cleaned = normalize_places(raw)
+        if len(categories) > 1:
+            cleaned = find_facilities_multi(longitude, latitude, categories, radius, max_results)
+        else:
+            cleaned = find_facilities(longitude, latitude, categories[0], radius, max_results)
 
         return {
             "statusCode": 200,
             "body": cleaned
         }
 
+    except CircuitOpenError as e:
+        return {
+            "statusCode": 503,
+            "headers": {"Retry-After": str(max(1, round(e.retry_in)))},
+            "body": json.dumps({"error": str(e)})
+        }
+
     except Exception as e:
         return {
             "statusCode": 500,
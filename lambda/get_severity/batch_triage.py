@@ -0,0 +1,138 @@
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import count
+
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket. acquire() blocks until a token is available."""
+
+    def __init__(self, rate_per_second: float, capacity: float = None):
+        self.rate = rate_per_second
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_throttling_error(error: Exception) -> bool:
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+
+def call_with_backoff(fn, *args, max_attempts=6, base_delay=0.25, max_delay=8.0):
+    """
+    Call fn, retrying throttling errors with full-jitter exponential backoff.
+    An open circuit (aws_clients.CircuitOpenError) is waited out for its retry_in.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn(*args)
+        except Exception as e:
+            attempt += 1
+            retry_in = getattr(e, "retry_in", None)
+            if (retry_in is None and not is_throttling_error(e)) or attempt >= max_attempts:
+                raise
+            if retry_in is not None:
+                count("circuit_wait")
+                time.sleep(retry_in + random.uniform(0, base_delay))
+            else:
+                count("throttle")
+                time.sleep(random.uniform(0, min(max_delay, base_delay * (2 ** attempt))))
+            count("retry")
+
+
+def triage_batch(symptom_texts, classify, concurrency=8, rate_per_second=10.0, max_attempts=6):
+    """
+    Classify an iterable of symptom texts concurrently and yield results in input order.
+
+    classify(text, rate_limiter) must call rate_limiter.acquire() (when it
+    is not None) right before each model call, so cache and red-flag hits
+    are not held to rate_per_second. At most `concurrency` calls run at once and at most about `concurrency * 2`
+    results are held in memory, so arbitrarily long streams can be processed.
+    Each yielded dict has "index", "symptom_text" and either "classification"
+    or "error".
+    """
+    bucket = TokenBucket(rate_per_second) if rate_per_second else None
+
+    def run(index, text):
+        try:
+            classification = call_with_backoff(classify, text, bucket, max_attempts=max_attempts)
+            return {"index": index, "symptom_text": text, "classification": classification}
+        except Exception as e:
+            return {"index": index, "symptom_text": text, "error": str(e)}
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, text in enumerate(symptom_texts):
+            pending.append(executor.submit(run, index, text))
+            if len(pending) >= concurrency * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_jsonl(stream):
+    """Yield symptom texts from JSONL lines: either a JSON string or {"symptom_text": ...}."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        yield record if isinstance(record, str) else record["symptom_text"]
+
+
+if __name__ == "__main__":
+    import argparse
+    from lambda_function import classify_severity
+
+    parser = argparse.ArgumentParser(description="Re-triage a JSONL file of symptom notes.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", default="triage_results.jsonl")
+    parser.add_argument("--model-id", default="amazon.nova-lite-v1:0")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=10.0, help="Max model calls per second (cache and red-flag hits are not limited)")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    started = time.perf_counter()
+    triaged = 0
+    with source, open(args.output, "w", encoding="utf-8") as sink:
+        results = triage_batch(
+            read_jsonl(source),
+            lambda text, rate_limiter: classify_severity(text, model_id=args.model_id, use_cache=not args.no_cache,
+                                                         raise_unavailable=True, rate_limiter=rate_limiter),
+            concurrency=args.concurrency,
+            rate_per_second=args.rate
+        )
+        for result in results:
+            sink.write(json.dumps(result) + "\n")
+            triaged += 1
+    elapsed = time.perf_counter() - started
+    print(f"Triaged {triaged} notes in {elapsed:.1f}s ({triaged / elapsed * 60 if elapsed else 0:.0f}/min)", file=sys.stderr)
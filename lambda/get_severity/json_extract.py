@@ -0,0 +1,105 @@
+import json
+import re
+
+_STRUCTURAL = re.compile(r'[{}"]')
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+
+_DECODER = json.JSONDecoder()
+
+SEVERITY_LEVELS = {"mild", "moderate", "severe"}
+
+
+def iter_json_objects(text: str):
+    """
+    Yield each outermost balanced {...} span in text, in a single linear scan.
+
+    Runs of plain text and whole JSON strings are skipped by compiled regexes,
+    so Python only visits braces and string openings. Braces inside strings
+    (including escaped quotes) are ignored, and quotes outside an object are
+    treated as prose. An unbalanced trailing object (e.g. a completion cut
+    off by maxTokens) is not yielded.
+    """
+    depth = 0
+    start = -1
+    pos = 0
+    search = _STRUCTURAL.search
+    match_string = _STRING.match
+
+    while True:
+        m = search(text, pos)
+        if m is None:
+            return
+        i = m.start()
+        ch = text[i]
+        pos = i + 1
+        if ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif depth == 0:
+            continue
+        elif ch == '"':
+            s = match_string(text, i)
+            if s is None:
+                return
+            pos = s.end()
+        else:
+            depth -= 1
+            if depth == 0:
+                yield text[start:pos]
+
+
+def validate_severity_object(obj):
+    """
+    Check obj against the triage schema and return a normalized copy, or None.
+
+    severity must be one of mild/moderate/severe (any case) and reason and
+    recommendation must be strings. Missing symptoms/possible_conditions
+    default to empty lists.
+    """
+    if not isinstance(obj, dict):
+        return None
+
+    severity = obj.get("severity")
+    if not isinstance(severity, str) or severity.strip().lower() not in SEVERITY_LEVELS:
+        return None
+    if not isinstance(obj.get("reason"), str) or not isinstance(obj.get("recommendation"), str):
+        return None
+
+    symptoms = obj.get("symptoms", [])
+    conditions = obj.get("possible_conditions", [])
+    if not isinstance(symptoms, list) or not all(isinstance(s, dict) for s in symptoms):
+        return None
+    if not isinstance(conditions, list):
+        return None
+
+    normalized = dict(obj)
+    normalized["severity"] = severity.strip().lower()
+    normalized["symptoms"] = symptoms
+    normalized["possible_conditions"] = [str(c) for c in conditions]
+    return normalized
+
+
+def extract_severity_json(text: str):
+    """Return the first schema-valid triage object embedded in text, or None."""
+    # Fast path: decode straight from the first brace in C. raw_decode stops at
+    # the end of the object, so fences and trailing prose don't matter.
+    first = text.find("{")
+    if first == -1:
+        return None
+    try:
+        valid = validate_severity_object(_DECODER.raw_decode(text, first)[0])
+        if valid is not None:
+            return valid
+    except ValueError:
+        pass
+
+    for candidate in iter_json_objects(text):
+        try:
+            obj = json.loads(candidate)
+        except ValueError:
+            continue
+        valid = validate_severity_object(obj)
+        if valid is not None:
+            return valid
+    return None
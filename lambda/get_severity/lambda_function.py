@@ -1,41 +1,36 @@
 import os
-import boto3
 import json
-import re
+from concurrent.futures import ThreadPoolExecutor
+import aws_clients
+from aws_clients import CircuitOpenError
+from batch_triage import triage_batch
+from dynamodb_tier import DynamoDBTier
+from instrumentation import count, instrumented, submit, timer
+from json_extract import extract_severity_json
+from red_flags import RedFlagEngine, enrich_classification
+from stream_triage import EarlySeverityParser, iter_nova_text
+from triage_cache import TriageCache, LRUTier, make_cache_key
 
-aws_region = os.environ.get("AWS_DEFAULT_REGION", "us-east-1")
-runtime = boto3.client("bedrock-runtime", region_name=aws_region)
 
+def get_runtime():
+    # Created on first use by the shared factory: red-flag and cache hits
+    # never need boto3, so its import stays off the cold-start path for them.
+    # Batch triage fans out across threads, so the pool must cover its concurrency.
+    return aws_clients.client(
+        "bedrock-runtime",
+        max_pool_connections=int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", "32"))
+    )
 
-def _extract_json_from_text(text: str):
-    # try direct parse
-    try:
-        return json.loads(text)
-    except Exception:
-        pass
-
-    # try fenced ```json ... ```
-    m = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
-    if m:
-        try:
-            return json.loads(m.group(1))
-        except Exception:
-            pass
-
-    # try first {...} block
-    m = re.search(r'(\{.*?\})', text, re.DOTALL)
-    if m:
-        try:
-            return json.loads(m.group(1))
-        except Exception:
-            pass
-
-    return None
-
-
-def classify_severity(symptom_text: str, model_id="amazon.nova-lite-v1:0"):
-    print(f"SYMPTOM: {symptom_text}")
-    instruction = """
+
+DEFAULT_MODEL_ID = "amazon.nova-lite-v1:0"
+
+INFERENCE_CONFIG = {
+    "maxTokens": 300,
+    "temperature": 0.3,
+    "topP": 0.9
+}
+
+SEVERITY_INSTRUCTION = """
     You are a medical triage assistant.
     Classify the severity of the patient's symptoms into one of:
     - Mild: Mild, can be managed at home.
@@ -52,30 +47,142 @@ def classify_severity(symptom_text: str, model_id="amazon.nova-lite-v1:0"):
     - possible_conditions: array of strings
     """
 
-    body = {
+
+def _build_triage_cache():
+    # The LRU lives at module scope so it is reused across warm invocations.
+    # TRIAGE_CACHE_TABLE enables the shared DynamoDB tier across containers.
+    ttl_seconds = int(os.environ.get("TRIAGE_CACHE_TTL_SECONDS", "3600"))
+    local = LRUTier(
+        max_entries=int(os.environ.get("TRIAGE_CACHE_SIZE", "512")),
+        ttl_seconds=ttl_seconds
+    )
+    shared = None
+    table_name = os.environ.get("TRIAGE_CACHE_TABLE")
+    if table_name:
+        shared = DynamoDBTier(lambda: aws_clients.resource("dynamodb").Table(table_name), "cache_key", "result",
+                              ttl_seconds=ttl_seconds)
+    return TriageCache(local=local, shared=shared)
+
+
+triage_cache = _build_triage_cache()
+
+red_flag_engine = RedFlagEngine()
+
+# Red-flag hits return without a model call. With RED_FLAG_ENRICH=true the
+# model call still runs on this pool and lands in the triage cache, so later
+# lookups for the same note return the rule result merged with the model's
+# symptoms and conditions. Work left pending when the container freezes
+# resumes on the next warm invocation.
+RED_FLAG_ENRICH = os.environ.get("RED_FLAG_ENRICH", "false").lower() == "true"
+_enrichment_pool = ThreadPoolExecutor(max_workers=2)
+
+
+def _extract_json_from_text(text: str):
+    # Single pass over the text for the first balanced, schema-valid object.
+    # Handles fenced blocks, trailing prose and nested symptoms objects.
+    return extract_severity_json(text)
+
+
+def _build_request_body(symptom_text: str) -> dict:
+    return {
         "messages": [
             {
                 "role": "user",
                 "content": [
-                    {"text": f"{instruction}\n\nSymptom description: {symptom_text}"}
+                    {"text": f"{SEVERITY_INSTRUCTION}\n\nSymptom description: {symptom_text}"}
                 ]
             }
         ],
-        "inferenceConfig": {
-            "maxTokens": 300,
-            "temperature": 0.3,
-            "topP": 0.9
-        }
+        "inferenceConfig": INFERENCE_CONFIG
     }
 
-    response = runtime.invoke_model(
-        modelId=model_id,
-        body=json.dumps(body),
-        contentType="application/json",
-        accept="application/json"
-    )
 
-    result = json.loads(response["body"].read())
+def _fallback_classification(output_text: str) -> dict:
+    return {
+        "severity": "Unknown",
+        "reason": output_text if output_text else "No response",
+        "recommendation": "Retry classification",
+        "symptoms": [],
+        "possible_conditions": []
+    }
+
+
+def _red_flag_classification(symptom_text, model_id, cache_key, use_cache, rate_limiter=None):
+    with timer("red_flags"):
+        match = red_flag_engine.match(symptom_text)
+    if match is None:
+        return None
+    print(f"Red-flag rule fired: {match.rule['name']} {match.matched_terms}")
+    count("red_flag_hit")
+
+    result = match.classification()
+    if use_cache:
+        model_result = triage_cache.get(cache_key)
+        if model_result is not None:
+            return enrich_classification(result, model_result)
+        if RED_FLAG_ENRICH:
+            submit(_enrichment_pool, _classify_with_model, symptom_text, model_id, cache_key, True,
+                   rate_limiter=rate_limiter)
+    return result
+
+
+def classify_severity(symptom_text: str, model_id=DEFAULT_MODEL_ID, use_cache=True, use_rules=True,
+                      raise_unavailable=False, rate_limiter=None):
+    """
+    raise_unavailable=True re-raises CircuitOpenError instead of returning
+    the "Unknown" fallback, for batch callers that should wait and retry.
+    rate_limiter.acquire() (batch_triage.TokenBucket) is called just before
+    the model call, so cache and red-flag hits don't wait for it.
+    """
+    print(f"SYMPTOM: {symptom_text}")
+
+    cache_key = make_cache_key(symptom_text, model_id, INFERENCE_CONFIG)
+    if use_rules:
+        flagged = _red_flag_classification(symptom_text, model_id, cache_key, use_cache, rate_limiter)
+        if flagged is not None:
+            return flagged
+
+    if use_cache:
+        cached = _cached_classification(cache_key)
+        if cached is not None:
+            return cached
+
+    return _classify_with_model(symptom_text, model_id, cache_key, use_cache, raise_unavailable, rate_limiter)
+
+
+def _cached_classification(cache_key):
+    # Both the plain and the streaming path count hits and misses here.
+    cached = triage_cache.get(cache_key)
+    if cached is None:
+        count("cache_miss")
+        return None
+    print(f"Triage cache hit: {triage_cache.stats()}")
+    count("cache_hit")
+    return cached
+
+
+def _unavailable_classification(error):
+    # Bedrock's circuit is open: answer at once instead of queueing on a
+    # degraded dependency. Like the parse fallback, this is never cached.
+    return _fallback_classification(f"Triage model temporarily unavailable: {error}")
+
+
+def _classify_with_model(symptom_text, model_id, cache_key, use_cache, raise_unavailable=False, rate_limiter=None):
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    try:
+        with timer("bedrock.invoke_model", external=True):
+            response = get_runtime().invoke_model(
+                modelId=model_id,
+                body=json.dumps(_build_request_body(symptom_text)),
+                contentType="application/json",
+                accept="application/json"
+            )
+            result = json.loads(response["body"].read())
+    except CircuitOpenError as e:
+        if raise_unavailable:
+            raise
+        return _unavailable_classification(e)
 
     output_text = ""
     if "output" in result:
@@ -84,19 +191,85 @@ def classify_severity(symptom_text: str, model_id="amazon.nova-lite-v1:0"):
         if contents and "text" in contents[0]:
             output_text = contents[0]["text"].strip()
 
-    structured = _extract_json_from_text(output_text)
+    return _finish_classification(output_text, cache_key, use_cache)
+
+
+def _finish_classification(output_text: str, cache_key: str, use_cache: bool):
+    with timer("extract_json"):
+        structured = _extract_json_from_text(output_text)
     if not structured:
-        structured = {
-            "severity": "Unknown",
-            "reason": output_text if output_text else "No response",
-            "recommendation": "Retry classification",
-            "symptoms": [],
-            "possible_conditions": []
-        }
+        # Never cache the fallback, so a retry gets a fresh model call.
+        return _fallback_classification(output_text)
+
+    if use_cache:
+        triage_cache.put(cache_key, structured)
 
     return structured
 
 
+def classify_severity_stream(symptom_text: str, model_id=DEFAULT_MODEL_ID, use_cache=True, use_rules=True, client=None):
+    """
+    Streaming variant of classify_severity for the urgent path.
+
+    Yields {"type": "severity", "severity": ...} as soon as the top-level
+    severity field has streamed in, then {"type": "result", "classification": ...}
+    once the completion ends. If the severity never streams cleanly, only the
+    result event is produced. `client` defaults to the module Bedrock client;
+    pass any object with invoke_model_with_response_stream (see
+    stream_triage.fake_nova_stream) to run locally.
+    """
+    print(f"SYMPTOM (stream): {symptom_text}")
+
+    cache_key = make_cache_key(symptom_text, model_id, INFERENCE_CONFIG)
+    if use_rules:
+        flagged = _red_flag_classification(symptom_text, model_id, cache_key, use_cache)
+        if flagged is not None:
+            yield {"type": "severity", "severity": flagged["severity"]}
+            yield {"type": "result", "classification": flagged}
+            return
+
+    if use_cache:
+        cached = _cached_classification(cache_key)
+        if cached is not None:
+            yield {"type": "severity", "severity": cached["severity"]}
+            yield {"type": "result", "classification": cached}
+            return
+
+    try:
+        response = (client or get_runtime()).invoke_model_with_response_stream(
+            modelId=model_id,
+            body=json.dumps(_build_request_body(symptom_text)),
+            contentType="application/json",
+            accept="application/json"
+        )
+    except CircuitOpenError as e:
+        yield {"type": "result", "classification": _unavailable_classification(e)}
+        return
+
+    parser = EarlySeverityParser()
+    for delta in iter_nova_text(response["body"]):
+        severity = parser.feed(delta)
+        if severity is not None:
+            yield {"type": "severity", "severity": severity}
+
+    yield {"type": "result", "classification": _finish_classification(parser.text().strip(), cache_key, use_cache)}
+
+
+def classify_severity_batch(symptom_texts, model_id=DEFAULT_MODEL_ID, concurrency=8, rate_per_second=10.0):
+    """
+    Classify many symptom texts with bounded concurrency and rate limiting.
+    Returns a generator of results in input order (see batch_triage.triage_batch).
+    """
+    return triage_batch(
+        symptom_texts,
+        lambda text, rate_limiter: classify_severity(text, model_id=model_id, raise_unavailable=True,
+                                                     rate_limiter=rate_limiter),
+        concurrency=concurrency,
+        rate_per_second=rate_per_second
+    )
+
+
+@instrumented("get_severity")
 def lambda_handler(event, context):
 
     symptom_text = event.get("symptom_text", "")
@@ -0,0 +1,277 @@
+import re
+from collections import deque
+
+# Words, plus punctuation: clause breaks (see CLAUSE_BREAKS), list commas
+# and the colon of "chest pain: none".
+_WORD = re.compile(r"[a-z0-9']+|[,;:.!?]")
+
+# Phrases are matched case-insensitively on whole words. Each concept
+# groups the ways patients tend to phrase the same finding.
+RED_FLAG_CONCEPTS = {
+    "chest_pain": [
+        "chest pain", "chest pains", "chest tightness", "tight chest", "chest pressure",
+        "pressure in my chest", "pain in my chest", "crushing chest",
+    ],
+    "breathlessness": [
+        "shortness of breath", "short of breath", "difficulty breathing", "trouble breathing",
+        "hard to breathe", "can't breathe", "cannot breathe", "breathless", "gasping for air",
+    ],
+    "face_droop": [
+        "face drooping", "facial droop", "face is drooping", "drooping face", "one side of my face",
+        "crooked smile",
+    ],
+    "speech_difficulty": [
+        "slurred speech", "slurring", "can't speak", "cannot speak", "trouble speaking",
+        "difficulty speaking", "words are jumbled",
+    ],
+    "one_sided_weakness": [
+        "weakness on one side", "one side of my body", "arm weakness", "numb on one side",
+        "can't lift my arm", "cannot lift my arm", "sudden numbness",
+    ],
+    "airway_swelling": [
+        "throat swelling", "throat is swelling", "swollen throat", "tongue swelling",
+        "swollen tongue", "lips swelling", "swollen lips", "face swelling",
+    ],
+    "severe_bleeding": [
+        "bleeding won't stop", "bleeding will not stop", "heavy bleeding", "coughing up blood",
+        "vomiting blood", "blood in vomit",
+    ],
+    "unresponsive": [
+        "unconscious", "unresponsive", "not waking up", "seizing", "convulsing", "having a seizure",
+    ],
+    # Often reported as past history ("fainted once two years ago"), so these
+    # only count alongside another current finding.
+    "fainting": [
+        "fainted", "fainting", "passed out", "blacked out", "seizure", "seizures",
+    ],
+    "self_harm": [
+        "suicidal", "kill myself", "end my life", "want to die", "want to hurt myself",
+        "going to hurt myself",
+    ],
+}
+
+# Each rule fires when at least `min_concepts` of its concepts are present.
+RED_FLAG_RULES = [
+    {
+        "name": "cardiac_chest_pain_with_dyspnea",
+        "concepts": ["chest_pain", "breathlessness"],
+        "reason": "Chest pain together with shortness of breath can indicate a heart attack or pulmonary embolism.",
+        "possible_conditions": ["Acute coronary syndrome", "Pulmonary embolism"],
+    },
+    {
+        "name": "stroke_signs",
+        "concepts": ["face_droop", "speech_difficulty", "one_sided_weakness"],
+        "min_concepts": 2,
+        "reason": "Facial drooping, speech difficulty or one-sided weakness are warning signs of a stroke.",
+        "possible_conditions": ["Stroke", "Transient ischemic attack"],
+    },
+    {
+        "name": "anaphylaxis",
+        "concepts": ["airway_swelling", "breathlessness"],
+        "reason": "Swelling of the face or throat with breathing difficulty can indicate anaphylaxis.",
+        "possible_conditions": ["Anaphylaxis"],
+    },
+    {
+        "name": "severe_bleeding",
+        "concepts": ["severe_bleeding"],
+        "reason": "Uncontrolled bleeding or bleeding from the airway or stomach needs emergency care.",
+        "possible_conditions": ["Hemorrhage"],
+    },
+    {
+        "name": "loss_of_consciousness",
+        "concepts": ["unresponsive"],
+        "reason": "Loss of consciousness or a seizure needs immediate medical assessment.",
+        "possible_conditions": ["Syncope", "Seizure"],
+    },
+    {
+        "name": "syncope_with_chest_pain",
+        "concepts": ["fainting", "chest_pain"],
+        "reason": "Fainting together with chest pain can indicate a dangerous heart rhythm or heart attack.",
+        "possible_conditions": ["Cardiac syncope", "Acute coronary syndrome"],
+    },
+    {
+        "name": "self_harm_risk",
+        "concepts": ["self_harm"],
+        "reason": "Thoughts of self-harm need immediate support from emergency or crisis services.",
+        "possible_conditions": ["Mental health crisis"],
+    },
+]
+
+EMERGENCY_RECOMMENDATION = "Call your local emergency services or go to the nearest emergency department immediately."
+
+NEGATION_CUES = {
+    "no", "not", "denies", "denied", "without", "never", "negative", "nor",
+    "don't", "doesn't", "didn't", "haven't", "hasn't", "isn't", "wasn't", "aren't",
+    "dont", "doesnt", "didnt", "havent", "hasnt", "isnt", "wasnt", "arent",
+}
+# A negation or history cue covers the rest of its clause, so it carries
+# through lists ("denies fever, chest pain, or shortness of breath") and
+# stops at one of these or at a new subject ("no cough, I can't breathe").
+CLAUSE_BREAKS = {";", ".", "!", "?", "but", "however", "although", "though"}
+CLAUSE_SUBJECTS = {
+    "i", "i'm", "im", "i've", "ive", "he", "he's", "she", "she's", "they", "they're", "we", "we're",
+}
+# "chest pain: none", "shortness of breath - no", "fever denied".
+TRAILING_NEGATIONS = {"none", "no", "denied", "negative", "absent", "nil"}
+# Past or family history anywhere in a clause takes the whole clause out of
+# the rules ("had chest pain last year", "my dad had a stroke with slurred
+# speech"); the model still sees the text and judges it.
+HISTORY_CUES = {
+    "had", "history", "previously", "ago",
+    "dad", "mom", "mum", "father", "mother", "brother", "sister",
+    "grandfather", "grandmother", "grandpa", "grandma", "uncle", "aunt",
+}
+HISTORY_PHRASES = ["family history", "last year", "last month", "last week", "in the past", "used to"]
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher: one pass over a sequence finds every pattern occurrence.
+
+    Patterns and input are sequences of symbols; RedFlagEngine uses word
+    tokens, so the automaton steps once per word rather than per character.
+    The trie is stored as flat lists (goto dicts, fail links, outputs) indexed
+    by node id, and built once per container.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, sequence):
+        """Yield (pattern_index, start, end) for every occurrence in sequence."""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        node = 0
+        for i, ch in enumerate(sequence):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                yield index, i + 1 - len(patterns[index]), i + 1
+
+
+def _tokenize(text):
+    return _WORD.findall(text.lower().replace("\u2019", "'"))
+
+
+def _clause_flags(tokens):
+    """
+    Per token: (negated, history). negated is True once a negation cue has
+    been seen earlier in the token's clause; history is True for every token
+    of a clause with a history cue in it.
+    """
+    negated = [False] * len(tokens)
+    history = [False] * len(tokens)
+    start = 0
+    for end in range(len(tokens) + 1):
+        at_break = end < len(tokens) and tokens[end] in CLAUSE_BREAKS
+        if end < len(tokens) and not at_break and not (tokens[end] in CLAUSE_SUBJECTS and end > start):
+            continue
+        clause = tokens[start:end]
+        text = f" {' '.join(clause)} "
+        past = any(word in HISTORY_CUES for word in clause) or any(f" {p} " in text for p in HISTORY_PHRASES)
+        seen = False
+        for i in range(start, end):
+            negated[i] = seen
+            history[i] = past
+            seen = seen or tokens[i] in NEGATION_CUES
+        start = end + 1 if at_break else end
+    return negated, history
+
+
+def _denied_after(tokens, end):
+    # "chest pain: none", "shortness of breath is negative"
+    if end < len(tokens) and tokens[end] in (":", "is", "was"):
+        end += 1
+    return end < len(tokens) and tokens[end] in TRAILING_NEGATIONS
+
+
+class RedFlagMatch:
+    def __init__(self, rule, matched_terms):
+        self.rule = rule
+        self.matched_terms = matched_terms
+
+    def classification(self):
+        return {
+            "severity": "severe",
+            "reason": self.rule["reason"],
+            "recommendation": EMERGENCY_RECOMMENDATION,
+            "symptoms": [],
+            "possible_conditions": list(self.rule["possible_conditions"]),
+            "triage_source": "rule",
+            "red_flag_rule": self.rule["name"],
+            "matched_terms": self.matched_terms,
+        }
+
+
+class RedFlagEngine:
+    def __init__(self, concepts=None, rules=None):
+        concepts = concepts if concepts is not None else RED_FLAG_CONCEPTS
+        self.rules = rules if rules is not None else RED_FLAG_RULES
+        phrases = []
+        self._concept_of = []
+        for concept, terms in concepts.items():
+            for term in terms:
+                phrases.append(tuple(_tokenize(term)))
+                self._concept_of.append(concept)
+        self._matcher = AhoCorasick(phrases)
+
+    def match(self, symptom_text: str):
+        """Return the first RedFlagMatch whose rule is satisfied, or None."""
+        tokens = _tokenize(symptom_text)
+        negated, history = _clause_flags(tokens)
+        found = {}
+        for index, start, end in self._matcher.iter_matches(tokens):
+            # Anything negated, denied or historical goes to the model instead.
+            if negated[start] or history[start] or _denied_after(tokens, end):
+                continue
+            found.setdefault(self._concept_of[index], []).append(" ".join(self._matcher.patterns[index]))
+
+        if not found:
+            return None
+        for rule in self.rules:
+            present = [c for c in rule["concepts"] if c in found]
+            if len(present) >= rule.get("min_concepts", len(rule["concepts"])):
+                terms = [term for c in present for term in found[c]]
+                return RedFlagMatch(rule, terms)
+        return None
+
+
+def enrich_classification(rule_result: dict, model_result: dict) -> dict:
+    """Merge a model classification into a rule hit. The rule keeps the severity."""
+    enriched = dict(rule_result)
+    enriched["symptoms"] = model_result.get("symptoms", [])
+    conditions = list(rule_result["possible_conditions"])
+    for condition in model_result.get("possible_conditions", []):
+        if condition not in conditions:
+            conditions.append(condition)
+    enriched["possible_conditions"] = conditions
+    enriched["model_severity"] = model_result.get("severity")
+    enriched["model_reason"] = model_result.get("reason")
+    return enriched
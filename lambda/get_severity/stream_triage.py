@@ -0,0 +1,101 @@
+import json
+from json_extract import SEVERITY_LEVELS
+
+
+class EarlySeverityParser:
+    """
+    Incremental scanner over a streamed triage JSON completion.
+
+    feed() consumes text deltas as they arrive and returns the top-level
+    "severity" value (normalized to lower case) the moment its closing quote
+    has been seen, otherwise None.
+    Nested "severity" keys (inside symptoms) are ignored by tracking depth.
+    """
+
+    def __init__(self):
+        self.severity = None
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = -1
+        self._last_key = None
+        self._expecting_value = False
+
+    def feed(self, delta: str):
+        self._text += delta
+        if self.severity is not None:
+            return None
+
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._on_string(text[self._string_start:i + 1]):
+                        self._pos = i + 1
+                        return self.severity
+            elif ch == '"' and self._depth:
+                self._in_string = True
+                self._string_start = i
+            elif ch == "{" or ch == "[":
+                self._depth += 1
+            elif ch == "}" or ch == "]":
+                self._depth -= 1
+            elif self._depth == 1:
+                if ch == ":":
+                    self._expecting_value = True
+                elif ch == ",":
+                    self._expecting_value = False
+                    self._last_key = None
+        self._pos = len(text)
+        return None
+
+    def _on_string(self, literal):
+        try:
+            value = json.loads(literal)
+        except ValueError:
+            # Invalid escape in the model's output: this key or value can't be
+            # read early, so leave it to the final parse.
+            value = None
+        if not self._expecting_value:
+            self._last_key = value
+            return False
+        self._expecting_value = False
+        if self._last_key == "severity" and isinstance(value, str):
+            # Anything off-schema is left for the final parse to judge.
+            if value.strip().lower() in SEVERITY_LEVELS:
+                self.severity = value.strip().lower()
+                return True
+        return False
+
+    def text(self):
+        return self._text
+
+
+def iter_nova_text(event_stream):
+    """Yield text deltas from an invoke_model_with_response_stream body for Nova models."""
+    for event in event_stream:
+        chunk = event.get("chunk")
+        if not chunk:
+            continue
+        payload = json.loads(chunk["bytes"])
+        delta = payload.get("contentBlockDelta", {}).get("delta", {})
+        if "text" in delta:
+            yield delta["text"]
+
+
+def fake_nova_stream(text: str, chunk_size: int = 8):
+    """Build a local stand-in for the Nova response stream, split into small deltas."""
+    events = [{"chunk": {"bytes": json.dumps({"messageStart": {"role": "assistant"}}).encode()}}]
+    for i in range(0, len(text), chunk_size):
+        delta = {"contentBlockDelta": {"delta": {"text": text[i:i + chunk_size]}, "contentBlockIndex": 0}}
+        events.append({"chunk": {"bytes": json.dumps(delta).encode()}})
+    events.append({"chunk": {"bytes": json.dumps({"messageStop": {"stopReason": "end_turn"}}).encode()}})
+    return {"body": events}
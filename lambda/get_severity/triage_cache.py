@@ -0,0 +1,120 @@
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_symptom_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different notes share a key."""
+    return " ".join(text.split()).lower()
+
+
+def make_cache_key(symptom_text: str, model_id: str, inference_config: dict) -> str:
+    """Content-addressed key over the normalized text, model and inference settings."""
+    payload = json.dumps(
+        [normalize_symptom_text(symptom_text), model_id, inference_config],
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUTier:
+    """In-process LRU with per-entry expiry. Lives in module scope, so it survives warm invocations."""
+
+    def __init__(self, max_entries=512, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TriageCache:
+    """
+    Two-tier triage result cache: a local LRU in front of an optional shared
+    tier (dynamodb_tier.DynamoDBTier on a table keyed on "cache_key").
+
+    Shared-tier failures are logged and treated as misses so a cache outage
+    never blocks classification.
+    """
+
+    def __init__(self, local=None, shared=None):
+        self.local = local if local is not None else LRUTier()
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, hit, shared=False):
+        # Batch triage calls the cache from worker threads.
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+                if shared:
+                    self.shared_hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._count(True)
+            return copy.deepcopy(value)
+
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"Triage cache shared tier read failed: {e}")
+                value = None
+            if value is not None:
+                self._count(True, shared=True)
+                self.local.put(key, value)
+                return copy.deepcopy(value)
+
+        self._count(False)
+        return None
+
+    def put(self, key, value):
+        value = copy.deepcopy(value)
+        self.local.put(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, value)
+            except Exception as e:
+                print(f"Triage cache shared tier write failed: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "local_entries": len(self.local)
+        }
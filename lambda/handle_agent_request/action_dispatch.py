@@ -0,0 +1,190 @@
+"""
+Runs the agent's return-control functions inside handle_agent_request.
+
+Without this, every returnControl goes to the app, which calls the
+matching Lambda and posts the result back: two more round trips over the
+mobile network per tool call. ActionDispatcher runs the registered
+functions here instead and the handler feeds their results straight back
+through returnControlInvocationResults. A function raises NeedsClient when
+only the app can answer (no GPS location in the request), and the whole
+returnControl then goes to the app as before.
+
+The default functions call the sibling Lambdas (the handler needs
+lambda:InvokeFunction on them) and are registered only when their names
+are configured:
+    SEVERITY_FUNCTION_NAME    get_severity           -> classify_severity
+    FACILITIES_FUNCTION_NAME  get_nearby_facilities  -> search_nearby_places
+
+With FACILITIES_FUNCTION_NAME set, a moderate or severe classification also
+starts the matching facility search in the background (facility_prefetch;
+FACILITY_PREFETCH=false turns it off).
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import aws_clients
+from aws_clients import CircuitOpenError
+from facility_prefetch import FacilityPrefetcher
+from instrumentation import count, submit, timer
+
+SEVERITY_FUNCTION_NAME = os.environ.get("SEVERITY_FUNCTION_NAME")
+FACILITIES_FUNCTION_NAME = os.environ.get("FACILITIES_FUNCTION_NAME")
+FACILITY_PREFETCH = os.environ.get("FACILITY_PREFETCH", "true").lower() == "true"
+
+# The agent prompt says "clinic"; get_nearby_facilities calls the category "clinics".
+CATEGORY_ALIASES = {"clinic": "clinics", "hospitals": "hospital", "pharmacies": "pharmacy", "dentists": "dentist"}
+
+
+class NeedsClient(Exception):
+    """The function cannot run server-side for this call; the app has to answer it."""
+
+
+class ActionSession:
+    """What the functions may use besides the agent's parameters: the app's location, if it sent one."""
+
+    def __init__(self, session_id, location=None):
+        self.session_id = session_id
+        self.location = location
+
+    @classmethod
+    def from_body(cls, body):
+        # {"location": {"latitude": 3.139, "longitude": 101.6869}} alongside the prompt
+        location = body.get("location") or {}
+        try:
+            location = (float(location["latitude"]), float(location["longitude"]))
+        except (KeyError, TypeError, ValueError):
+            location = None
+        return cls(body.get("sessionId"), location)
+
+
+def function_parameters(function_input):
+    return {parameter["name"]: parameter.get("value") for parameter in function_input.get("parameters", [])}
+
+
+def invoke_lambda(function_name, payload):
+    """Synchronous Lambda invoke; returns the body of a 200 response or raises."""
+    with timer(f"lambda.{function_name}", external=True):
+        response = aws_clients.client("lambda").invoke(
+            FunctionName=function_name,
+            Payload=json.dumps(payload).encode("utf-8")
+        )
+    result = json.loads(response["Payload"].read() or b"null")
+    if response.get("FunctionError") or not isinstance(result, dict) or result.get("statusCode") != 200:
+        raise RuntimeError(f"{function_name} failed: {result}")
+    return result["body"]
+
+
+def _search_facilities(latitude, longitude, category):
+    return invoke_lambda(FACILITIES_FUNCTION_NAME, {"latitude": latitude, "longitude": longitude, "category": category})
+
+
+prefetcher = FacilityPrefetcher(_search_facilities) if FACILITIES_FUNCTION_NAME and FACILITY_PREFETCH else None
+
+
+def note_severity(session, classification):
+    """
+    Starts a facility prefetch for a moderate or severe classification (the
+    get_severity body, or its JSON text when the app ran the function).
+    """
+    if prefetcher is None or session.location is None:
+        return
+    if isinstance(classification, str):
+        try:
+            classification = json.loads(classification)
+        except ValueError:
+            return
+    if isinstance(classification, dict):
+        prefetcher.after_severity(session.session_id, session.location, classification.get("severity"))
+
+
+def classify_severity(parameters, session):
+    symptom_text = parameters.get("symptom_text") or parameters.get("symptoms_text")
+    if not symptom_text:
+        raise NeedsClient("no symptom text")
+    classification = invoke_lambda(SEVERITY_FUNCTION_NAME, {"symptom_text": symptom_text})
+    note_severity(session, classification)
+    return classification
+
+
+def search_nearby_places(parameters, session):
+    if session.location is None:
+        raise NeedsClient("no location")
+    latitude, longitude = session.location
+    category = str(parameters.get("category") or "hospital").strip().lower()
+    category = CATEGORY_ALIASES.get(category, category)
+    if prefetcher is not None:
+        facilities = prefetcher.take(session.session_id, session.location, category)
+        if facilities is not None:
+            return facilities
+    return _search_facilities(latitude, longitude, category)
+
+
+class ActionDispatcher:
+    """
+    Registry of function name -> handler(parameters, session). A handler
+    returns the result for the agent (a string, or anything JSON-encodable)
+    or raises NeedsClient.
+    """
+
+    def __init__(self, functions=None):
+        self.functions = dict(functions or {})
+
+    def register(self, function, handler):
+        self.functions[function] = handler
+
+    def __bool__(self):
+        return bool(self.functions)
+
+    def _run_one(self, invocation_input, session):
+        function_input = invocation_input.get("functionInvocationInput")
+        if function_input is None or function_input.get("function") not in self.functions:
+            raise NeedsClient("not registered")
+        function = function_input["function"]
+        with timer(f"action.{function}"):
+            result = self.functions[function](function_parameters(function_input), session)
+        return {
+            "functionResult": {
+                "actionGroup": function_input["actionGroup"],
+                "function": function,
+                "responseBody": {"TEXT": {"body": result if isinstance(result, str) else json.dumps(result)}}
+            }
+        }
+
+    def run(self, return_control, session):
+        """
+        returnControlInvocationResults for every input in a returnControl
+        payload, or None if any of them has to go to the app.
+        """
+        inputs = return_control.get("invocationInputs", [])
+        if not inputs:
+            return None
+        # The agent call before this has loaded botocore already.
+        from botocore.exceptions import BotoCoreError, ClientError
+        try:
+            if len(inputs) == 1:
+                results = [self._run_one(inputs[0], session)]
+            else:
+                with ThreadPoolExecutor(max_workers=len(inputs)) as pool:
+                    futures = [submit(pool, self._run_one, item, session) for item in inputs]
+                    results = [future.result() for future in futures]
+        except NeedsClient as e:
+            print(f"Returning control to the app: {e}")
+            count("action_returned_to_client")
+            return None
+        except (CircuitOpenError, RuntimeError, ClientError, BotoCoreError) as e:
+            # The app can still run the action itself, as it always has.
+            print(f"Server-side action failed, returning control to the app: {e}")
+            count("action_failed")
+            return None
+        count("action_server_side", len(results))
+        return results
+
+
+def default_dispatcher():
+    dispatcher = ActionDispatcher()
+    if SEVERITY_FUNCTION_NAME:
+        dispatcher.register("get_severity", classify_severity)
+    if FACILITIES_FUNCTION_NAME:
+        dispatcher.register("get_nearby_facilities", search_nearby_places)
+    return dispatcher
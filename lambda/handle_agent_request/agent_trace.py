@@ -0,0 +1,85 @@
+import time
+
+# Trace sections in an invoke_agent trace event, in the order the agent runs them.
+TRACE_SECTIONS = ("preProcessingTrace", "orchestrationTrace", "postProcessingTrace")
+
+
+def _event_seconds(trace_part):
+    # eventTime is a datetime on the boto3 event; fall back to arrival time.
+    event_time = trace_part.get("eventTime")
+    if event_time is not None and hasattr(event_time, "timestamp"):
+        return event_time.timestamp()
+    return time.time()
+
+
+class TraceTimeline:
+    """
+    Per-step timing built from invoke_agent trace events.
+
+    Steps are paired by traceId: modelInvocationInput -> modelInvocationOutput
+    is a model invocation, invocationInput -> observation in the
+    orchestration trace is an action group (or knowledge base) call. Each
+    section's span runs from its first to its last event. Durations are in
+    milliseconds.
+    """
+
+    def __init__(self):
+        self.model_invocations = []  # (section, ms, usage dict)
+        self.actions = []            # (invocation type, action group/function, ms)
+        self.sections = {}           # section -> [first seconds, last seconds]
+        self.failures = []
+        self._open_models = {}
+        self._open_actions = {}
+
+    def add(self, trace_part):
+        """Feed the value of one event['trace']."""
+        at = _event_seconds(trace_part)
+        trace = trace_part.get("trace", {})
+        if "failureTrace" in trace:
+            self.failures.append(trace["failureTrace"].get("failureReason"))
+        for section in TRACE_SECTIONS:
+            step = trace.get(section)
+            if step is None:
+                continue
+            span = self.sections.setdefault(section, [at, at])
+            span[1] = at
+            self._add_step(section, step, at)
+
+    def _add_step(self, section, step, at):
+        if "modelInvocationInput" in step:
+            self._open_models[step["modelInvocationInput"].get("traceId")] = at
+        elif "modelInvocationOutput" in step:
+            output = step["modelInvocationOutput"]
+            started = self._open_models.pop(output.get("traceId"), None)
+            metadata = output.get("metadata", {})
+            if "totalTimeMs" in metadata:
+                ms = metadata["totalTimeMs"]
+            elif started is not None:
+                ms = (at - started) * 1000
+            else:
+                return
+            self.model_invocations.append((section, ms, metadata.get("usage", {})))
+        elif "invocationInput" in step:
+            invocation = step["invocationInput"]
+            action = invocation.get("actionGroupInvocationInput", {})
+            name = f"{action.get('actionGroupName')}/{action.get('function') or action.get('apiPath')}" if action else None
+            self._open_actions[invocation.get("traceId")] = (invocation.get("invocationType"), name, at)
+        elif "observation" in step:
+            opened = self._open_actions.pop(step["observation"].get("traceId"), None)
+            if opened is not None:
+                invocation_type, name, started = opened
+                self.actions.append((invocation_type, name, (at - started) * 1000))
+
+    def summary(self):
+        input_tokens = sum(usage.get("inputTokens", 0) for _, _, usage in self.model_invocations)
+        output_tokens = sum(usage.get("outputTokens", 0) for _, _, usage in self.model_invocations)
+        return {
+            "sections_ms": {section: round((last - first) * 1000, 1) for section, (first, last) in self.sections.items()},
+            "model_invocations": len(self.model_invocations),
+            "model_ms": round(sum(ms for _, ms, _ in self.model_invocations), 1),
+            "actions": [{"type": t, "name": n, "ms": round(ms, 1)} for t, n, ms in self.actions],
+            "action_ms": round(sum(ms for _, _, ms in self.actions), 1),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "failures": self.failures
+        }
@@ -0,0 +1,136 @@
+"""
+Speculative facility searches, started when triage comes back moderate or severe.
+
+The agent nearly always offers nearby facilities right after get_severity
+returns moderate or severe, but the search used to start only after
+another full turn. FacilityPrefetcher starts the matching category search
+in the background as soon as the classification is known (if the session
+has a location) and keeps the result per session, so the later
+get_nearby_facilities call is answered from memory.
+
+Entries live in the container that started them, for PREFETCH_TTL_SECONDS.
+A lookup is a hit when the category matches and the location has moved
+less than PREFETCH_MAX_DRIFT_DEGREES. An entry is wasted when it expires,
+is evicted or replaced, or a lookup for its session wants something else.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import count, log, submit
+
+PREFETCH_TTL_SECONDS = float(os.environ.get("PREFETCH_TTL_SECONDS", "600"))
+# About 200 m of latitude.
+PREFETCH_MAX_DRIFT_DEGREES = float(os.environ.get("PREFETCH_MAX_DRIFT_DEGREES", "0.002"))
+# How long a lookup waits for a prefetch that is still running before searching itself.
+PREFETCH_WAIT_SECONDS = float(os.environ.get("PREFETCH_WAIT_SECONDS", "10"))
+
+# Triage severity -> the facility category the agent will be asked for.
+SEVERITY_CATEGORIES = {"severe": "hospital", "moderate": "clinics"}
+
+
+class FacilityPrefetcher:
+    """search(latitude, longitude, category) runs on a small thread pool."""
+
+    def __init__(self, search, max_sessions=1024, ttl_seconds=PREFETCH_TTL_SECONDS,
+                 max_drift=PREFETCH_MAX_DRIFT_DEGREES, wait_seconds=PREFETCH_WAIT_SECONDS, max_workers=4):
+        self.search = search
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_drift = max_drift
+        self.wait_seconds = wait_seconds
+        self._entries = OrderedDict()  # session_id -> (expires_at, location, category, future)
+        self._lock = threading.RLock()
+        self._executor = None
+        self._max_workers = max_workers
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+
+    def _waste(self, reason):
+        with self._lock:
+            self.wasted += 1
+        count("prefetch_wasted")
+        print(f"Facility prefetch wasted ({reason})")
+
+    def after_severity(self, session_id, location, severity):
+        """Starts the search for a moderate or severe result; returns the category or None."""
+        category = SEVERITY_CATEGORIES.get(str(severity or "").strip().lower())
+        if category is None or location is None or not session_id:
+            return None
+        self.expire()
+        with self._lock:
+            previous = self._entries.pop(session_id, None)
+            if previous is not None:
+                if previous[2] == category and self._near(previous[1], location) and previous[0] > time.time():
+                    # Same search already running or done for this session.
+                    self._entries[session_id] = previous
+                    return category
+                self._waste("replaced")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="prefetch")
+            future = submit(self._executor, self.search, location[0], location[1], category)
+            self._entries[session_id] = (time.time() + self.ttl_seconds, location, category, future)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+                self._waste("evicted")
+            self.started += 1
+        count("prefetch_started")
+        print(f"Prefetching {category} facilities for session {session_id}")
+        return category
+
+    def take(self, session_id, location, category):
+        """The prefetched result for this session's search, or None (a miss)."""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        result = None
+        if entry is not None:
+            expires_at, prefetched_location, prefetched_category, future = entry
+            if expires_at <= time.time():
+                self._waste("expired")
+            elif prefetched_category != category or not self._near(prefetched_location, location):
+                self._waste(f"asked for {category}, prefetched {prefetched_category}")
+            else:
+                try:
+                    result = future.result(timeout=self.wait_seconds)
+                except Exception as e:
+                    print(f"Facility prefetch failed: {type(e).__name__}: {e}")
+                    self._waste("failed")
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        count("prefetch_miss" if result is None else "prefetch_hit")
+        log("facility prefetch", prefetch=self.stats())
+        return result
+
+    def _near(self, a, b):
+        return abs(a[0] - b[0]) <= self.max_drift and abs(a[1] - b[1]) <= self.max_drift
+
+    def expire(self):
+        """Drops entries past their TTL, counting them as wasted."""
+        now = time.time()
+        with self._lock:
+            expired = [session_id for session_id, entry in self._entries.items() if entry[0] <= now]
+            for session_id in expired:
+                del self._entries[session_id]
+        for _ in expired:
+            self._waste("expired")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "wasted": self.wasted,
+            "pending": len(self._entries),
+            # Share of facility lookups answered from a prefetch.
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            # Share of prefetches nobody used.
+            "waste_ratio": round(self.wasted / self.started, 3) if self.started else None,
+        }
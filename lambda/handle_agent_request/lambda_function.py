@@ -1,14 +1,143 @@
-import boto3
+import codecs
 import json
 import os
+import time
+
+import aws_clients
+from action_dispatch import ActionSession, default_dispatcher, note_severity
+from agent_trace import TraceTimeline
+from aws_clients import CircuitOpenError
+from instrumentation import add_timing, instrumented, log, put_metric, timer
+
+
+def get_client():
+    # Bedrock Agent Runtime client, created on first use and reused while warm
+    return aws_clients.client('bedrock-agent-runtime')
 
-# Initialize the Bedrock Agent Runtime client
-client = boto3.client('bedrock-agent-runtime')
 
 # Retrieve agent details from environment variables for security and flexibility
 AGENT_ID = os.environ.get('AGENT_ID')
 AGENT_ALIAS_ID = os.environ.get('AGENT_ALIAS_ID')
+# Trace events are turned into per-step timings; set to "false" to stop the
+# agent sending them at all.
+ENABLE_AGENT_TRACE = os.environ.get('ENABLE_AGENT_TRACE', 'true').lower() == 'true'
+# Return-control functions run here instead of in the app (see action_dispatch).
+dispatcher = default_dispatcher()
+# Server-side action rounds per request before control goes to the app anyway.
+MAX_ACTION_ROUNDS = int(os.environ.get('MAX_ACTION_ROUNDS', '5'))
+
+def _parse_body(event):
+    # The body from API Gateway is a string, so we need to parse it
+    raw_body = event.get("body", "{}")
+    if isinstance(raw_body, str):
+        return json.loads(raw_body)
+    return raw_body
+
+
+def _invoke_agent(body, stream=False):
+    """
+    Calls invoke_agent for a prompt or a return_control result.
+
+    With stream=True the agent is asked to stream its final answer; otherwise
+    it arrives as a single chunk. Returns (response, None) on success or
+    (None, error_response) when the request is invalid.
+    """
+    options = {'streamingConfigurations': {'streamFinalResponse': True}} if stream else {}
+    # Validate environment variables
+    if not AGENT_ID or not AGENT_ALIAS_ID:
+        return None, {'statusCode': 500, 'body': json.dumps('Error: AGENT_ID and AGENT_ALIAS_ID must be set.')}
+
+    session_id = body.get('sessionId')
+    if not session_id:
+        return None, {'statusCode': 400, 'body': json.dumps('Error: sessionId is required.')}
 
+    # Check if this is a follow-up call with a function result
+    if 'returnControl' in body:
+        print(f"Handling return_control for session: {session_id}")
+        invocation_input = body['returnControl']
+
+        required_fields = ['invocationId', 'actionGroup', 'function', 'invocationResult']
+        missing_fields = [field for field in required_fields if field not in invocation_input]
+        if missing_fields:
+            return None, {'statusCode': 400, 'body': json.dumps(f'Error: Missing required fields: {missing_fields}')}
+
+        # This is the result from your mobile app's native code
+        # We are just passing it back to the agent
+        if invocation_input['function'] == 'get_severity':
+            note_severity(ActionSession.from_body(body), invocation_input['invocationResult'])
+        response = _continue_agent(session_id, invocation_input['invocationId'], [{
+            "functionResult": {
+                "actionGroup": invocation_input['actionGroup'],
+                "function": invocation_input['function'],
+                "responseBody": {
+                    "TEXT": {
+                        "body": invocation_input['invocationResult']
+                    }
+                }
+            }
+        }], stream)
+
+    # This is an initial prompt from the user
+    elif 'prompt' in body:
+        print(f"Handling new prompt for session: {session_id}")
+        prompt = body.get('prompt')
+
+        with timer("bedrock.invoke_agent", external=True):
+            response = get_client().invoke_agent(
+                sessionId=session_id,
+                agentId=AGENT_ID,
+                agentAliasId=AGENT_ALIAS_ID,
+                inputText=prompt,
+                enableTrace=ENABLE_AGENT_TRACE,
+                **options
+            )
+
+    else:
+        return None, {'statusCode': 400, 'body': json.dumps('Error: Request body must contain either "prompt" or "returnControl".')}
+
+    return response, None
+
+
+def _continue_agent(session_id, invocation_id, results, stream=False):
+    """Sends returnControlInvocationResults back to the agent."""
+    options = {'streamingConfigurations': {'streamFinalResponse': True}} if stream else {}
+    with timer("bedrock.invoke_agent", external=True):
+        return get_client().invoke_agent(
+            sessionId=session_id,
+            agentId=AGENT_ID,
+            agentAliasId=AGENT_ALIAS_ID,
+            sessionState={
+                'invocationId': invocation_id,
+                'returnControlInvocationResults': results
+            },
+            **options
+        )
+
+
+def _dispatch_actions(body, stream=False):
+    """
+    Returns dispatch(return_control) for the request: it runs the functions
+    server-side and returns the agent's continued response, or None when the
+    app has to handle the returnControl (nothing registered, no location,
+    a failure, or MAX_ACTION_ROUNDS reached).
+    """
+    session = ActionSession.from_body(body)
+    rounds = 0
+
+    def dispatch(return_control):
+        nonlocal rounds
+        if not dispatcher or rounds >= MAX_ACTION_ROUNDS:
+            return None
+        results = dispatcher.run(return_control, session)
+        if results is None:
+            return None
+        rounds += 1
+        return _continue_agent(session.session_id, return_control['invocationId'], results, stream)
+
+    return dispatch
+
+
+@instrumented("handle_agent_request")
 def lambda_handler(event, context):
     """
     Handles requests from API Gateway to interact with the Bedrock Agent.
@@ -18,75 +147,33 @@ def lambda_handler(event, context):
     1. An initial prompt from the user.
     2. A follow-up request containing the result of a function that the 
        mobile app was asked to execute (return_control).
+
+    Functions the dispatcher can run are executed here and the agent is
+    invoked again until it answers in text; only the rest reach the app.
+    Either body may carry "location": {"latitude": ..., "longitude": ...}
+    so facility searches need no round trip for GPS, and a moderate or
+    severe triage starts the facility search early (facility_prefetch).
     """
     try:
-        # Validate environment variables
-        if not AGENT_ID or not AGENT_ALIAS_ID:
-            return {'statusCode': 500, 'body': json.dumps('Error: AGENT_ID and AGENT_ALIAS_ID must be set.')}
-        # The body from API Gateway is a string, so we need to parse it
-        raw_body = event.get("body", "{}")
-        if isinstance(raw_body, str):
-            body = json.loads(raw_body)
-        else:
-            body = raw_body 
-
-        
-        session_id = body.get('sessionId')
-        if not session_id:
-            return {'statusCode': 400, 'body': json.dumps('Error: sessionId is required.')}
-
-        # Check if this is a follow-up call with a function result
-        if 'returnControl' in body:
-            print(f"Handling return_control for session: {session_id}")
-            invocation_input = body['returnControl']
-            
-            required_fields = ['invocationId', 'actionGroup', 'function', 'invocationResult']
-            missing_fields = [field for field in required_fields if field not in invocation_input]
-            if missing_fields:
-                return {'statusCode': 400, 'body': json.dumps(f'Error: Missing required fields: {missing_fields}')}
-    
-            # This is the result from your mobile app's native code
-            # We are just passing it back to the agent
-            response = client.invoke_agent(
-                sessionId=session_id,
-                agentId=AGENT_ID,
-                agentAliasId=AGENT_ALIAS_ID,
-                  sessionState={
-                    'invocationId': invocation_input['invocationId'],
-                    'returnControlInvocationResults': [{
-                        "functionResult": {
-                            "actionGroup": invocation_input['actionGroup'],
-                            "function": invocation_input['function'],
-                            "responseBody": {
-                                "TEXT": {
-                                    "body": invocation_input['invocationResult']
-                                }
-                            }
-                        }
-                    }]
-                }
-            )
-        
-        # This is an initial prompt from the user
-        elif 'prompt' in body:
-            print(f"Handling new prompt for session: {session_id}")
-            prompt = body.get('prompt')
-            
-            response = client.invoke_agent(
-                sessionId=session_id,
-                agentId=AGENT_ID,
-                agentAliasId=AGENT_ALIAS_ID,
-                inputText=prompt,
-                enableTrace=True
-            )
-        
-        else:
-            return {'statusCode': 400, 'body': json.dumps('Error: Request body must contain either "prompt" or "returnControl".')}
+        body = _parse_body(event)
+        response, error = _invoke_agent(body)
+        if error is not None:
+            return error
 
         # Process the response stream from the agent
         # and prepare the final response for the mobile app
-        agent_response = process_agent_response(response)
-        
+        dispatch = _dispatch_actions(body)
+        with timer("bedrock.agent_stream", external=True):
+            agent_response = process_agent_response(response)
+        while agent_response['returnControl'] is not None:
+            response = dispatch(agent_response['returnControl'])
+            if response is None:
+                break
+            completion = agent_response['completion']
+            with timer("bedrock.agent_stream", external=True):
+                agent_response = process_agent_response(response)
+            agent_response['completion'] = completion + agent_response['completion']
+
         return {
             'statusCode': 200,
             'headers': {
@@ -95,32 +182,173 @@ def lambda_handler(event, context):
             'body': agent_response
         }
 
+    except CircuitOpenError as e:
+        # The agent is degraded; tell the app to back off rather than wait on it.
+        return {'statusCode': 503, 'headers': {'Retry-After': str(max(1, round(e.retry_in)))},
+                'body': json.dumps(f'Error: {e}')}
+
     except Exception as e:
         print(f"An error occurred: {e}")
         return {'statusCode': 500, 'body': json.dumps(f'Internal server error: {str(e)}')}
 
 
+def _emit_trace_metrics(timeline):
+    if not timeline.sections and not timeline.failures:
+        return
+    summary = timeline.summary()
+    log("agent trace", agent_trace=summary)
+    if timeline.model_invocations:
+        put_metric("AgentModelInvocationMs", summary["model_ms"])
+    if timeline.actions:
+        put_metric("AgentActionGroupMs", summary["action_ms"])
+    if "orchestrationTrace" in summary["sections_ms"]:
+        put_metric("AgentOrchestrationMs", summary["sections_ms"]["orchestrationTrace"])
+
+
+def iter_agent_events(response_stream, timeline=None):
+    """
+    Yields agent output as it arrives: {"type": "chunk", "text": ...} for each
+    completion chunk and {"type": "returnControl", "returnControl": ...}.
+    Trace events go to timeline when given. Chunks are decoded incrementally,
+    so a multibyte character split across two chunks comes out whole.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for event in response_stream['completion']:
+        if 'chunk' in event:
+            text = decoder.decode(event['chunk']['bytes'])
+            if text:
+                yield {"type": "chunk", "text": text}
+        elif 'trace' in event:
+            if timeline is not None:
+                timeline.add(event['trace'])
+        elif 'returnControl' in event:
+            yield {"type": "returnControl", "returnControl": event['returnControl']}
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield {"type": "chunk", "text": text}
+
+
+def stream_agent_response(response_stream, send, started=None, dispatch=None):
+    """
+    Forwards agent events to send(event) as soon as they arrive, then sends
+    {"type": "done"}. Records time-to-first-token (from `started`, a
+    time.perf_counter() value, or from the first read) as a metric.
+
+    dispatch(return_control), if given, may handle a returnControl event by
+    returning the agent's continued response, which is streamed in turn;
+    when it returns None the event is sent on.
+
+    Only the reads from the agent's event stream count as bedrock.agent_stream
+    (external) time; dispatch and send time themselves.
+    """
+    started = time.perf_counter() if started is None else started
+    first_token_ms = None
+    timeline = TraceTimeline()
+    read_ms = 0.0
+    while response_stream is not None:
+        next_stream = None
+        events = iter_agent_events(response_stream, timeline)
+        while True:
+            read_started = time.perf_counter()
+            event = next(events, None)
+            read_ms += (time.perf_counter() - read_started) * 1000
+            if event is None:
+                break
+            if event["type"] == "returnControl" and dispatch is not None:
+                next_stream = dispatch(event["returnControl"])
+                if next_stream is not None:
+                    continue
+            if first_token_ms is None and event["type"] == "chunk":
+                first_token_ms = (time.perf_counter() - started) * 1000
+                put_metric("TimeToFirstTokenMs", round(first_token_ms, 1))
+            send(event)
+        response_stream = next_stream
+    add_timing("bedrock.agent_stream", read_ms, external=True)
+    total_ms = (time.perf_counter() - started) * 1000
+    put_metric("AgentStreamDurationMs", round(total_ms, 1))
+    _emit_trace_metrics(timeline)
+    send({"type": "done"})
+    return first_token_ms
+
+
+def _connections_client(endpoint_url):
+    return aws_clients.client('apigatewaymanagementapi', endpoint_url=endpoint_url)
+
+
+@instrumented("handle_agent_request.stream")
+def stream_handler(event, context):
+    """
+    Response-streaming variant for an API Gateway WebSocket route.
+
+    Takes the same body as lambda_handler, but instead of returning the whole
+    completion at the end it posts each chunk to the caller's connection the
+    moment the agent produces it. Each message is a JSON event:
+    {"type": "chunk" | "returnControl" | "done" | "error", ...}.
+    """
+    request_context = event.get('requestContext', {})
+    connection_id = request_context.get('connectionId')
+    if not connection_id:
+        return {'statusCode': 400, 'body': json.dumps('Error: stream_handler needs a WebSocket connection.')}
+
+    connections = _connections_client(f"https://{request_context['domainName']}/{request_context['stage']}")
+
+    def send(message):
+        connections.post_to_connection(ConnectionId=connection_id, Data=json.dumps(message).encode())
+
+    try:
+        started = time.perf_counter()
+        body = _parse_body(event)
+        response, error = _invoke_agent(body, stream=True)
+        if error is not None:
+            send({"type": "error", "error": json.loads(error['body'])})
+            return {'statusCode': error['statusCode']}
+
+        stream_agent_response(response, send, started, _dispatch_actions(body, stream=True))
+        return {'statusCode': 200}
+
+    except CircuitOpenError as e:
+        send({"type": "error", "error": str(e), "retryAfter": max(1, round(e.retry_in))})
+        return {'statusCode': 503}
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        try:
+            send({"type": "error", "error": f'Internal server error: {str(e)}'})
+        except Exception as send_error:
+            print(f"Could not notify connection {connection_id}: {send_error}")
+        return {'statusCode': 500}
+
+
 def process_agent_response(response_stream):
     """
     Parses the streaming response from invoke_agent and returns a structured object.
+
+    Chunk bytes are collected into one bytearray and decoded once at the end,
+    so long completions cost linear time and split multibyte characters
+    decode correctly. Trace events are summarised into per-step timings.
     """
-    final_completion = ""
+    completion = bytearray()
     return_control_payload = None
+    timeline = TraceTimeline()
 
     try:
         for event in response_stream['completion']:
             if 'chunk' in event:
-                final_completion += event['chunk']['bytes'].decode()
+                completion += event['chunk']['bytes']
+            elif 'trace' in event:
+                timeline.add(event['trace'])
             elif 'returnControl' in event:
                 # If the agent returns control, we capture that payload
                 # to send back to the mobile app.
                 return_control_payload = event['returnControl']
                 #break # Stop processing, as the app needs to take over
-    except (KeyError, UnicodeDecodeError) as e:
+    except KeyError as e:
         print(f"Error processing agent response: {e}")
-    
+
+    _emit_trace_metrics(timeline)
+
     return {
-        'completion': final_completion,
+        'completion': completion.decode('utf-8', errors='replace'),
         'returnControl': return_control_payload,
         'contentType': 'application/json'
-    }
\ No newline at end of file
+    }
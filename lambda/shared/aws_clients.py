@@ -0,0 +1,304 @@
+"""
+One place to create AWS clients for the MedRock Lambdas and scripts.
+
+    from aws_clients import client, resource
+
+    runtime = client("bedrock-runtime")
+    table = resource("dynamodb").Table("MedicalAI_ChatHistory")
+
+Clients are created on first use and reused for the life of the process,
+so boto3 stays off the import path and connections are pooled across warm
+invocations. Every client gets:
+
+  - a connection pool sized per service (AWS_MAX_POOL_CONNECTIONS overrides
+    the default for all of them) and TCP keep-alive;
+  - adaptive retry mode, which rate-limits the client itself after
+    throttling instead of retrying into the throttle;
+  - a circuit breaker per service. After CIRCUIT_FAILURE_THRESHOLD
+    consecutive failed calls (5xx, timeouts, connection errors, counted
+    after retries) calls fail fast with CircuitOpenError for
+    CIRCUIT_RESET_SECONDS, then one probe call decides whether to close it.
+    Throttling is left to adaptive retry and the caller's own backoff: a
+    throttled call neither opens nor closes the circuit;
+  - per-call metrics in the current instrumented request: aws.<service>.calls,
+    .retries, .failures, .in_flight (API calls in flight when the call
+    started), .pool_saturated (more calls in flight than pool connections)
+    and .circuit_open. pool_stats() returns the running totals.
+
+Regions come from the `region` argument, then <SERVICE>_REGION (e.g.
+GEO_PLACES_REGION, DYNAMODB_REGION), then the region the caller or
+SERVICE_DEFAULTS pins the service to, then AWS_REGION / AWS_DEFAULT_REGION.
+"""
+import os
+import threading
+import time
+
+from instrumentation import count, log, put_metric
+
+FALLBACK_REGION = "us-east-1"
+
+# Per-service tuning. Bedrock reads stay open while the model generates, so
+# their read timeouts are long; geo-places and DynamoDB should answer fast.
+SERVICE_DEFAULTS = {
+    "bedrock-runtime": {"max_pool_connections": 32, "read_timeout": 120},
+    "bedrock-agent-runtime": {"max_pool_connections": 16, "read_timeout": 300},
+    # AWS Location places API is used from us-east-1.
+    "geo-places": {"max_pool_connections": 16, "read_timeout": 10, "region": "us-east-1"},
+    "dynamodb": {"max_pool_connections": 16, "connect_timeout": 2, "read_timeout": 5},
+    "s3": {"max_pool_connections": 16, "read_timeout": 30},
+}
+DEFAULT_POOL_CONNECTIONS = 10
+MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "4"))
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", "30"))
+
+# Error codes that mean the dependency is degraded rather than the request being wrong.
+_DEGRADED_CODES = {
+    "ServiceUnavailable", "ServiceUnavailableException", "InternalServerException", "InternalFailure",
+    "ModelNotReadyException", "ModelTimeoutException",
+}
+# Throttling: the service is healthy but we are over our rate.
+_THROTTLING_CODES = {
+    "ThrottlingException", "Throttling", "TooManyRequestsException", "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded", "SlowDown",
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, service, retry_in):
+        super().__init__(f"{service} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.service = service
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker: closed -> open after failure_threshold
+    failures -> half-open after reset_seconds, where a single probe call is
+    let through and its result closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            retry_in = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == "open" and retry_in <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+        raise CircuitOpenError(self.name, max(0.0, retry_in))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                opened = self.state != "open"
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            else:
+                opened = False
+        if opened:
+            count(f"aws.{self.name}.circuit_opened")
+            log("circuit opened", service=self.name, failures=self.failures, reset_seconds=self.reset_seconds)
+
+
+class _ClientMonitor:
+    """botocore event hooks for one client: breaker checks, in-flight tracking and metrics."""
+
+    def __init__(self, service, region, max_pool_connections, breaker):
+        self.service = service
+        self.region = region
+        self.max_pool_connections = max_pool_connections
+        self.breaker = breaker
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.saturated = 0
+        self._lock = threading.Lock()
+
+    def attach(self, events):
+        events.register("before-call", self.before_call)
+        events.register("after-call", self.after_call)
+        events.register("after-call-error", self.after_call_error)
+
+    def before_call(self, **kwargs):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            count(f"aws.{self.service}.circuit_open")
+            raise
+        with self._lock:
+            self.in_flight += 1
+            self.calls += 1
+            in_flight = self.in_flight
+            self.peak_in_flight = max(self.peak_in_flight, in_flight)
+            saturated = in_flight > self.max_pool_connections
+            if saturated:
+                self.saturated += 1
+        count(f"aws.{self.service}.calls")
+        put_metric(f"aws.{self.service}.in_flight", in_flight, "Count")
+        if saturated:
+            count(f"aws.{self.service}.pool_saturated")
+
+    def _finish(self, failed, retries=0, throttled=False):
+        with self._lock:
+            self.in_flight -= 1
+            self.retries += retries
+            if failed:
+                self.failures += 1
+        if retries:
+            count(f"aws.{self.service}.retries", retries)
+        if throttled:
+            count(f"aws.{self.service}.throttled")
+            # Neither evidence of an outage nor of recovery; a half-open probe
+            # that was throttled lets the next call probe instead.
+            self.breaker.release_probe()
+        elif failed:
+            count(f"aws.{self.service}.failures")
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def after_call(self, http_response, parsed, **kwargs):
+        code = parsed.get("Error", {}).get("Code") if isinstance(parsed, dict) else None
+        metadata = parsed.get("ResponseMetadata", {}) if isinstance(parsed, dict) else {}
+        throttled = code in _THROTTLING_CODES
+        failed = not throttled and (http_response.status_code >= 500 or code in _DEGRADED_CODES)
+        self._finish(failed, metadata.get("RetryAttempts", 0), throttled)
+
+    def after_call_error(self, exception, **kwargs):
+        # Connection errors and timeouts raised after retries are exhausted.
+        self._finish(True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "region": self.region,
+                "max_pool_connections": self.max_pool_connections,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "calls": self.calls,
+                "failures": self.failures,
+                "retries": self.retries,
+                "pool_saturated": self.saturated,
+                "circuit": self.breaker.state,
+            }
+
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_monitors = {}
+_breakers = {}
+
+
+def _region(service, region, default_region):
+    if region:
+        return region
+    env_name = service.upper().replace("-", "_") + "_REGION"
+    return (os.environ.get(env_name) or default_region or SERVICE_DEFAULTS.get(service, {}).get("region")
+            or os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or FALLBACK_REGION)
+
+
+def _config(service, max_pool_connections, options):
+    from botocore.config import Config
+
+    defaults = SERVICE_DEFAULTS.get(service, {})
+    return Config(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        connect_timeout=defaults.get("connect_timeout", 5),
+        read_timeout=defaults.get("read_timeout", 60),
+        retries={"mode": "adaptive", "total_max_attempts": MAX_ATTEMPTS},
+        **options
+    )
+
+
+def _pool_size(service, max_pool_connections):
+    if max_pool_connections:
+        return max_pool_connections
+    env = os.environ.get("AWS_MAX_POOL_CONNECTIONS")
+    if env:
+        return int(env)
+    return SERVICE_DEFAULTS.get(service, {}).get("max_pool_connections", DEFAULT_POOL_CONNECTIONS)
+
+
+def _create(kind, service, region, default_region, endpoint_url, max_pool_connections, options):
+    global _session
+    region = _region(service, region, default_region)
+    pool = _pool_size(service, max_pool_connections)
+    key = (kind, service, region, endpoint_url, pool, tuple(sorted((k, repr(v)) for k, v in options.items())))
+    existing = _clients.get(key)
+    if existing is not None:
+        return existing
+
+    with _lock:
+        if key in _clients:
+            return _clients[key]
+        # boto3 sessions are not thread-safe; clients made from one are.
+        import boto3
+        if _session is None:
+            _session = boto3.session.Session()
+        factory = _session.client if kind == "client" else _session.resource
+        created = factory(service, region_name=region, endpoint_url=endpoint_url,
+                          config=_config(service, pool, options))
+
+        breaker = _breakers.setdefault(service, CircuitBreaker(service))
+        monitor = _ClientMonitor(service, region, pool, breaker)
+        monitor.attach((created if kind == "client" else created.meta.client).meta.events)
+        _monitors[key] = monitor
+        _clients[key] = created
+        return created
+
+
+def client(service, region=None, default_region=None, endpoint_url=None, max_pool_connections=None, **options):
+    """
+    Shared boto3 client. `options` are extra botocore Config settings (e.g.
+    s3={"addressing_style": "path"}). `default_region` pins the service to a
+    region unless <SERVICE>_REGION is set.
+    """
+    return _create("client", service, region, default_region, endpoint_url, max_pool_connections, options)
+
+
+def resource(service, region=None, default_region=None, endpoint_url=None, max_pool_connections=None, **options):
+    """Shared boto3 resource (e.g. DynamoDB), with the same configuration as client()."""
+    return _create("resource", service, region, default_region, endpoint_url, max_pool_connections, options)
+
+
+def breaker(service):
+    """The circuit breaker shared by every client of a service."""
+    with _lock:
+        return _breakers.setdefault(service, CircuitBreaker(service))
+
+
+def pool_stats():
+    """Running totals per client: {"<service>@<region>": {...}}."""
+    return {f"{key[1]}@{monitor.region}": monitor.stats() for key, monitor in list(_monitors.items())}
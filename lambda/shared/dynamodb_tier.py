@@ -0,0 +1,60 @@
+"""
+Shared cache tier on a DynamoDB table, used by the triage cache (get_severity)
+and the geo-tile cache (get_nearby_facilities).
+"""
+import json
+import time
+
+from instrumentation import timer
+
+
+class DynamoDBTier:
+    """
+    Values stored as JSON under a string partition key, with "expires_at"
+    (epoch seconds) as the table's TTL attribute. DynamoDB deletes expired
+    items lazily, so expiry is also checked on read.
+
+    `table` is a boto3 Table or anything with the same get_item/put_item
+    surface (local_dynamodb.LocalTable). It may also be a zero-argument
+    callable returning the table; it is called on first use so creating the
+    boto3 resource stays off cold start. `decode`, if given, turns the
+    parsed JSON back into the caller's objects.
+    """
+
+    def __init__(self, table, key_name, value_name, ttl_seconds=86400, decode=None):
+        self._table = table
+        self.key_name = key_name
+        self.value_name = value_name
+        self.ttl_seconds = ttl_seconds
+        self.decode = decode
+
+    @property
+    def table(self):
+        if callable(self._table):
+            self._table = self._table()
+        return self._table
+
+    def get_entry(self, key):
+        """(value, expires_at) for a live entry, else None."""
+        with timer("dynamodb.get_item", external=True):
+            item = self.table.get_item(Key={self.key_name: key}).get("Item")
+        if not item:
+            return None
+        expires_at = int(item.get("expires_at", 0))
+        if expires_at <= time.time():
+            return None
+        value = json.loads(item[self.value_name])
+        return (self.decode(value) if self.decode is not None else value), expires_at
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key, value, ttl_seconds=None):
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with timer("dynamodb.put_item", external=True):
+            self.table.put_item(Item={
+                self.key_name: key,
+                self.value_name: json.dumps(value),
+                "expires_at": int(time.time() + ttl_seconds)
+            })
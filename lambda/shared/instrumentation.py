@@ -0,0 +1,237 @@
+"""
+Request-scoped latency and counter instrumentation shared by the MedRock Lambdas.
+
+Deployed as a Lambda layer (see README.md in this directory), so every
+function imports it as a top-level module:
+
+    from instrumentation import count, instrumented, timer
+
+    @instrumented("get_severity")
+    def lambda_handler(event, context):
+        with timer("bedrock.invoke_model", external=True):
+            ...
+        count("cache_hit")
+
+When the handler returns, one CloudWatch embedded-metric-format (EMF) log
+line is written with every timer, counter and metric recorded during the
+request, plus ExternalMs (time spent waiting on AWS services) and ComputeMs
+(the rest of the handler). Outside an instrumented handler (scripts, local
+runs) the timers and counters are no-ops.
+
+Work handed to a thread pool records into the request only when submitted
+through submit(executor, fn, ...), which carries the request along.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "MedRock")
+
+# Request headers / body fields checked, in order, for a caller-supplied
+# correlation ID. Falls back to the Lambda request ID.
+CORRELATION_HEADERS = ("x-correlation-id", "x-request-id")
+CORRELATION_FIELDS = ("correlationId", "sessionId", "patient_id")
+
+# EMF allows at most 100 values per metric in one record.
+_MAX_VALUES = 100
+
+
+class RequestMetrics:
+    """Everything recorded during one invocation. Safe to use from worker threads."""
+
+    def __init__(self, function_name, correlation_id):
+        self.function_name = function_name
+        self.correlation_id = correlation_id
+        self.started = time.perf_counter()
+        self.timings = {}   # name -> [ms, ...]
+        self.counters = {}  # name -> int
+        self.metrics = {}   # name -> ([value, ...], unit)
+        self.external_ms = 0.0
+        self._lock = threading.Lock()
+
+    def add_timing(self, name, ms, external):
+        with self._lock:
+            self.timings.setdefault(name, []).append(ms)
+            if external:
+                self.external_ms += ms
+
+    def add_count(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_metric(self, name, value, unit):
+        with self._lock:
+            self.metrics.setdefault(name, ([], unit))[0].append(value)
+
+    def record(self, status):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        definitions = []
+        values = {}
+
+        def put(name, value, unit):
+            definitions.append({"Name": name, "Unit": unit})
+            values[name] = value if not isinstance(value, list) or len(value) > 1 else value[0]
+
+        with self._lock:
+            put("DurationMs", round(total_ms, 2), "Milliseconds")
+            put("ExternalMs", round(self.external_ms, 2), "Milliseconds")
+            # Concurrent external calls can add up to more than wall time.
+            put("ComputeMs", round(max(0.0, total_ms - self.external_ms), 2), "Milliseconds")
+            for name, samples in self.timings.items():
+                put(f"{name}.ms", [round(ms, 2) for ms in samples[:_MAX_VALUES]], "Milliseconds")
+            for name, value in self.counters.items():
+                put(name, value, "Count")
+            for name, (samples, unit) in self.metrics.items():
+                put(name, samples[:_MAX_VALUES], unit)
+
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [["Function"]],
+                    "Metrics": definitions
+                }]
+            },
+            "Function": self.function_name,
+            "CorrelationId": self.correlation_id,
+            "Status": status,
+            **values
+        }
+
+
+# The active request. Worker threads don't inherit it: work handed to a
+# thread pool goes through submit() below so it records into the request
+# that started it, even if it finishes after that request (or during the
+# next one).
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def current():
+    return _current.get()
+
+
+def correlation_id():
+    request = _current.get()
+    return request.correlation_id if request is not None else None
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit(fn, ...) that runs fn in a copy of the caller's context, so it records into the caller's request."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _find_correlation_id(event, context):
+    if isinstance(event, dict):
+        headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+        for header in CORRELATION_HEADERS:
+            if headers.get(header):
+                return headers[header]
+        body = event.get("body")
+        if isinstance(body, str):
+            try:
+                body = json.loads(body)
+            except ValueError:
+                body = None
+        for source in (event, body if isinstance(body, dict) else {}):
+            for field in CORRELATION_FIELDS:
+                if source.get(field):
+                    return str(source[field])
+    return getattr(context, "aws_request_id", None) or str(uuid.uuid4())
+
+
+def start_request(function_name, event=None, context=None):
+    request = RequestMetrics(function_name, _find_correlation_id(event, context))
+    _current.set(request)
+    return request
+
+
+def finish_request(status="ok"):
+    request = _current.get()
+    _current.set(None)
+    if request is not None:
+        print(json.dumps(request.record(status), default=str))
+
+
+def instrumented(function_name):
+    """Decorator for a lambda_handler: scopes metrics to the invocation and emits them at the end."""
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            start_request(function_name, event, context)
+            status = "error"
+            try:
+                response = handler(event, context)
+                code = response.get("statusCode") if isinstance(response, dict) else None
+                status = "ok" if code is None or code < 400 else str(code)
+                return response
+            finally:
+                finish_request(status)
+        return wrapper
+    return decorate
+
+
+class timer:
+    """
+    Times a block or a function into the current request:
+
+        with timer("s3.upload", external=True): ...
+
+        @timer("render_pdf")
+        def render(...): ...
+
+    external=True marks time spent waiting on another service; it is
+    reported in ExternalMs and excluded from ComputeMs.
+    """
+
+    def __init__(self, name, external=False):
+        self.name = name
+        self.external = external
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.ms = (time.perf_counter() - self._started) * 1000
+        request = _current.get()
+        if request is not None:
+            request.add_timing(self.name, self.ms, self.external)
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(self.name, self.external):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def add_timing(name, ms, external=False):
+    """Records a duration measured in pieces, e.g. the reads of a stream interleaved with other work."""
+    request = _current.get()
+    if request is not None:
+        request.add_timing(name, ms, external)
+
+
+def count(name, value=1):
+    """Adds to a per-request counter such as cache_hit, retry or throttle."""
+    request = _current.get()
+    if request is not None:
+        request.add_count(name, value)
+
+
+def put_metric(name, value, unit="Milliseconds"):
+    """Records a one-off metric (e.g. TimeToFirstTokenMs) in the current request."""
+    request = _current.get()
+    if request is not None:
+        request.add_metric(name, value, unit)
+
+
+def log(message, **fields):
+    """Structured log line carrying the request's correlation ID."""
+    print(json.dumps({"message": message, "correlation_id": correlation_id(), **fields}, default=str))
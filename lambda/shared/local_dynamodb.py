@@ -0,0 +1,145 @@
+"""
+In-memory stand-in for boto3 DynamoDB tables, for local runs and tests
+without AWS: the chat history table, the triage cache and the geo-tile cache.
+"""
+import zlib
+
+
+class LocalBatchWriter:
+    def __init__(self, table):
+        self.table = table
+
+    def put_item(self, Item):
+        self.table.items[self.table._key(Item)] = dict(Item)
+
+    def delete_item(self, Key):
+        self.table.items.pop(self.table._key(Key), None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class LocalTable:
+    """
+    In-memory stand-in for a boto3 DynamoDB Table, keyed on (partition, sort),
+    or on the partition key alone with sort_key=None (the cache tables:
+    LocalTable(partition_key="cache_key", sort_key=None)).
+
+    Supports the calls the chat history code and DynamoDBTier make.
+    request_counts records how many calls of each kind were made (one per
+    batch_writer block, not per item).
+    """
+
+    def __init__(self, name="MedicalAI_ChatHistory", partition_key="patient_id", sort_key="timestamp"):
+        self.name = name
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        self.items = {}
+        # IndexName -> (partition attribute, sort attribute) for GSI queries
+        self.indexes = {}
+        self.request_counts = {"put_item": 0, "get_item": 0, "batch_write": 0, "query": 0, "scan": 0}
+
+    def _key(self, item):
+        if self.sort_key is None:
+            return item[self.partition_key]
+        return item[self.partition_key], item[self.sort_key]
+
+    def _key_attributes(self, item):
+        return {name: item[name] for name in (self.partition_key, self.sort_key) if name is not None}
+
+    def put_item(self, Item):
+        self.request_counts["put_item"] += 1
+        self.items[self._key(Item)] = dict(Item)
+        return {}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        self.request_counts["batch_write"] += 1
+        return LocalBatchWriter(self)
+
+    def get_item(self, Key):
+        self.request_counts["get_item"] += 1
+        item = self.items.get(self._key(Key))
+        return {"Item": dict(item)} if item is not None else {}
+
+    def scan(self, Limit=None, ExclusiveStartKey=None, Segment=None, TotalSegments=None):
+        """Parallel scan segments split items by a hash of the partition key, as DynamoDB does."""
+        self.request_counts["scan"] += 1
+        matches = sorted(self.items.values(), key=self._key)
+        if TotalSegments:
+            matches = [item for item in matches
+                       if zlib.crc32(str(item[self.partition_key]).encode()) % TotalSegments == Segment]
+        if ExclusiveStartKey is not None:
+            start = self._key(ExclusiveStartKey)
+            matches = [item for item in matches if self._key(item) > start]
+        response = {"Items": [dict(item) for item in matches[:Limit]]}
+        if Limit is not None and len(matches) > Limit:
+            response["LastEvaluatedKey"] = self._key_attributes(matches[Limit - 1])
+        response["Count"] = len(response["Items"])
+        return response
+
+    def query(self, KeyConditionExpression, Limit=None, ScanIndexForward=True, ExclusiveStartKey=None,
+              ProjectionExpression=None, ExpressionAttributeNames=None, IndexName=None):
+        self.request_counts["query"] += 1
+        partition_key, sort_key = self.partition_key, self.sort_key
+        if IndexName is not None:
+            partition_key, sort_key = self.indexes[IndexName]
+
+        matches = [
+            item for item in self.items.values()
+            if partition_key in item and _evaluate(KeyConditionExpression, item)
+        ]
+        matches.sort(key=lambda item: (item.get(sort_key, ""), self._key(item)), reverse=not ScanIndexForward)
+
+        if ExclusiveStartKey is not None:
+            start = self._key(ExclusiveStartKey)
+            keys = [self._key(item) for item in matches]
+            matches = matches[keys.index(start) + 1:] if start in keys else []
+
+        last_key = None
+        if Limit is not None and len(matches) > Limit:
+            matches = matches[:Limit]
+            last_key = self._key_attributes(matches[-1])
+
+        if ProjectionExpression:
+            names = ExpressionAttributeNames or {}
+            attributes = [names.get(name.strip(), name.strip()) for name in ProjectionExpression.split(",")]
+            matches = [{a: item[a] for a in attributes if a in item} for item in matches]
+        else:
+            matches = [dict(item) for item in matches]
+
+        response = {"Items": matches, "Count": len(matches)}
+        if last_key is not None:
+            response["LastEvaluatedKey"] = last_key
+        return response
+
+
+def _evaluate(condition, item):
+    """Evaluate a boto3.dynamodb.conditions key condition against an item."""
+    expression = condition.get_expression()
+    operator = expression["operator"]
+    values = expression["values"]
+    if operator == "AND":
+        return _evaluate(values[0], item) and _evaluate(values[1], item)
+
+    name = values[0].name
+    if name not in item:
+        return False
+    actual = item[name]
+    if operator == "=":
+        return actual == values[1]
+    if operator == "<":
+        return actual < values[1]
+    if operator == "<=":
+        return actual <= values[1]
+    if operator == ">":
+        return actual > values[1]
+    if operator == ">=":
+        return actual >= values[1]
+    if operator == "BETWEEN":
+        return values[1] <= actual <= values[2]
+    if operator == "begins_with":
+        return str(actual).startswith(values[1])
+    raise ValueError(f"Unsupported key condition operator: {operator}")
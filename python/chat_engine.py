@@ -0,0 +1,286 @@
+"""
+Asyncio chat engine: many concurrent patient sessions in one process.
+
+    python chat_engine.py                         # interactive chat on stdin
+    python chat_engine.py --serve 127.0.0.1:8765  # JSON-lines socket server
+
+Socket protocol, one JSON object per line in each direction:
+    -> {"patient_id": "p-1", "message": "I have a fever"}
+    <- {"patient_id": "p-1", "type": "chunk", "text": "..."}   (repeated)
+    <- {"patient_id": "p-1", "type": "done"}
+One connection may carry any number of patients; replies for different
+patients interleave line by line.
+
+Each session has a bounded inbox and a task that handles its messages in
+order, so turns of one conversation never overlap while different
+conversations run concurrently. boto3 has no asyncio API, so the model
+stream (and the history reads and writes it does) runs on a thread pool,
+with at most max_model_calls turns calling the model at once.
+
+Backpressure, end to end:
+  - send() waits while a session's inbox is full, so the socket front end
+    stops reading a connection that floods one conversation;
+  - reply chunks pass through a small bounded queue, so a slow reader
+    pauses the model stream rather than buffering the whole reply.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sort_keys import new_sort_key
+
+SESSION_QUEUE_SIZE = int(os.environ.get("CHAT_SESSION_QUEUE_SIZE", "4"))
+# Matches the bedrock-runtime connection pool in aws_clients.
+MAX_MODEL_CALLS = int(os.environ.get("CHAT_MAX_MODEL_CALLS", "32"))
+SESSION_IDLE_SECONDS = float(os.environ.get("CHAT_SESSION_IDLE_SECONDS", "900"))
+# Reply chunks buffered per turn before the model stream is paused.
+STREAM_BUFFER = 16
+
+NEARBY_WORDS = ("nearby", "clinic", "hospital")
+LOCATION_PROMPT = "To recommend nearby facilities, please provide your location (latitude,longitude)."
+LOCATION_ERROR = ("Sorry, I couldn't understand your location. Please provide in the format lat,lon "
+                  "(e.g., 3.1390,101.6869).")
+
+_DONE = object()
+
+
+class ChatSession:
+    def __init__(self, patient_id, queue_size):
+        self.patient_id = patient_id
+        self.conversation_id = new_sort_key()
+        self.inbox = asyncio.Queue(maxsize=queue_size)
+        self.awaiting_location = False
+        self.task = None
+
+
+class ChatEngine:
+    """
+    reply_stream(patient_id, message, conversation_id=...) is a blocking
+    iterator of reply text (chat_with_medrock_stream). facilities(lat, lon),
+    if given, returns the text answer to a nearby-facility request.
+    """
+
+    def __init__(self, reply_stream, facilities=None, max_model_calls=MAX_MODEL_CALLS,
+                 queue_size=SESSION_QUEUE_SIZE, idle_seconds=SESSION_IDLE_SECONDS):
+        self.reply_stream = reply_stream
+        self.facilities = facilities
+        self.queue_size = queue_size
+        self.idle_seconds = idle_seconds
+        self.sessions = {}
+        self._model_slots = asyncio.Semaphore(max_model_calls)
+        # A few threads beyond the model slots for facility lookups.
+        self._executor = ThreadPoolExecutor(max_workers=max_model_calls + 4, thread_name_prefix="chat")
+        self.turns = 0
+        self.errors = 0
+        self.model_calls_in_flight = 0
+        self.peak_sessions = 0
+
+    async def send(self, patient_id, message, reply):
+        """
+        Queues a message for a patient's session, waiting while its inbox is
+        full. reply is an async callable that receives each event dict.
+        Returns a future that resolves when the turn has been answered.
+        """
+        session = self.sessions.get(patient_id)
+        if session is None:
+            session = self.sessions[patient_id] = ChatSession(patient_id, self.queue_size)
+            session.task = asyncio.create_task(self._run_session(session))
+            self.peak_sessions = max(self.peak_sessions, len(self.sessions))
+        answered = asyncio.get_running_loop().create_future()
+        await session.inbox.put((message, reply, answered))
+        return answered
+
+    async def _run_session(self, session):
+        while True:
+            try:
+                item = await asyncio.wait_for(session.inbox.get(), self.idle_seconds)
+            except asyncio.TimeoutError:
+                if session.inbox.empty():
+                    break
+                continue
+            if item is None:  # close()
+                break
+            message, reply, answered = item
+            try:
+                await self._handle(session, message, reply)
+                self.turns += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Session {session.patient_id}: {type(e).__name__}: {e}", file=sys.stderr)
+                try:
+                    await reply({"type": "error", "error": str(e)})
+                except Exception:
+                    pass  # the caller has gone away
+            finally:
+                if not answered.done():
+                    answered.set_result(None)
+        self.sessions.pop(session.patient_id, None)
+
+    async def _handle(self, session, message, reply):
+        if session.awaiting_location:
+            session.awaiting_location = False
+            try:
+                lat, lon = map(float, message.strip().split(","))
+            except ValueError:
+                await reply({"type": "chunk", "text": LOCATION_ERROR})
+            else:
+                loop = asyncio.get_running_loop()
+                text = await loop.run_in_executor(self._executor, self.facilities, lat, lon)
+                await reply({"type": "chunk", "text": text})
+        elif self.facilities is not None and any(word in message.lower() for word in NEARBY_WORDS):
+            session.awaiting_location = True
+            await reply({"type": "chunk", "text": LOCATION_PROMPT})
+        else:
+            await self._stream_reply(session, message, reply)
+        await reply({"type": "done"})
+
+    async def _stream_reply(self, session, message, reply):
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=STREAM_BUFFER)
+        stop = False
+        finished = False
+
+        def produce():
+            # Runs on the executor; blocks while the chunk queue is full.
+            try:
+                for text in self.reply_stream(session.patient_id, message, conversation_id=session.conversation_id):
+                    if stop:
+                        break
+                    asyncio.run_coroutine_threadsafe(chunks.put(text), loop).result()
+            finally:
+                asyncio.run_coroutine_threadsafe(chunks.put(_DONE), loop).result()
+
+        async with self._model_slots:
+            self.model_calls_in_flight += 1
+            producer = loop.run_in_executor(self._executor, produce)
+            try:
+                while (text := await chunks.get()) is not _DONE:
+                    await reply({"type": "chunk", "text": text})
+                finished = True
+            finally:
+                if not finished:
+                    # The reader failed: drain so the producer stops and frees its thread.
+                    stop = True
+                    while await chunks.get() is not _DONE:
+                        pass
+                self.model_calls_in_flight -= 1
+            await producer  # re-raises a failed model call
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "peak_sessions": self.peak_sessions,
+            "queued": sum(session.inbox.qsize() for session in self.sessions.values()),
+            "model_calls_in_flight": self.model_calls_in_flight,
+            "turns": self.turns,
+            "errors": self.errors,
+        }
+
+    async def close(self):
+        """Answers the messages already queued, then stops the sessions and the thread pool."""
+        sessions = list(self.sessions.values())
+        for session in sessions:
+            await session.inbox.put(None)
+        await asyncio.gather(*(session.task for session in sessions), return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+
+async def serve_socket(engine, host="127.0.0.1", port=8765):
+    """JSON-lines front end (see the module docstring). Returns the asyncio server."""
+
+    async def handle(reader, writer):
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        async def write(event):
+            async with write_lock:
+                writer.write(json.dumps(event).encode("utf-8") + b"\n")
+                await writer.drain()
+
+        def reply_for(patient_id):
+            async def reply(event):
+                await write({"patient_id": patient_id, **event})
+            return reply
+
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    patient_id, message = str(request["patient_id"]), str(request["message"])
+                except (ValueError, KeyError, TypeError):
+                    await write({"type": "error", "error": 'Expected {"patient_id": ..., "message": ...}'})
+                    continue
+                answered = await engine.send(patient_id, message, reply_for(patient_id))
+                pending.add(answered)
+                answered.add_done_callback(pending.discard)
+            # The client finished sending; answer what it asked before closing.
+            await asyncio.gather(*pending)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port, limit=1 << 20)
+
+
+async def run_stdin(engine, patient_id):
+    """Interactive chat for one patient on the terminal."""
+    loop = asyncio.get_running_loop()
+    print("Start chat with MedRock. Type 'exit' to quit.\n")
+    print("MedRock: Hello! I'm MedRock, your AI medical assistant. I can help assess symptoms, suggest next "
+          "steps, and recommend nearby medical facilities.\n")
+
+    async def reply(event):
+        if event["type"] == "chunk":
+            print(event["text"], end="", flush=True)
+        elif event["type"] == "error":
+            print(f"[error: {event['error']}]", end="")
+        else:
+            print("\n")
+
+    while True:
+        try:
+            user_message = await loop.run_in_executor(None, input, "You: ")
+        except EOFError:
+            break
+        if user_message.lower() in ["exit", "quit"]:
+            break
+        print("MedRock: ", end="", flush=True)
+        await (await engine.send(patient_id, user_message, reply))
+    print("Chat ended.")
+
+
+async def main(args):
+    from chat_with_medrock import chat_with_medrock_stream, format_facilities, get_facilities_for_user, history_buffer
+
+    engine = ChatEngine(chat_with_medrock_stream,
+                        facilities=lambda lat, lon: format_facilities(get_facilities_for_user(lat, lon)))
+    try:
+        if args.serve:
+            host, _, port = args.serve.rpartition(":")
+            server = await serve_socket(engine, host or "127.0.0.1", int(port))
+            print(f"Serving chat on {args.serve}", file=sys.stderr)
+            async with server:
+                while True:
+                    await asyncio.sleep(args.stats_every)
+                    print(f"{time.strftime('%H:%M:%S')} {engine.stats()}", file=sys.stderr)
+        else:
+            await run_stdin(engine, args.patient)
+    finally:
+        await engine.close()
+        history_buffer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MedRock chat engine")
+    parser.add_argument("--serve", metavar="HOST:PORT", help="run the JSON-lines socket server instead of stdin")
+    parser.add_argument("--patient", default="patient_123", help="patient ID for the stdin chat")
+    parser.add_argument("--stats-every", type=float, default=30.0, help="seconds between stats lines (--serve)")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
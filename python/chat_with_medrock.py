@@ -1,59 +1,85 @@
 import os
 import json
-import uuid
+import time
 from datetime import datetime
 from dotenv import load_dotenv
-import boto3
+import shared_layer  # noqa: F401
+from aws_clients import client, resource
+from instrumentation import put_metric, timer
 from get_nearby_facilities import search_nearby_places, normalize_places
+from context_builder import ContextBuilder
+from sort_keys import new_sort_key
+from store_patient_history import CHAT_PROJECTION, HistoryReader, HistoryWriteBuffer, SessionHistoryCache
 
 # --- Load environment variables ---
 load_dotenv()
-aws_access_key = os.environ.get("AWS_ACCESS_KEY_ID")
-aws_secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
-aws_session_token = os.environ.get("AWS_SESSION_TOKEN")
-aws_region = os.environ.get("AWS_DEFAULT_REGION")
-
-# --- DynamoDB setup ---
-dynamodb = boto3.resource(
-    "dynamodb",
-    region_name="ap-southeast-5",
-    aws_access_key_id=aws_access_key,
-    aws_secret_access_key=aws_secret_key,
-    aws_session_token=aws_session_token
-)
+
+# --- DynamoDB setup (same shared resource as store_patient_history) ---
+dynamodb = resource("dynamodb", default_region="ap-southeast-5")
 table = dynamodb.Table("MedicalAI_ChatHistory")
 
+# Chat turns are written through this buffer: each turn's user and assistant
+# messages go out together in one batch request when the turn ends.
+history_buffer = HistoryWriteBuffer(table)
+
+# Conversation windows per patient, written through to the table and
+# warm-loaded from it when a patient isn't in memory (e.g. after a restart).
+# The window is sized above the context budget so the builder, not the
+# window, decides what gets summarized.
+session_cache = SessionHistoryCache(HistoryReader(table, CHAT_PROJECTION), history_buffer, window=40)
+
 # --- Bedrock client setup ---
-bedrock = boto3.client(
-    "bedrock-runtime",
-    region_name="us-east-1",
-    aws_access_key_id=aws_access_key,
-    aws_secret_access_key=aws_secret_key,
-    aws_session_token=aws_session_token
-)
+bedrock = client("bedrock-runtime", default_region="us-east-1")
+
+CHAT_MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+CONTEXT_BUDGET_TOKENS = int(os.environ.get("CONTEXT_BUDGET_TOKENS", "1200"))
+
+def _chat_request_body(prompt, max_tokens=400):
+    return json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": max_tokens,
+        "messages": [{"role": "user", "content": prompt}]
+    })
+
+def summarize_with_bedrock(prompt):
+    response = bedrock.invoke_model(
+        modelId=CHAT_MODEL_ID,
+        body=_chat_request_body(prompt, max_tokens=250)
+    )
+    return json.loads(response["body"].read())["content"][0]["text"]
+
+# Packs recent messages into the token budget and folds older ones into a
+# cached running summary.
+context_builder = ContextBuilder(summarize_with_bedrock, budget_tokens=CONTEXT_BUDGET_TOKENS)
 
 # --- Helper: Save message to DynamoDB ---
-def save_message(patient_id, role, message):
-    table.put_item(Item={
+def build_message_item(patient_id, role, message, conversation_id=None):
+    item = {
         "patient_id": patient_id,
-        "timestamp": str(uuid.uuid4()),
+        "timestamp": new_sort_key(),
         "role": role,
         "message": message,
         "created_at": datetime.utcnow().isoformat()
-    })
+    }
+    if conversation_id:
+        item["conversation_id"] = conversation_id
+    return item
+
+def save_message(patient_id, role, message, buffer=None, conversation_id=None):
+    item = build_message_item(patient_id, role, message, conversation_id)
+    if buffer is not None:
+        buffer.add(item)
+    else:
+        table.put_item(Item=item)
 
 # --- Helper: Generate AI response ---
-def chat_with_medrock(patient_id, user_message, history):
-    history.append({"role": "user", "content": user_message})
-    save_message(patient_id, "user", user_message)
-
-    # Prepare prompt with instructions
-    context_summary = history[-10:]  # last 10 messages for context
+def build_prompt(context, user_message):
     missing_info_prompt = "\nIf any vitals (blood pressure, heart rate, oxygen saturation, temperature) are missing, politely ask the user to provide them. It is not mandatory but advised for better assessment."
     
     prompt = f"""
 You are MedRock, a professional and empathetic medical assistant.
-Current patient context: {json.dumps(context_summary, indent=2)}
+Current patient context:
+{context}
 User's new message: "{user_message}"
 
 Instructions:
@@ -64,23 +90,62 @@ Instructions:
 5. Include disclaimer: 'I am an AI assistant providing guidance; this is not a substitute for professional medical advice.'
 {missing_info_prompt}
 """
+    return prompt
+
+def chat_with_medrock(patient_id, user_message, sessions=session_cache, builder=context_builder, conversation_id=None):
+    sessions.append(patient_id, build_message_item(patient_id, "user", user_message, conversation_id))
+
+    # Prepare prompt with instructions
+    context = builder.build(patient_id, sessions.window(patient_id))
+    prompt = build_prompt(context, user_message)
 
     response = bedrock.invoke_model(
-        modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-        body=json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 400,
-            "messages": [{"role": "user", "content": prompt}]
-        })
+        modelId=CHAT_MODEL_ID,
+        body=_chat_request_body(prompt)
     )
 
     response_body = json.loads(response["body"].read())
     ai_reply = response_body["content"][0]["text"]
 
-    save_message(patient_id, "assistant", ai_reply)
-    history.append({"role": "assistant", "content": ai_reply})
+    sessions.append(patient_id, build_message_item(patient_id, "assistant", ai_reply, conversation_id))
+    sessions.flush()
     return ai_reply
 
+def chat_with_medrock_stream(patient_id, user_message, sessions=session_cache, builder=context_builder,
+                             conversation_id=None):
+    """
+    Streaming variant of chat_with_medrock: yields reply text as the model
+    produces it. The reply is saved when the stream ends, or with whatever
+    was streamed if the caller closes it early.
+    """
+    sessions.append(patient_id, build_message_item(patient_id, "user", user_message, conversation_id))
+
+    context = builder.build(patient_id, sessions.window(patient_id))
+    prompt = build_prompt(context, user_message)
+
+    started = time.perf_counter()
+    with timer("bedrock.invoke_model_with_response_stream", external=True):
+        response = bedrock.invoke_model_with_response_stream(
+            modelId=CHAT_MODEL_ID,
+            body=_chat_request_body(prompt)
+        )
+
+    parts = []
+    try:
+        for event in response["body"]:
+            chunk = json.loads(event["chunk"]["bytes"])
+            if chunk.get("type") == "content_block_delta":
+                text = chunk["delta"].get("text", "")
+                if text:
+                    if not parts:
+                        put_metric("TimeToFirstTokenMs", round((time.perf_counter() - started) * 1000, 1))
+                    parts.append(text)
+                    yield text
+    finally:
+        if parts:
+            sessions.append(patient_id, build_message_item(patient_id, "assistant", "".join(parts), conversation_id))
+        sessions.flush()
+
 # --- Nearby facility helpers ---
 def get_facilities_for_user(lat, lon, category="hospital"):
     raw = search_nearby_places(lon, lat, category=category, radius=5000)
@@ -100,33 +165,19 @@ def format_facilities(facilities):
     return msg
 
 # --- Main Chat Loop ---
+# The interactive chat runs on the asyncio engine; `python chat_engine.py --serve HOST:PORT`
+# serves many patients at once over a socket.
 if __name__ == "__main__":
-    patient_id = "patient_123"
-    conversation_history = []
-
-    print("Start chat with MedRock. Type 'exit' to quit.\n")
-    print("MedRock: Hello! I'm MedRock, your AI medical assistant. I can help assess symptoms, suggest next steps, and recommend nearby medical facilities.\n")
-
-    while True:
-        user_message = input("You: ")
-        if user_message.lower() in ["exit", "quit"]:
-            print("Chat ended.")
-            break
-
-        # Special handling for nearby facility request
-        if "nearby" in user_message.lower() or "clinic" in user_message.lower() or "hospital" in user_message.lower():
-            print("MedRock: To recommend nearby facilities, please provide your location (latitude,longitude).")
-            try:
-                loc_input = input("You (lat,lon): ")
-                lat, lon = map(float, loc_input.strip().split(","))
-                facilities = get_facilities_for_user(lat, lon)
-                print(f"MedRock: {format_facilities(facilities)}\n")
-                # continue to next loop
-                continue
-            except:
-                print("MedRock: Sorry, I couldn't understand your location. Please provide in the format lat,lon (e.g., 3.1390,101.6869).")
-                continue
-
-        # Normal conversation handled by Bedrock
-        medrock_reply = chat_with_medrock(patient_id, user_message, conversation_history)
-        print(f"MedRock: {medrock_reply}\n")
+    import asyncio
+    from chat_engine import ChatEngine, run_stdin
+
+    async def main():
+        engine = ChatEngine(chat_with_medrock_stream,
+                            facilities=lambda lat, lon: format_facilities(get_facilities_for_user(lat, lon)))
+        try:
+            await run_stdin(engine, "patient_123")
+        finally:
+            await engine.close()
+            history_buffer.close()
+
+    asyncio.run(main())
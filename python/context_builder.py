@@ -0,0 +1,144 @@
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+# Rough chars-per-token ratio for English prose. Bedrock doesn't expose a
+# tokenizer for Claude, and a consistent estimate is enough to hold a budget.
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = """Summarize this conversation between a patient and MedRock, a medical assistant.
+Keep symptoms, their duration and severity, vitals, medications, allergies and any advice already given.
+Write at most {max_words} words of plain text.
+
+{previous}Conversation:
+{messages}
+"""
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def pack_message(message):
+    """One line per message, e.g. "user: I have a fever"."""
+    content = " ".join(str(message.get("content") or "").split())
+    return f"{message.get('role')}: {content}"
+
+
+def _fingerprint(line):
+    return hashlib.sha1(line.encode("utf-8")).hexdigest()
+
+
+class ContextBuilder:
+    """
+    Builds the conversation context for a prompt within a token budget.
+
+    Recent messages are packed newest-first until budget_tokens is reached.
+    When they no longer fit, the oldest unsummarized messages are folded into
+    a per-patient running summary by calling summarize(prompt) -> text, down
+    to low_water of the budget. The summary is cached and only regenerated
+    once the unsummarized messages outgrow the budget again, and each
+    regeneration folds just those messages into the previous summary.
+    """
+
+    def __init__(self, summarize, budget_tokens=1200, summary_words=120, low_water=0.5, max_patients=1000):
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.summary_words = summary_words
+        # Words run at roughly 1.3 tokens; the rest is headroom.
+        self.summary_tokens = summary_words * 2
+        self.low_water = low_water
+        self.max_patients = max_patients
+        # patient_id -> (summary text, fingerprint of last message folded in)
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+        self.summary_hits = 0
+        self.summary_refreshes = 0
+
+    def _cached_summary(self, patient_id):
+        with self._lock:
+            entry = self._summaries.get(patient_id)
+            if entry is not None:
+                self._summaries.move_to_end(patient_id)
+            return entry
+
+    def _store_summary(self, patient_id, summary, last_folded):
+        with self._lock:
+            self._summaries[patient_id] = (summary, last_folded)
+            self._summaries.move_to_end(patient_id)
+            while len(self._summaries) > self.max_patients:
+                self._summaries.popitem(last=False)
+
+    def _fold(self, patient_id, previous, pending):
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_words,
+            previous=f"Summary so far:\n{previous}\n\n" if previous else "",
+            messages="\n".join(pending)
+        )
+        try:
+            summary = " ".join(self.summarize(prompt).split())
+        except Exception as e:
+            print(f"Context summary failed, keeping previous summary: {e}")
+            return None
+        self._store_summary(patient_id, summary, _fingerprint(pending[-1]))
+        with self._lock:
+            self.summary_refreshes += 1
+        return summary
+
+    @staticmethod
+    def split(lines, budget_tokens):
+        """Split packed lines into (overflow, recent) so recent fits budget_tokens."""
+        used = 0
+        start = len(lines)
+        # The newest message is always kept, even if it alone exceeds the budget.
+        while start > 0:
+            cost = estimate_tokens(lines[start - 1]) + 1
+            if used + cost > budget_tokens and start < len(lines):
+                break
+            used += cost
+            start -= 1
+        return lines[:start], lines[start:]
+
+    def build(self, patient_id, messages):
+        """Context text for messages (oldest first) within budget_tokens."""
+        lines = [pack_message(m) for m in messages]
+        summary, last_folded = self._cached_summary(patient_id) or ("", None)
+
+        # Lines after the last folded one haven't been summarized yet. If the
+        # folded line has left the window, everything in it is newer. Matching
+        # the oldest copy of a repeated line errs towards re-folding, not loss.
+        start = 0
+        for i, line in enumerate(lines):
+            if _fingerprint(line) == last_folded:
+                start = i + 1
+                break
+        pending = lines[start:]
+
+        budget = self.budget_tokens - (self.summary_tokens if summary else 0)
+        overflow, recent = self.split(pending, budget)
+        if not overflow:
+            if summary:
+                with self._lock:
+                    self.summary_hits += 1
+        else:
+            # Fold down to a low-water mark so the next few turns fit without
+            # another summary call.
+            overflow, recent = self.split(pending, int((self.budget_tokens - self.summary_tokens) * self.low_water))
+            folded = self._fold(patient_id, summary, overflow)
+            if folded is not None:
+                summary = folded
+            else:
+                recent = self.split(pending, budget)[1]
+
+        parts = [f"Earlier conversation summary: {summary}"] if summary else []
+        parts.append("Recent messages:")
+        parts.extend(recent)
+        return "\n".join(parts)
+
+    def stats(self):
+        return {
+            "patients": len(self._summaries),
+            "summary_hits": self.summary_hits,
+            "summary_refreshes": self.summary_refreshes
+        }
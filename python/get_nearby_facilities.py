@@ -1,24 +1,18 @@
 import os
 from dotenv import load_dotenv
-import boto3
 import json
+import shared_layer  # noqa: F401
+from aws_clients import client as aws_client
 
 load_dotenv()
 
 # AWS credentials from .env
-aws_access_key = os.environ.get("AWS_ACCESS_KEY_ID")
-aws_secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
 aws_region     = os.environ.get("AWS_DEFAULT_REGION")
 aws_location_service_key = os.environ.get("AWS_LOCATION_SERVICE_KEY")
 
 print(f"AWS Region: {aws_region}")
 
-client = boto3.client(
-    "geo-places",
-    aws_access_key_id=aws_access_key,
-    aws_secret_access_key=aws_secret_key,
-    region_name="us-east-1"   # AWS Location currently in us-east-1
-)
+client = aws_client("geo-places")   # AWS Location currently in us-east-1 (pinned in aws_clients)
 
 def search_nearby_places(longitude: float, latitude: float, category: str = 'hospital', radius: int = 5000):
     category_map = {
@@ -82,9 +76,11 @@ def normalize_places(raw_places):
     return clean_list
 
 
-# Example test run
-lon, lat = 101.6869, 3.1390   # Kuala Lumpur
-raw = search_nearby_places(lon, lat, category="clinics", radius=3000)
-cleaned = normalize_places(raw)
+# Example test run (chat_with_medrock imports this module, so it must not
+# run a live search at import time)
+if __name__ == "__main__":
+    lon, lat = 101.6869, 3.1390   # Kuala Lumpur
+    raw = search_nearby_places(lon, lat, category="clinics", radius=3000)
+    cleaned = normalize_places(raw)
 
-print(json.dumps(cleaned, indent=2))
+    print(json.dumps(cleaned, indent=2))
@@ -1,23 +1,12 @@
-import os
 from dotenv import load_dotenv
-import boto3
 import json
+import shared_layer  # noqa: F401
+from aws_clients import client
 
 load_dotenv()
 
-aws_access_key = os.environ.get("AWS_ACCESS_KEY_ID")
-aws_secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
-aws_session_token = os.environ.get("AWS_SESSION_TOKEN")
-aws_region = os.environ.get("AWS_DEFAULT_REGION")
-
-# ---- Runtime client for invoking Nova
-runtime = boto3.client(
-    service_name="bedrock-runtime",
-    region_name=aws_region,
-    aws_access_key_id=aws_access_key,
-    aws_secret_access_key=aws_secret_key,
-    aws_session_token=aws_session_token
-)
+# ---- Runtime client for invoking Nova (credentials and region from the environment)
+runtime = client("bedrock-runtime")
 
 def classify_severity(symptom_text: str, model_id="amazon.nova-lite-v1:0"):
     """Classify severity color from user symptom description using Nova chat schema."""
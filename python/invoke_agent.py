@@ -1,8 +1,9 @@
-import boto3
 import logging
 from dotenv import load_dotenv
 import os
 from botocore.exceptions import ClientError
+import shared_layer  # noqa: F401
+from aws_clients import client as aws_client
 
 
 logging.basicConfig(level=logging.INFO)
@@ -86,7 +87,7 @@ aws_region     = os.environ.get("AWS_DEFAULT_REGION")
 #         logger.error("Client error: %s", {str(e)})
 
 
-client = boto3.client("bedrock-agent-runtime")
+client = aws_client("bedrock-agent-runtime")
 
 # Step 1: Initial invoke to get inputs and invocationId
 response = client.invoke_agent(
@@ -0,0 +1,169 @@
+"""
+Rewrites MedicalAI_ChatHistory items to time-ordered sort keys.
+
+Older items carry either a random UUID (chat_with_medrock) or an ISO
+timestamp (save_chat) in the `timestamp` sort key, so newest-first queries
+mix them up. Each such item is copied to a ULID key built from its
+creation time (sort_keys.sort_key_at) and the old item is deleted. The
+original key is kept as legacy_timestamp. The per-message random
+conversation_id older save_chat items carry is moved to
+legacy_conversation_id, so it does not pollute the conversation index.
+
+Usage:
+    python migrate_chat_keys.py [--segments 8] [--page-size 500] [--dry-run]
+    python migrate_chat_keys.py --create-index
+
+The table is read with a parallel scan, one thread per segment. New keys
+are derived from a hash of the old key, so re-running after an interruption
+rewrites the same items to the same keys; items already on ULID keys are
+skipped. Within each scan page all puts are written before any delete.
+"""
+import argparse
+import hashlib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sort_keys import is_sort_key, sort_key_at
+from store_patient_history import CONVERSATION_INDEX, KEY_ATTRIBUTES
+
+# Attributes copied into the conversation index besides its keys; enough for
+# the chat context (see CHAT_PROJECTION) without the facilities blob.
+CONVERSATION_INDEX_ATTRIBUTES = ['patient_id', 'message_role', 'message_text', 'role', 'message', 'created_at']
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def migrated_item(item):
+    """The item rewritten onto a ULID key, or None if it has no usable creation time."""
+    old_key = item['timestamp']
+    created = _parse_time(old_key) or _parse_time(item.get('created_at', ''))
+    if created is None:
+        return None
+
+    entropy = hashlib.sha256(f"{item['patient_id']}\0{old_key}".encode("utf-8")).digest()
+    new_item = dict(item, timestamp=sort_key_at(created, entropy), legacy_timestamp=old_key)
+    if 'conversation_id' in new_item:
+        new_item['legacy_conversation_id'] = new_item.pop('conversation_id')
+    return new_item
+
+
+class MigrationStats:
+    def __init__(self):
+        self.scanned = 0
+        self.migrated = 0
+        self.skipped = 0
+        self.unparseable = 0
+        self._lock = threading.Lock()
+
+    def add(self, scanned=0, migrated=0, skipped=0, unparseable=0):
+        with self._lock:
+            self.scanned += scanned
+            self.migrated += migrated
+            self.skipped += skipped
+            self.unparseable += unparseable
+
+    def __str__(self):
+        return (f"scanned {self.scanned}, migrated {self.migrated}, already migrated {self.skipped}, "
+                f"no creation time {self.unparseable}")
+
+
+def migrate_segment(table, segment, total_segments, stats, page_size=500, dry_run=False):
+    args = {'Segment': segment, 'TotalSegments': total_segments, 'Limit': page_size}
+    while True:
+        page = table.scan(**args)
+        rewrites = []
+        skipped = unparseable = 0
+        for item in page.get('Items', []):
+            if is_sort_key(item.get('timestamp')):
+                skipped += 1
+                continue
+            new_item = migrated_item(item)
+            if new_item is None:
+                unparseable += 1
+                print(f"Skipping {item['patient_id']}/{item['timestamp']}: no creation time", file=sys.stderr)
+                continue
+            rewrites.append((item, new_item))
+
+        if rewrites and not dry_run:
+            with table.batch_writer() as batch:
+                for _, new_item in rewrites:
+                    batch.put_item(Item=new_item)
+            with table.batch_writer() as batch:
+                for item, _ in rewrites:
+                    batch.delete_item(Key={name: item[name] for name in KEY_ATTRIBUTES})
+
+        stats.add(len(page.get('Items', [])), len(rewrites), skipped, unparseable)
+        if 'LastEvaluatedKey' not in page:
+            return
+        args['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def migrate(table, segments=8, page_size=500, dry_run=False):
+    stats = MigrationStats()
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        futures = [pool.submit(migrate_segment, table, segment, segments, stats, page_size, dry_run)
+                   for segment in range(segments)]
+        for future in futures:
+            future.result()
+    return stats
+
+
+def create_conversation_index(table):
+    """Adds the (conversation_id, timestamp) GSI. Provisioned tables reuse the table's throughput."""
+    client = table.meta.client
+    description = client.describe_table(TableName=table.name)['Table']
+    if any(index['IndexName'] == CONVERSATION_INDEX for index in description.get('GlobalSecondaryIndexes', [])):
+        print(f"{CONVERSATION_INDEX} already exists")
+        return
+
+    index = {
+        'IndexName': CONVERSATION_INDEX,
+        'KeySchema': [
+            {'AttributeName': 'conversation_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+        ],
+        'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': CONVERSATION_INDEX_ATTRIBUTES}
+    }
+    if description.get('BillingModeSummary', {}).get('BillingMode') != 'PAY_PER_REQUEST':
+        throughput = description['ProvisionedThroughput']
+        index['ProvisionedThroughput'] = {
+            'ReadCapacityUnits': throughput['ReadCapacityUnits'],
+            'WriteCapacityUnits': throughput['WriteCapacityUnits']
+        }
+
+    client.update_table(
+        TableName=table.name,
+        AttributeDefinitions=[
+            {'AttributeName': 'conversation_id', 'AttributeType': 'S'},
+            {'AttributeName': 'timestamp', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexUpdates=[{'Create': index}]
+    )
+    print(f"Creating {CONVERSATION_INDEX}; it is usable once its status is ACTIVE")
+
+
+if __name__ == "__main__":
+    from store_patient_history import table
+
+    parser = argparse.ArgumentParser(description="Move MedicalAI_ChatHistory items to time-ordered sort keys.")
+    parser.add_argument("--segments", type=int, default=8, help="parallel scan segments (one thread each)")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="count what would change without writing")
+    parser.add_argument("--create-index", action="store_true", help="create the conversation GSI and exit")
+    args = parser.parse_args()
+
+    if args.create_index:
+        create_conversation_index(table)
+        sys.exit(0)
+
+    started = time.perf_counter()
+    stats = migrate(table, segments=args.segments, page_size=args.page_size, dry_run=args.dry_run)
+    print(f"{'Dry run: ' if args.dry_run else ''}{stats} in {time.perf_counter() - started:.1f}s")
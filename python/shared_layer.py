@@ -0,0 +1,15 @@
+"""
+Puts lambda/shared (the modules deployed as the Lambda layer) on sys.path,
+so these scripts create AWS clients through the same factory as the
+handlers:
+
+    import shared_layer  # noqa: F401
+    from aws_clients import client
+"""
+import os
+import sys
+
+SHARED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "shared")
+
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
@@ -0,0 +1,94 @@
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+
+# ULID layout: 48-bit Unix time in milliseconds, then 80 bits of randomness,
+# written as 26 Crockford base32 characters. Keys sort lexicographically in
+# time order, so DynamoDB range queries on the sort key follow time.
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_TIME_CHARS = 10
+_RANDOM_CHARS = 16
+_RANDOM_BITS = 80
+SORT_KEY_PATTERN = re.compile(r"^[0-9A-HJKMNP-TV-Z]{26}$")
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 32)
+        chars.append(_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def _decode(text):
+    value = 0
+    for char in text:
+        value = value * 32 + _ALPHABET.index(char)
+    return value
+
+
+def _to_ms(moment):
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)  # stored timestamps are naive UTC
+    return int(moment.timestamp() * 1000)
+
+
+class SortKeyGenerator:
+    """
+    Monotonic ULID generator.
+
+    Keys made in the same millisecond (or after the clock steps back) reuse
+    the last time component and increment the random part, so every key is
+    strictly greater than the one before it from this generator. The random
+    part starts from 79 bits, leaving room to increment without overflow.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new(self, now_ms=None):
+        ms = time.time_ns() // 1_000_000 if now_ms is None else now_ms
+        with self._lock:
+            if ms <= self._last_ms:
+                ms = self._last_ms
+                random_part = self._last_random + 1
+            else:
+                random_part = secrets.randbits(_RANDOM_BITS - 1)
+            self._last_ms, self._last_random = ms, random_part
+        return _encode(ms, _TIME_CHARS) + _encode(random_part, _RANDOM_CHARS)
+
+
+_generator = SortKeyGenerator()
+
+
+def new_sort_key():
+    """A new time-ordered key for the table's `timestamp` sort key."""
+    return _generator.new()
+
+
+def sort_key_at(moment, entropy=None):
+    """
+    Key for a given datetime. `entropy` (bytes) fixes the random part, so the
+    same input always maps to the same key (used by the migration).
+    """
+    random_part = int.from_bytes(entropy[:10], "big") if entropy else secrets.randbits(_RANDOM_BITS - 1)
+    return _encode(_to_ms(moment), _TIME_CHARS) + _encode(random_part % (1 << _RANDOM_BITS), _RANDOM_CHARS)
+
+
+def sort_key_bound(moment, upper=False):
+    """Smallest (or largest) possible key at a datetime, for BETWEEN range queries."""
+    fill = _ALPHABET[-1] if upper else _ALPHABET[0]
+    return _encode(_to_ms(moment), _TIME_CHARS) + fill * _RANDOM_CHARS
+
+
+def is_sort_key(value):
+    return isinstance(value, str) and SORT_KEY_PATTERN.match(value) is not None
+
+
+def sort_key_time(key):
+    """UTC datetime a key was created at."""
+    return datetime.fromtimestamp(_decode(key[:_TIME_CHARS]) / 1000, tz=timezone.utc)
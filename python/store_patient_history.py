@@ -1,77 +1,388 @@
-import os
-import boto3
+from boto3.dynamodb.conditions import Key
 import json
+import random
+import threading
+import time
+from collections import OrderedDict, deque
 from datetime import datetime
 from dotenv import load_dotenv
-import uuid
+from sort_keys import new_sort_key, sort_key_bound
+import shared_layer  # noqa: F401
+from aws_clients import resource
 
-# Load environment variables
+# Load environment variables (boto3 picks the AWS credentials up from them)
 load_dotenv()
 
-aws_access_key = os.environ.get("AWS_ACCESS_KEY_ID")
-aws_secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
-aws_session_token = os.environ.get("AWS_SESSION_TOKEN")
-aws_region = os.environ.get("AWS_DEFAULT_REGION")
-
-#DynamoDB client
-dynamodb = boto3.resource(
-    'dynamodb',
-    region_name='ap-southeast-5',
-    aws_access_key_id=aws_access_key,
-    aws_secret_access_key=aws_secret_key,
-    aws_session_token=aws_session_token
-)
+#DynamoDB resource from the shared client factory; DYNAMODB_REGION overrides the region
+dynamodb = resource('dynamodb', default_region='ap-southeast-5')
 
 #Table reference
 table_name = 'MedicalAI_ChatHistory'
 table = dynamodb.Table(table_name)
 
-def save_chat(patient_id, role, message, severity=None, recommendation=None, facilities=None):
-    """Save chat messages into DynamoDB with optional metadata."""
+# Primary key of MedicalAI_ChatHistory; batch puts are deduplicated on it.
+# The `timestamp` sort key holds a time-ordered ULID (sort_keys.py), so
+# newest-first queries return turns in the order they happened.
+KEY_ATTRIBUTES = ['patient_id', 'timestamp']
+
+# GSI (conversation_id, timestamp). Only items with a conversation_id are
+# indexed. Create it with: python migrate_chat_keys.py --create-index
+CONVERSATION_INDEX = 'conversation_id-timestamp-index'
+
+
+class HistoryWriteBuffer:
+    """
+    Write-behind buffer for chat history items.
+
+    Items are sent with batch_writer once max_items are queued, once the
+    oldest queued item is max_delay_seconds old, or when flush()/close() is
+    called (e.g. at the end of a turn or session). Every put overwrites the
+    full item under its primary key, so resending a batch after a partial
+    failure is idempotent; failed batches are retried with jittered backoff
+    and put back in the queue if they still fail.
+
+    With background=True a daemon thread flushes on the time limit even if
+    no new messages arrive.
+    """
+
+    def __init__(self, table, max_items=25, max_delay_seconds=2.0, max_attempts=5, background=False):
+        self.table = table
+        self.max_items = max_items
+        self.max_delay_seconds = max_delay_seconds
+        self.max_attempts = max_attempts
+        self._items = []
+        self._oldest_at = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name="history-flush", daemon=True)
+            self._thread.start()
+
+    def add(self, item):
+        with self._lock:
+            self._items.append(item)
+            if self._oldest_at is None:
+                self._oldest_at = time.monotonic()
+            due = len(self._items) >= self.max_items or self._is_stale()
+        if due:
+            self.flush()
+
+    def _is_stale(self):
+        return self._oldest_at is not None and time.monotonic() - self._oldest_at >= self.max_delay_seconds
+
+    def flush(self):
+        """Write all queued items. Returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                items, self._items = self._items, []
+                self._oldest_at = None
+            if not items:
+                return 0
+
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    # batch_writer chunks into 25-item requests and resubmits
+                    # UnprocessedItems until they are accepted.
+                    with self.table.batch_writer(overwrite_by_pkeys=KEY_ATTRIBUTES) as batch:
+                        for item in items:
+                            batch.put_item(Item=item)
+                    return len(items)
+                except Exception as e:
+                    if attempt == self.max_attempts:
+                        with self._lock:
+                            self._items = items + self._items
+                            self._oldest_at = self._oldest_at or time.monotonic()
+                        print(f"History flush failed after {attempt} attempts, {len(items)} items re-queued: {e}")
+                        raise
+                    time.sleep(random.uniform(0, min(5.0, 0.1 * (2 ** attempt))))
+
+    def _run(self):
+        while not self._stop.wait(self.max_delay_seconds / 2):
+            with self._lock:
+                due = self._is_stale()
+            if due:
+                try:
+                    self.flush()
+                except Exception:
+                    pass  # items stay queued for the next attempt
+
+    def close(self):
+        """Stop the background thread (if any) and flush what is left."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.flush()
+
+    def __len__(self):
+        return len(self._items)
+
+
+def build_chat_item(patient_id, role, message, severity=None, recommendation=None, facilities=None,
+                    conversation_id=None):
     item = {
         'patient_id':patient_id,
-        'timestamp': datetime.utcnow().isoformat(),
-        'conversation_id': str(uuid.uuid4()),
+        'timestamp': new_sort_key(),
+        'created_at': datetime.utcnow().isoformat(),
         'message_role': role,
         'message_text': message
     }
 
+    if conversation_id:
+        item['conversation_id'] = conversation_id
     if severity:
         item['severity'] = severity
     if recommendation:
         item['recommendation'] = recommendation
     if facilities:
         item['facilities'] = json.dumps(facilities)
-    
-    table.put_item(Item=item)
     return item
 
-def get_patient_history(patient_id, limit=10):
+
+def save_chat(patient_id, role, message, severity=None, recommendation=None, facilities=None, buffer=None,
+              conversation_id=None):
+    """
+    Save chat messages into DynamoDB with optional metadata. Pass a HistoryWriteBuffer to batch writes
+    and the same conversation_id (e.g. new_sort_key() at session start) for every turn of a conversation.
+    """
+    item = build_chat_item(patient_id, role, message, severity, recommendation, facilities, conversation_id)
+    if buffer is not None:
+        buffer.add(item)
+    else:
+        table.put_item(Item=item)
+    return item
+
+# Attributes the chat path needs; skips large blobs such as facilities.
+# role/message cover items written by chat_with_medrock.
+CHAT_PROJECTION = ['timestamp', 'message_role', 'message_text', 'role', 'message']
+
+
+class HistoryReader:
+    """
+    Cursor-paginated reads of a patient's history.
+
+    projection limits the attributes returned (names are aliased, since
+    "timestamp" is a DynamoDB reserved word). Cursors are the
+    LastEvaluatedKey of the previous page, or None when the partition is
+    exhausted.
+    """
+
+    def __init__(self, table, projection=None):
+        self.table = table
+        self.projection = projection
+
+    def _query_args(self, condition, page_size, cursor, newest_first, index_name=None):
+        args = {
+            'KeyConditionExpression': condition,
+            'Limit': page_size,
+            'ScanIndexForward': not newest_first
+        }
+        if index_name:
+            args['IndexName'] = index_name
+        if self.projection:
+            names = {f"#p{i}": attribute for i, attribute in enumerate(self.projection)}
+            args['ProjectionExpression'] = ", ".join(names)
+            args['ExpressionAttributeNames'] = names
+        if cursor:
+            args['ExclusiveStartKey'] = cursor
+        return args
+
+    @staticmethod
+    def _patient_condition(patient_id, since):
+        condition = Key('patient_id').eq(patient_id)
+        if since is not None:
+            condition = condition & Key('timestamp').gt(since)
+        return condition
+
+    def read_page(self, patient_id, page_size=25, cursor=None, newest_first=True, since=None):
+        """One query call. Returns (items, next_cursor)."""
+        return self._read_page(self._patient_condition(patient_id, since), page_size, cursor, newest_first)
+
+    def _read_page(self, condition, page_size, cursor, newest_first, index_name=None):
+        response = self.table.query(**self._query_args(condition, page_size, cursor, newest_first, index_name))
+        return response.get('Items', []), response.get('LastEvaluatedKey')
+
+    def _iter(self, condition, limit, page_size, newest_first, index_name=None):
+        cursor = None
+        remaining = limit
+        while True:
+            size = page_size if remaining is None else min(page_size, remaining)
+            items, cursor = self._read_page(condition, size, cursor, newest_first, index_name)
+            for item in items:
+                yield item
+            if remaining is not None:
+                remaining -= len(items)
+                if remaining <= 0:
+                    return
+            if not cursor:
+                return
+
+    def iter_items(self, patient_id, limit=None, page_size=25, newest_first=True, since=None):
+        """Follow cursors until limit items have been yielded or the partition ends."""
+        return self._iter(self._patient_condition(patient_id, since), limit, page_size, newest_first)
+
+    def latest(self, patient_id, limit=10):
+        """Newest `limit` messages, newest first."""
+        return list(self.iter_items(patient_id, limit=limit, page_size=limit, newest_first=True))
+
+    def since(self, patient_id, timestamp, page_size=25):
+        """Messages with a sort key after `timestamp`, oldest first."""
+        return list(self.iter_items(patient_id, page_size=page_size, newest_first=False, since=timestamp))
+
+    def between(self, patient_id, start, end, limit=None, page_size=25):
+        """Messages created between two datetimes, oldest first (one key-range query)."""
+        condition = Key('patient_id').eq(patient_id) & Key('timestamp').between(
+            sort_key_bound(start), sort_key_bound(end, upper=True))
+        return list(self._iter(condition, limit, page_size, newest_first=False))
+
+    def conversation(self, conversation_id, limit=None, page_size=25, newest_first=False):
+        """Turns of one conversation from the conversation GSI, oldest first by default."""
+        condition = Key('conversation_id').eq(conversation_id)
+        return list(self._iter(condition, limit, page_size, newest_first, CONVERSATION_INDEX))
+
+
+class HistoryTail:
+    """
+    Incremental reader for a long-running session: poll() only fetches
+    messages newer than the last one it has seen, so each turn reads the new
+    tail rather than the whole window.
+    """
+
+    def __init__(self, reader, patient_id, last_timestamp=None):
+        self.reader = reader
+        self.patient_id = patient_id
+        self.last_timestamp = last_timestamp
+
+    def poll(self):
+        if self.last_timestamp is None:
+            items = list(reversed(self.reader.latest(self.patient_id)))
+        else:
+            items = self.reader.since(self.patient_id, self.last_timestamp)
+        if items:
+            self.last_timestamp = items[-1]['timestamp']
+        return items
+
+
+def to_chat_message(item):
+    """Map a stored item to the {"role", "content"} shape used for model context.
+
+    Handles both item layouts in the table: save_chat's message_role/message_text
+    and chat_with_medrock's role/message.
+    """
+    return {
+        "role": item.get('message_role') or item.get('role'),
+        "content": item.get('message_text') or item.get('message')
+    }
+
+
+class SessionHistoryCache:
+    """
+    Per-patient conversation windows held in memory.
+
+    Each patient gets a ring buffer (deque with maxlen=window), and patients
+    are kept in LRU order up to max_sessions. append() writes through to the
+    table via `writer` (a HistoryWriteBuffer or the table itself) and updates
+    the window. A patient not in memory is warm-loaded from the table with
+    one projected query for the newest `window` items.
+    """
+
+    def __init__(self, reader, writer, window=10, max_sessions=1000):
+        self.reader = reader
+        self.writer = writer
+        self.window_size = window
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.warm_loads = 0
+        self.evictions = 0
+
+    def _session(self, patient_id):
+        with self._lock:
+            session = self._sessions.get(patient_id)
+            if session is not None:
+                self._sessions.move_to_end(patient_id)
+                self.hits += 1
+                return session
+
+        items = self.reader.latest(patient_id, self.window_size)
+        session = deque((to_chat_message(item) for item in reversed(items)), maxlen=self.window_size)
+        with self._lock:
+            # Another caller may have loaded it meanwhile; keep the first copy.
+            existing = self._sessions.get(patient_id)
+            if existing is not None:
+                return existing
+            self._sessions[patient_id] = session
+            self.warm_loads += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        return session
+
+    def window(self, patient_id):
+        """The last `window` messages for a patient, oldest first."""
+        return list(self._session(patient_id))
+
+    def append(self, patient_id, item):
+        session = self._session(patient_id)
+        if isinstance(self.writer, HistoryWriteBuffer):
+            self.writer.add(item)
+        else:
+            self.writer.put_item(Item=item)
+        session.append(to_chat_message(item))
+
+    def flush(self):
+        if isinstance(self.writer, HistoryWriteBuffer):
+            self.writer.flush()
+
+    def evict(self, patient_id):
+        with self._lock:
+            self._sessions.pop(patient_id, None)
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "hits": self.hits,
+            "warm_loads": self.warm_loads,
+            "evictions": self.evictions
+        }
+
+
+def get_patient_history(patient_id, limit=10, projection=None):
     """Retrieve last N message for a patient."""
-    response = table.query(
-        KeyConditionExpression = boto3.dynamodb.conditions.Key('patient_id').eq(patient_id),
-        Limit = limit,
-        ScanIndexForward = False
+    return HistoryReader(table, projection).latest(patient_id, limit)
+
+
+if __name__ == "__main__":
+    #Example Usage
+    #Buffer both messages of a turn so they go out in one batch request
+    history_buffer = HistoryWriteBuffer(table)
+    conversation_id = new_sort_key()
+
+    #Save a user message
+    save_chat(
+        patient_id = 'patient_123',
+        role = 'user',
+        message = 'I have a chest pain and feeling shortness of breath since yesterday.',
+        buffer = history_buffer,
+        conversation_id = conversation_id
     )
-    return response.get('Items', [])
-
-#Example Usage
-#Save a user message
-save_chat(
-    patient_id = 'patient_123',
-    role = 'user',
-    message = 'I have a chest pain and feeling shortness of breath since yesterday.'
-)
-
-save_chat(
-    patient_id = 'patient_123',
-    role = 'assistant',
-    message = 'This looks serious, you should go to ER.',
-    severity = 'Red',
-    recommendation = 'Seek immediate hospital care.'
-)
-
-#Retrieve history
-history = get_patient_history('patient_123')
-print(json.dumps(history, indent=2))
 
+    save_chat(
+        patient_id = 'patient_123',
+        role = 'assistant',
+        message = 'This looks serious, you should go to ER.',
+        severity = 'Red',
+        recommendation = 'Seek immediate hospital care.',
+        buffer = history_buffer,
+        conversation_id = conversation_id
+    )
+    history_buffer.close()
+
+    #Retrieve history (role and text only)
+    history = get_patient_history('patient_123', projection=CHAT_PROJECTION)
+    print(json.dumps(history, indent=2))
+
+    #Retrieve just this conversation through the GSI
+    print(json.dumps(HistoryReader(table, CHAT_PROJECTION).conversation(conversation_id), indent=2))
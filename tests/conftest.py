@@ -0,0 +1,29 @@
+"""Loads the Lambda handlers side by side; every function's module is called lambda_function."""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+sys.path.insert(0, os.path.join(LAMBDA_DIR, "shared"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+
+def _load(function):
+    directory = os.path.join(LAMBDA_DIR, function)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    name = f"{function}_handler"
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(directory, "lambda_function.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+@pytest.fixture
+def load_lambda():
+    """load_lambda("get_severity") -> that function's lambda_function module (imported once)."""
+    return _load
@@ -0,0 +1,49 @@
+"""Server-side actions fall back to the app when the sibling Lambda can't be reached."""
+import io
+import json
+import os
+import sys
+
+import pytest
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "handle_agent_request"))
+
+import action_dispatch  # noqa: E402
+from action_dispatch import ActionDispatcher, ActionSession, invoke_lambda  # noqa: E402
+
+RETURN_CONTROL = {"invocationInputs": [{"functionInvocationInput": {
+    "actionGroup": "triage", "function": "get_severity",
+    "parameters": [{"name": "symptom_text", "value": "sore throat"}],
+}}]}
+
+
+class StubLambda:
+    def __init__(self, error=None):
+        self.error = error
+
+    def invoke(self, FunctionName, Payload):
+        if self.error is not None:
+            raise self.error
+        return {"Payload": io.BytesIO(json.dumps({"statusCode": 200, "body": "mild"}).encode())}
+
+
+def dispatch_with(monkeypatch, stub):
+    monkeypatch.setattr(action_dispatch.aws_clients, "client", lambda service: stub)
+    dispatcher = ActionDispatcher({"get_severity": lambda parameters, session: invoke_lambda("get_severity", {})})
+    return dispatcher.run(RETURN_CONTROL, ActionSession("s-1"))
+
+
+def test_runs_server_side(monkeypatch):
+    results = dispatch_with(monkeypatch, StubLambda())
+    assert results[0]["functionResult"]["responseBody"]["TEXT"]["body"] == "mild"
+
+
+@pytest.mark.parametrize("error", [
+    ClientError({"Error": {"Code": "TooManyRequestsException", "Message": "Rate exceeded"}}, "Invoke"),
+    ClientError({"Error": {"Code": "AccessDeniedException", "Message": "denied"}}, "Invoke"),
+    ReadTimeoutError(endpoint_url="https://lambda.us-east-1.amazonaws.com"),
+])
+def test_aws_errors_return_control_to_the_app(monkeypatch, error):
+    assert dispatch_with(monkeypatch, StubLambda(error)) is None
@@ -0,0 +1,47 @@
+"""Batch triage only spends rate-limit tokens on model calls."""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "get_severity"))
+
+from batch_triage import triage_batch  # noqa: E402
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+
+
+def test_only_model_calls_take_a_token(load_lambda, monkeypatch):
+    handler = load_lambda("get_severity")
+    limiter = CountingLimiter()
+    model_calls = []
+
+    def fake_model(symptom_text, model_id, cache_key, use_cache, raise_unavailable=False, rate_limiter=None):
+        rate_limiter.acquire()
+        model_calls.append(symptom_text)
+        result = {"severity": "mild", "reason": "", "recommendation": "", "symptoms": [], "possible_conditions": []}
+        handler.triage_cache.put(cache_key, result)
+        return result
+
+    monkeypatch.setattr(handler, "_classify_with_model", fake_model)
+    monkeypatch.setattr(handler, "RED_FLAG_ENRICH", True)
+    monkeypatch.setattr(handler, "submit", lambda pool, fn, *args, **kwargs: fn(*args, **kwargs))
+    monkeypatch.setattr(handler, "triage_cache", handler.TriageCache())
+
+    texts = ["sore throat", "sore throat", "Crushing chest pain and I can't breathe", "runny nose",
+             "Crushing chest pain and I can't breathe"]
+    results = list(triage_batch(
+        texts,
+        lambda text, rate_limiter: handler.classify_severity(text, model_id="m", rate_limiter=limiter),
+        concurrency=1, rate_per_second=None))
+
+    # The red-flag hit answers at once; its background enrichment is a model
+    # call and takes a token, and the repeat is enriched from the cache.
+    assert [r["classification"]["severity"] for r in results] == ["mild", "mild", "severe", "mild", "severe"]
+    assert model_calls == ["sore throat", "Crushing chest pain and I can't breathe", "runny nose"]
+    assert limiter.acquired == 3
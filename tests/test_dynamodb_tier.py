@@ -0,0 +1,33 @@
+"""The shared DynamoDB cache tier, as the triage and geo-tile caches use it."""
+import time
+
+from dynamodb_tier import DynamoDBTier
+from local_dynamodb import LocalTable
+
+
+def test_round_trip_and_expiry():
+    table = LocalTable(partition_key="cache_key", sort_key=None)
+    tier = DynamoDBTier(lambda: table, "cache_key", "result", ttl_seconds=60)
+    assert tier.get("k") is None
+    tier.put("k", {"severity": "mild"})
+    assert tier.get("k") == {"severity": "mild"}
+
+    value, expires_at = tier.get_entry("k")
+    assert value == {"severity": "mild"} and expires_at > time.time()
+
+    table.items["k"]["expires_at"] = int(time.time()) - 1
+    assert tier.get("k") is None
+
+
+def test_geo_tile_entries_come_back_as_facilities(load_lambda):
+    load_lambda("get_nearby_facilities")
+    from facility import Facility
+    from geo_cache import GeoTileCache, MemoryTier, persistent_tier
+
+    table = LocalTable(partition_key="tile_key", sort_key=None)
+    place = Facility("p1", "Klinik", "Jalan 1", 3.14, 101.69, 120, "N/A", "N/A", "Clinic", None)
+    GeoTileCache(persistent=persistent_tier(table)).put("w283:clinics:5000", [place])
+
+    cold = GeoTileCache(memory=MemoryTier(), persistent=persistent_tier(table))
+    assert cold.get("w283:clinics:5000") == [place]
+    assert cold.persistent_hits == 1
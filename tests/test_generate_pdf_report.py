@@ -0,0 +1,78 @@
+"""Batch report packages, run end to end against a directory-backed bucket."""
+import json
+import os
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+REPORT = {
+    "patient": {"patient_id": "P-001", "name": "Aisyah binti Rahman", "age": 34, "gender": "F"},
+    "severity": "moderate",
+    "reason": "Fever and productive cough for three days.",
+    "recommendation": "See a doctor within 24 hours.",
+    "symptoms": [{"name": "fever", "severity": "moderate", "duration": "3 days"}],
+}
+
+
+@pytest.fixture
+def handler(load_lambda, monkeypatch, tmp_path):
+    module = load_lambda("generate_pdf_report")
+    monkeypatch.setattr(module, "S3_LOCAL_DIR", str(tmp_path))
+    monkeypatch.setattr(module, "S3_ENDPOINT_URL", None)
+    monkeypatch.setattr(module, "PDF_BATCH_WORKERS", 2)
+    monkeypatch.setenv("S3_BUCKET_NAME", "reports")
+    module.get_s3_client.cache_clear()
+    module.get_report_store.cache_clear()
+    yield module
+    module.get_s3_client.cache_clear()
+    module.get_report_store.cache_clear()
+
+
+def batch(handler, package, reports):
+    response = handler.lambda_handler({"body": json.dumps({"package": package, "reports": reports})}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def test_files_package_stores_each_report_once(handler, tmp_path):
+    other = dict(REPORT, patient=dict(REPORT["patient"], patient_id="P-002"))
+    status, body = batch(handler, "files", [REPORT, other, REPORT, {"patient": "not a dict"}])
+    assert status == 200
+    reports = body["reports"]
+    assert [entry["index"] for entry in reports] == [0, 1, 2, 3]
+    assert [entry.get("reused") for entry in reports[:3]] == [False, False, True]
+    assert reports[0]["pdf_url"] == reports[2]["pdf_url"]
+    assert "error" in reports[3]
+    stored = [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith(".pdf")]
+    assert len(stored) == 2
+
+    status, body = batch(handler, "files", [REPORT])
+    assert status == 200 and body["reports"][0]["reused"] is True
+
+
+def test_zip_package(handler, tmp_path):
+    status, body = batch(handler, "zip", [REPORT, REPORT])
+    assert status == 200
+    archive = os.path.join(tmp_path, "reports", *body["url"].split("/", 3)[3].split("/"))
+    with zipfile.ZipFile(archive) as z:
+        assert len([name for name in z.namelist() if name.endswith(".pdf")]) == 2
+
+
+def test_stored_report_is_served_without_loading_reportlab(tmp_path):
+    # A fresh interpreter, like a new container: the first request renders
+    # and stores the report, a second container finds it without reportlab.
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+    child = (
+        "import json, sys; import lambda_function; "
+        "loaded = 'reportlab' in sys.modules; "
+        "r = lambda_function.lambda_handler({'body': sys.argv[1]}, None); "
+        "print(json.dumps([loaded, 'reportlab' in sys.modules, json.loads(r['body'])['reused']]))"
+    )
+    env = dict(os.environ, S3_LOCAL_DIR=str(tmp_path), S3_BUCKET_NAME="reports",
+               PYTHONPATH=os.pathsep.join([os.path.join(directory, "generate_pdf_report"),
+                                           os.path.join(directory, "shared")]))
+    runs = [subprocess.run([sys.executable, "-c", child, json.dumps(REPORT)], env=env, check=True,
+                           capture_output=True, text=True).stdout.splitlines()[-1] for _ in range(2)]
+    assert json.loads(runs[0]) == [False, True, False]
+    assert json.loads(runs[1]) == [False, False, True]
@@ -0,0 +1,32 @@
+"""Request validation in the nearby-facilities handler."""
+import json
+
+import pytest
+
+KUALA_LUMPUR = {"latitude": 3.1390, "longitude": 101.6869}
+
+
+@pytest.mark.parametrize("event, message", [
+    ({"max_results": 0}, "max_results"),
+    ({"max_results": -3}, "max_results"),
+    ({"max_results": 10_000}, "max_results"),
+    ({"categories": []}, "categories"),
+    ({"categories": ""}, "categories"),
+    ({"categories": ["clinics", "spa"]}, "categories"),
+])
+def test_invalid_requests_are_rejected(load_lambda, monkeypatch, event, message):
+    handler = load_lambda("get_nearby_facilities")
+    monkeypatch.setattr(handler, "find_facilities", lambda *args: pytest.fail("searched"))
+    monkeypatch.setattr(handler, "find_facilities_multi", lambda *args: pytest.fail("searched"))
+    response = handler.lambda_handler(dict(KUALA_LUMPUR, **event), None)
+    assert response["statusCode"] == 400
+    assert message in json.loads(response["body"])["error"]
+
+
+def test_empty_single_category_defaults_to_hospital(load_lambda, monkeypatch):
+    handler = load_lambda("get_nearby_facilities")
+    calls = []
+    monkeypatch.setattr(handler, "find_facilities", lambda *args: calls.append(args) or [])
+    response = handler.lambda_handler(dict(KUALA_LUMPUR, category="", max_results=1), None)
+    assert response["statusCode"] == 200
+    assert calls[0][2] == "hospital" and calls[0][4] == 1
@@ -0,0 +1,30 @@
+"""Timing of the streamed agent response."""
+import time
+
+import instrumentation
+
+
+def agent_stream(*events):
+    return {"completion": list(events)}
+
+
+def test_stream_external_time_excludes_dispatch(load_lambda):
+    handler = load_lambda("handle_agent_request")
+
+    def dispatch(return_control):
+        with instrumentation.timer("lambda.get_severity", external=True):
+            time.sleep(0.05)
+        return agent_stream({"chunk": {"bytes": b"Rest and drink fluids."}})
+
+    sent = []
+    request = instrumentation.start_request("test")
+    try:
+        handler.stream_agent_response(
+            agent_stream({"chunk": {"bytes": b"Checking. "}}, {"returnControl": {"invocationId": "1"}}),
+            sent.append, dispatch=dispatch)
+    finally:
+        instrumentation.finish_request()
+
+    assert [event["type"] for event in sent] == ["chunk", "chunk", "done"]
+    assert request.timings["bedrock.agent_stream"][0] < 10
+    assert request.external_ms == sum(ms for samples in request.timings.values() for ms in samples)
@@ -0,0 +1,33 @@
+"""Request scoping of metrics recorded from worker threads."""
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "shared"))
+
+import instrumentation  # noqa: E402
+
+
+def test_submitted_work_records_into_the_request_that_started_it():
+    release = threading.Event()
+
+    def late():
+        release.wait(5)
+        instrumentation.count("late")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = instrumentation.start_request("first")
+        pending = instrumentation.submit(pool, late)
+        instrumentation.submit(pool, instrumentation.count, "inner").result()
+        instrumentation.finish_request()
+
+        second = instrumentation.start_request("second")
+        release.set()
+        pending.result()
+        pool.submit(instrumentation.count, "unscoped").result()
+        instrumentation.finish_request()
+
+    assert first.counters == {"inner": 1, "late": 1}
+    assert second.counters == {}
@@ -0,0 +1,87 @@
+"""The sort-key migration's parallel scan, run against the local table."""
+import copy
+import os
+import sys
+import uuid
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "python"))
+
+from local_dynamodb import LocalTable  # noqa: E402
+from migrate_chat_keys import migrate  # noqa: E402
+from sort_keys import is_sort_key, new_sort_key  # noqa: E402
+
+
+def legacy_table(patients=5, per_patient=6):
+    table = LocalTable()
+    for p in range(patients):
+        for i in range(per_patient):
+            created = f"2024-05-0{p + 1}T10:{i:02d}:00"
+            if i % 2:
+                # chat_with_medrock: random UUID key, creation time in created_at
+                item = {"timestamp": str(uuid.uuid4()), "created_at": created, "role": "user", "message": f"m{i}"}
+            else:
+                # save_chat: ISO timestamp key and a per-message conversation_id
+                item = {"timestamp": created, "created_at": created, "message_role": "user",
+                        "message_text": f"m{i}", "conversation_id": str(uuid.uuid4())}
+            table.put_item(Item=dict(item, patient_id=f"patient_{p}"))
+    table.put_item(Item={"patient_id": "patient_0", "timestamp": new_sort_key(), "message_text": "already new"})
+    table.put_item(Item={"patient_id": "patient_0", "timestamp": "not-a-time", "message_text": "no time"})
+    return table
+
+
+def test_every_page_of_every_segment_is_migrated():
+    table = legacy_table()
+    stats = migrate(table, segments=3, page_size=4)
+
+    # 32 items over 3 segments in pages of 4: the scan has to follow
+    # LastEvaluatedKey to reach most of them.
+    assert table.request_counts["scan"] > 3
+    assert (stats.scanned, stats.migrated, stats.skipped, stats.unparseable) == (32, 30, 1, 1)
+
+    keys = [item["timestamp"] for item in table.items.values()]
+    assert sum(is_sort_key(key) for key in keys) == 31 and "not-a-time" in keys
+    migrated = [item for item in table.items.values() if "legacy_timestamp" in item]
+    assert len(migrated) == 30
+    assert all("conversation_id" not in item for item in migrated)
+
+
+def test_rerun_finds_nothing_left_and_keeps_keys():
+    table = legacy_table()
+    migrate(table, segments=2, page_size=3)
+    before = dict(table.items)
+
+    stats = migrate(table, segments=2, page_size=3)
+    assert (stats.migrated, stats.skipped, stats.unparseable) == (0, 31, 1)
+    assert table.items == before
+
+
+class InterruptedTable(LocalTable):
+    """Fails the nth batch_writer block, like a run killed part-way through."""
+
+    def __init__(self, items, fail_at):
+        super().__init__()
+        self.items = copy.deepcopy(items)
+        self.fail_at = fail_at
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        if self.request_counts["batch_write"] + 1 == self.fail_at:
+            self.fail_at = None
+            raise ConnectionError("interrupted")
+        return super().batch_writer(overwrite_by_pkeys)
+
+
+def test_interrupted_run_resumes_onto_the_same_keys():
+    source = legacy_table()
+    complete = InterruptedTable(source.items, fail_at=None)
+    migrate(complete, segments=2, page_size=4)
+
+    table = InterruptedTable(source.items, fail_at=4)
+    with pytest.raises(ConnectionError):
+        migrate(table, segments=2, page_size=4)
+    assert table.items != complete.items
+
+    migrate(table, segments=2, page_size=4)
+    assert table.items == complete.items
@@ -0,0 +1,50 @@
+"""Regression cases for the red-flag rules that bypass the triage model."""
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "get_severity"))
+
+from red_flags import RedFlagEngine  # noqa: E402
+
+engine = RedFlagEngine()
+
+
+@pytest.mark.parametrize("text", [
+    "I fell off my bike and hurt myself",
+    "I fainted once two years ago",
+    "history of seizure as a child, today sore throat",
+    "I don't have chest pain but I am short of breath",
+    "Patient denies chest pain or shortness of breath",
+    "Denies fever, chest pain, or shortness of breath.",
+    "No fever, chest pain or shortness of breath",
+    "No fever, chest pain and short of breath",
+    "Chest pain: none. Shortness of breath: no.",
+    "Chest pain denied, short of breath",
+    "I had chest pain and shortness of breath last year",
+    "had chest pain last year, now short of breath",
+    "my dad had a stroke with slurred speech",
+    "My mom had slurred speech and her face was drooping",
+    "history of seizures, unresponsive episodes in the past",
+])
+def test_no_rule(text):
+    assert engine.match(text) is None
+
+
+@pytest.mark.parametrize("text, rule", [
+    ("No fever. Chest pain and short of breath", "cardiac_chest_pain_with_dyspnea"),
+    ("No fever but chest pain, and I am short of breath", "cardiac_chest_pain_with_dyspnea"),
+    ("No cough; crushing chest pressure and I can't breathe", "cardiac_chest_pain_with_dyspnea"),
+    ("I fainted this morning and now have chest pain", "syncope_with_chest_pain"),
+    ("He is having a seizure and is unresponsive", "loss_of_consciousness"),
+    ("I want to hurt myself", "self_harm_risk"),
+    ("My mom died last year and I want to kill myself", "self_harm_risk"),
+    ("Chest pain: yes. Shortness of breath: yes.", "cardiac_chest_pain_with_dyspnea"),
+    ("Her face is drooping and she has slurred speech", "stroke_signs"),
+    ("Family noticed his face is drooping and he has slurred speech", "stroke_signs"),
+])
+def test_rule_fires(text, rule):
+    match = engine.match(text)
+    assert match is not None and match.rule["name"] == rule
@@ -0,0 +1,54 @@
+"""ULID sort keys and the paginated history reads that rely on their order."""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "python"))
+
+from local_dynamodb import LocalTable  # noqa: E402
+from sort_keys import (SortKeyGenerator, is_sort_key, new_sort_key, sort_key_at, sort_key_bound,  # noqa: E402
+                       sort_key_time)
+from store_patient_history import HistoryReader  # noqa: E402
+
+
+def test_keys_increase_within_a_millisecond_and_when_the_clock_steps_back():
+    generator = SortKeyGenerator()
+    keys = [generator.new(now_ms=1_700_000_000_000) for _ in range(100)]
+    keys.append(generator.new(now_ms=1_699_999_999_000))
+    keys.append(generator.new(now_ms=1_700_000_000_001))
+    assert keys == sorted(keys) and len(set(keys)) == len(keys)
+    assert all(is_sort_key(key) for key in keys)
+
+
+def test_key_order_follows_time_and_bounds_enclose_it():
+    moment = datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+    earlier = sort_key_at(moment - timedelta(milliseconds=1))
+    key = sort_key_at(moment, entropy=b"\xff" * 10)
+    assert earlier < sort_key_bound(moment) <= key <= sort_key_bound(moment, upper=True)
+    assert sort_key_time(key) == moment
+    assert sort_key_at(moment, entropy=b"abcdefghij") == sort_key_at(moment, entropy=b"abcdefghij")
+    assert new_sort_key() > sort_key_at(moment)
+
+
+def test_reader_pages_follow_sort_key_order():
+    table = LocalTable()
+    start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    keys = [sort_key_at(start + timedelta(minutes=i)) for i in range(12)]
+    for i, key in enumerate(keys):
+        table.put_item(Item={"patient_id": "p1", "timestamp": key, "message_role": "user",
+                             "message_text": f"m{i}", "facilities": "[...]"})
+    table.put_item(Item={"patient_id": "p2", "timestamp": keys[0], "message_text": "other patient"})
+
+    reader = HistoryReader(table, projection=["timestamp", "message_text"])
+    latest = reader.latest("p1", limit=5)
+    assert [item["message_text"] for item in latest] == ["m11", "m10", "m9", "m8", "m7"]
+    assert "facilities" not in latest[0]
+
+    table.request_counts["query"] = 0
+    assert [item["message_text"] for item in reader.since("p1", keys[6], page_size=2)] == [
+        "m7", "m8", "m9", "m10", "m11"]
+    assert table.request_counts["query"] == 3
+
+    window = reader.between("p1", start + timedelta(minutes=2), start + timedelta(minutes=4))
+    assert [item["message_text"] for item in window] == ["m2", "m3", "m4"]
@@ -0,0 +1,83 @@
+"""HistoryWriteBuffer against the in-memory table stand-in."""
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "python"))
+
+from local_dynamodb import LocalTable  # noqa: E402
+from store_patient_history import HistoryWriteBuffer, build_chat_item  # noqa: E402
+
+
+def turn(buffer, n):
+    for i in range(n):
+        buffer.add(build_chat_item("patient_1", "user", f"message {i}"))
+
+
+def test_writes_wait_for_flush_and_go_out_in_one_batch():
+    table = LocalTable()
+    buffer = HistoryWriteBuffer(table, max_items=25, max_delay_seconds=60)
+    turn(buffer, 2)
+    assert table.items == {} and len(buffer) == 2
+
+    assert buffer.flush() == 2
+    assert len(table.items) == 2 and len(buffer) == 0
+    assert table.request_counts["batch_write"] == 1
+    assert table.request_counts["put_item"] == 0
+    assert buffer.flush() == 0 and table.request_counts["batch_write"] == 1
+
+
+def test_flushes_when_full_or_stale():
+    table = LocalTable()
+    full = HistoryWriteBuffer(table, max_items=3, max_delay_seconds=60)
+    turn(full, 7)
+    assert len(table.items) == 6 and len(full) == 1
+    assert table.request_counts["batch_write"] == 2
+
+    stale = HistoryWriteBuffer(table, max_items=25, max_delay_seconds=0)
+    turn(stale, 1)
+    assert len(stale) == 0 and len(table.items) == 7
+
+
+def test_close_flushes_and_stops_the_background_thread():
+    table = LocalTable()
+    buffer = HistoryWriteBuffer(table, max_delay_seconds=60, background=True)
+    turn(buffer, 3)
+    assert buffer.close() == 3
+    assert not buffer._thread.is_alive()
+    assert len(table.items) == 3
+
+
+class FailingTable(LocalTable):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        return super().batch_writer(overwrite_by_pkeys)
+
+
+def test_failed_batch_is_requeued_and_resent():
+    table = FailingTable(failures=1)
+    buffer = HistoryWriteBuffer(table, max_delay_seconds=60, max_attempts=1)
+    turn(buffer, 2)
+    with pytest.raises(ConnectionError):
+        buffer.flush()
+    assert len(buffer) == 2 and table.items == {}
+
+    assert buffer.flush() == 2
+    assert len(table.items) == 2
+
+
+def test_retries_within_one_flush(monkeypatch):
+    monkeypatch.setattr("store_patient_history.time.sleep", lambda seconds: None)
+    table = FailingTable(failures=2)
+    buffer = HistoryWriteBuffer(table, max_delay_seconds=60, max_attempts=3)
+    turn(buffer, 2)
+    assert buffer.flush() == 2
+    assert len(table.items) == 2
@@ -0,0 +1,49 @@
+"""Early severity detection over streamed triage completions."""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda", "get_severity"))
+
+from stream_triage import EarlySeverityParser  # noqa: E402
+
+
+def feed_all(text, chunk_size=5):
+    parser = EarlySeverityParser()
+    for i in range(0, len(text), chunk_size):
+        severity = parser.feed(text[i:i + chunk_size])
+        if severity is not None:
+            return severity
+    return None
+
+
+def test_top_level_severity():
+    assert feed_all('{"symptoms": [{"severity": "mild"}], "severity": "Severe", "advice": "x"}') == "severe"
+
+
+def test_invalid_escape_skips_early_detection():
+    assert feed_all('{"advice": "take 2\\x tablets", "severity": "moderate"}') == "moderate"
+    assert feed_all('{"sev\\qerity": "severe", "advice": "rest"}') is None
+
+
+def test_stream_and_plain_paths_count_cache_lookups_alike(load_lambda, monkeypatch):
+    import instrumentation
+    from stream_triage import fake_nova_stream
+
+    handler = load_lambda("get_severity")
+    monkeypatch.setattr(handler, "triage_cache", handler.TriageCache())
+
+    class FakeRuntime:
+        def invoke_model_with_response_stream(self, **kwargs):
+            return fake_nova_stream('{"severity": "mild", "reason": "r", "recommendation": "rest", '
+                                    '"symptoms": [], "possible_conditions": []}')
+
+    request = instrumentation.start_request("test")
+    try:
+        for _ in range(2):
+            events = list(handler.classify_severity_stream("runny nose", client=FakeRuntime()))
+            assert events[-1]["classification"]["severity"] == "mild"
+        assert handler.classify_severity("runny nose")["severity"] == "mild"
+    finally:
+        instrumentation.finish_request()
+    assert request.counters == {"cache_miss": 1, "cache_hit": 2}